@@ -2,6 +2,9 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from celery import Celery
@@ -30,6 +33,14 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 app.config['CELERY_BROKER_URL'] = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 app.config['CELERY_RESULT_BACKEND'] = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+# SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to, per connection
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 # Initialize extensions
 db.init_app(app)
 
@@ -42,6 +53,12 @@ def make_celery(app):
     )
     celery.conf.update(app.config)
     
+    # With celery beat running (Procfile 'beat'), queued work units start within a minute of an
+    # account freeing up or its budget resetting; scheduler.dispatch also retries on its own
+    celery.conf.CELERYBEAT_SCHEDULE = {
+        'dispatch-work-units': {'task': 'tasks.dispatch_work_units', 'schedule': 60.0}
+    }
+    
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
             with app.app_context():
@@ -66,6 +83,10 @@ with app.app_context():
     # Import models and routes
     import models
     import routes
-    
-    # Create tables
-    db.create_all()
+
+# Schema changes run once per deploy, not in every web and worker process
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations"""
+    import migrations
+    migrations.run_migrations()
@@ -0,0 +1,204 @@
+"""
+Offline benchmark for the results page parser (no browser, no network)
+
+Usage:
+    python benchmark.py                    # run and compare against the baseline
+    python benchmark.py --update-baseline  # record current numbers as the baseline
+
+The gate covers lead and field counts, and peak memory relative to a bare
+BeautifulSoup parse of the same fixture, which do not depend on the host.
+Timings (leads/sec, parse time relative to a bare parse) and absolute
+memory vary with the machine and its load, so they are compared for
+information only.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from bs4 import BeautifulSoup
+from lead_parser import FIELD_SELECTORS, SELECTOR_CACHE, parse_results_html
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+FIXTURES_DIR = os.path.join(BENCHMARK_DIR, 'fixtures')
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Allowed relative slowdown / memory growth before a run counts as a regression
+DEFAULT_TOLERANCE = 0.30
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """Load every saved results page HTML fixture"""
+    fixtures = {}
+    for filename in sorted(os.listdir(fixtures_dir)):
+        if filename.endswith('.html'):
+            with open(os.path.join(fixtures_dir, filename), encoding='utf-8') as f:
+                fixtures[filename] = f.read()
+    return fixtures
+
+def reference_parse(html):
+    """Bare parse of a fixture, the yardstick for relative time and memory"""
+    return BeautifulSoup(html, 'html.parser')
+
+def timed(html, iterations, timings):
+    """Seconds spent parsing html iterations times, and the fastest parse and bare parse.
+
+    Parses and bare parses alternate with the garbage collector off, so
+    both see the same host conditions.
+    """
+    elapsed = 0.0
+    fastest = reference_fastest = float('inf')
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            parse_results_html(html, timings)
+            seconds = time.perf_counter() - started
+            elapsed += seconds
+            fastest = min(fastest, seconds)
+
+            started = time.perf_counter()
+            reference_parse(html)
+            reference_fastest = min(reference_fastest, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return elapsed, fastest, reference_fastest
+
+def peak_memory(parse, html):
+    tracemalloc.start()
+    parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def benchmark_fixture(html, iterations):
+    """Parse one fixture repeatedly and collect throughput, field timings and memory"""
+    # Selector order learned on earlier fixtures would change this one's timings
+    SELECTOR_CACHE.reset()
+    leads = parse_results_html(html)  # warm-up, also used for correctness counts
+
+    timings = {}
+    # Fastest calls, which scheduling noise on the host affects least
+    elapsed, fastest, reference_fastest = timed(html, iterations, timings)
+
+    peak = peak_memory(parse_results_html, html)
+    reference_peak = peak_memory(reference_parse, html)
+
+    total_leads = len(leads) * iterations
+    return {
+        'leads': len(leads),
+        'fields_filled': {
+            field: sum(1 for lead in leads if lead[field]) for field in FIELD_SELECTORS
+        },
+        'leads_per_sec': round(total_leads / elapsed, 1) if elapsed > 0 else 0.0,
+        'field_us_per_lead': {
+            field: round(seconds / total_leads * 1e6, 2) if total_leads else 0.0
+            for field, seconds in timings.items()
+        },
+        'peak_memory_kb': round(peak / 1024, 1),
+        # Multiples of a bare BeautifulSoup parse of the same HTML
+        'relative_time': round(fastest / reference_fastest, 2) if reference_fastest > 0 else 0.0,
+        'relative_memory': round(peak / reference_peak, 2) if reference_peak else 0.0
+    }
+
+def run_benchmark(iterations=20):
+    """Benchmark every fixture"""
+    return {name: benchmark_fixture(html, iterations) for name, html in load_fixtures().items()}
+
+def compare_to_baseline(results, baseline):
+    """Return a list of regression messages (empty when the run is acceptable)"""
+    tolerance = baseline.get('tolerance', DEFAULT_TOLERANCE)
+    regressions = []
+
+    for name, expected in baseline.get('fixtures', {}).items():
+        actual = results.get(name)
+        if actual is None:
+            regressions.append(f"{name}: fixture missing")
+            continue
+
+        if actual['leads'] != expected['leads']:
+            regressions.append(f"{name}: parsed {actual['leads']} leads, expected {expected['leads']}")
+
+        for field, count in expected.get('fields_filled', {}).items():
+            if actual['fields_filled'].get(field, 0) < count:
+                regressions.append(f"{name}: {field} filled for {actual['fields_filled'].get(field, 0)} leads, expected {count}")
+
+        if 'relative_memory' in expected:
+            max_memory = expected['relative_memory'] * (1 + tolerance)
+            if actual['relative_memory'] > max_memory:
+                regressions.append(f"{name}: peak memory is {actual['relative_memory']}x a bare parse, above {max_memory:.2f}x")
+
+    return regressions
+
+def advisory_changes(results, baseline):
+    """Messages for host-dependent numbers outside the tolerance; reported, never a regression"""
+    tolerance = baseline.get('tolerance', DEFAULT_TOLERANCE)
+    changes = []
+
+    for name, expected in baseline.get('fixtures', {}).items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        if actual['leads_per_sec'] < expected['leads_per_sec'] * (1 - tolerance):
+            changes.append(f"{name}: {actual['leads_per_sec']} leads/sec, baseline {expected['leads_per_sec']}")
+        if 'relative_time' in expected and actual['relative_time'] > expected['relative_time'] * (1 + tolerance):
+            changes.append(f"{name}: parse time {actual['relative_time']}x a bare parse, baseline {expected['relative_time']}x")
+        if actual['peak_memory_kb'] > expected['peak_memory_kb'] * (1 + tolerance):
+            changes.append(f"{name}: peak memory {actual['peak_memory_kb']} KB, baseline {expected['peak_memory_kb']} KB")
+
+    return changes
+
+def print_report(results):
+    for name, result in results.items():
+        print(f"\n{name}")
+        print(f"  leads/page:     {result['leads']}")
+        print(f"  leads/sec:      {result['leads_per_sec']:,.1f}")
+        print(f"  peak memory:    {result['peak_memory_kb']:,.1f} KB")
+        print(f"  vs bare parse:  {result['relative_time']:.2f}x time, {result['relative_memory']:.2f}x memory")
+        print("  per-field time (us/lead):")
+        for field, micros in sorted(result['field_us_per_lead'].items(), key=lambda item: -item[1]):
+            print(f"    {field:<16}{micros:>10.2f}   filled {result['fields_filled'][field]}/{result['leads']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Apollo results page parser')
+    parser.add_argument('--iterations', type=int, default=20, help='Parses per fixture')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.iterations)
+    print_report(results)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'tolerance': DEFAULT_TOLERANCE, 'fixtures': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    changes = advisory_changes(results, baseline)
+    if changes:
+        print("\nSlower or larger than the baseline (machine dependent, not gated):")
+        for message in changes:
+            print(f"  - {message}")
+
+    regressions = compare_to_baseline(results, baseline)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for message in regressions:
+            print(f"  - {message}")
+        return 1
+
+    print("\nNo regressions against baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Per-worker pool of warm, cookie-loaded Chrome sessions
+"""
+import time
+import json
+import atexit
+import hashlib
+import logging
+import threading
+from config import Config
+from metrics import ACTIVE_DRIVERS
+
+def cookie_fingerprint(cookies):
+    """Stable key identifying a cookie set (sessions are only shared between identical sets)"""
+    payload = json.dumps(cookies or {}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def load_cookies(driver, cookies):
+    """Prime the Apollo domain and install the session cookies"""
+    driver.get(Config.APOLLO_BASE_URL)
+    for name, value in cookies.items():
+        try:
+            driver.add_cookie({
+                'name': name,
+                'value': value,
+                'domain': '.apollo.io'
+            })
+        except Exception as e:
+            logging.warning(f"Failed to set cookie {name}: {str(e)}")
+
+class PooledDriver:
+    """A Chrome session owned by the pool and leased to one scraper at a time"""
+
+    def __init__(self, driver, key):
+        self.driver = driver
+        self.key = key
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.authenticated_at = None
+        # Page loads the pool made itself (cookie priming) that no scraper has counted yet
+        self.unrecorded_requests = 0
+
+    def mark_authenticated(self):
+        self.authenticated_at = time.time()
+
+    def is_authenticated(self):
+        """True if authentication was verified on this session recently"""
+        return (self.authenticated_at is not None and
+                time.time() - self.authenticated_at < Config.BROWSER_AUTH_TTL)
+
+class BrowserPool:
+    """Leases Chrome sessions keyed by cookie set, recycling and evicting them as needed"""
+
+    def __init__(self, max_idle=None, max_uses=None, idle_timeout=None):
+        self.max_idle = Config.BROWSER_POOL_SIZE if max_idle is None else max_idle
+        self.max_uses = Config.BROWSER_MAX_USES if max_uses is None else max_uses
+        self.idle_timeout = Config.BROWSER_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self._idle = []
+        self._leased = 0
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def acquire(self, cookies, network_log=False, profile='full'):
+        """Lease a healthy session for the cookie set, launching Chrome only if none is idle.
+        
+        Sessions are only shared between leases asking for the same browser
+        profile and network logging.
+        """
+        key = f"{cookie_fingerprint(cookies)}:{profile}" + (':network' if network_log else '')
+        self.evict_idle()
+
+        while True:
+            entry = self._take_idle(key)
+            if entry is None:
+                entry = self._create(cookies, key, network_log, profile)
+                break
+            if self._is_healthy(entry):
+                logging.info(f"Reusing pooled Chrome session (uses={entry.uses})")
+                break
+            logging.info("Discarding unhealthy pooled Chrome session")
+            self._close(entry)
+
+        entry.uses += 1
+        with self._lock:
+            self._leased += 1
+        self._report()
+        return entry
+
+    def release(self, entry, discard=False):
+        """Return a leased session; it is closed instead if discarded, worn out or surplus"""
+        entry.last_used = time.time()
+        keep = not discard and entry.uses < self.max_uses and self._park(entry)
+        with self._lock:
+            self._leased -= 1
+            keep = keep and len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append(entry)
+
+        if keep:
+            self._ensure_reaper()
+        else:
+            self._close(entry)
+        self._report()
+
+    def evict_idle(self):
+        """Close sessions that have sat unused longer than the idle timeout"""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            expired = [entry for entry in self._idle if entry.last_used < cutoff]
+            self._idle = [entry for entry in self._idle if entry.last_used >= cutoff]
+
+        for entry in expired:
+            logging.info("Evicting idle Chrome session")
+            self._close(entry)
+        if expired:
+            self._report()
+        return len(expired)
+
+    def close_all(self):
+        """Close every idle session (leased sessions are closed when released)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.max_idle = 0
+        for entry in idle:
+            self._close(entry)
+        self._report()
+
+    def stats(self):
+        with self._lock:
+            return {'idle': len(self._idle), 'leased': self._leased}
+
+    def _report(self):
+        for state, count in self.stats().items():
+            ACTIVE_DRIVERS.labels(state).set(count)
+
+    def _take_idle(self, key):
+        with self._lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i].key == key:
+                    return self._idle.pop(i)
+        return None
+
+    def _create(self, cookies, key, network_log=False, profile='full'):
+        from chrome_setup import setup_chrome_for_replit
+
+        driver, error = setup_chrome_for_replit(network_log=network_log, profile=profile)
+        if not driver:
+            raise Exception(error)
+
+        try:
+            if cookies:
+                load_cookies(driver, cookies)
+        except Exception:
+            driver.quit()
+            raise
+
+        logging.info(f"Launched new pooled Chrome session ({profile} profile)")
+        entry = PooledDriver(driver, key)
+        if cookies:
+            entry.unrecorded_requests = 1
+        return entry
+
+    def _park(self, entry):
+        """Leave an idle session on a blank page, so its next lease starts a fresh document
+        instead of a same-document hash change that still shows the old results"""
+        try:
+            entry.driver.get('about:blank')
+            return True
+        except Exception as e:
+            logging.warning(f"Could not park pooled Chrome session: {str(e)}")
+            return False
+
+    def _is_healthy(self, entry):
+        try:
+            return entry.driver.execute_script("return 1") == 1
+        except Exception as e:
+            logging.warning(f"Pooled Chrome session failed health check: {str(e)}")
+            return False
+
+    def _close(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            logging.warning(f"Error closing Chrome session: {str(e)}")
+
+    def _ensure_reaper(self):
+        """Start a daemon thread that evicts idle sessions even when no jobs arrive"""
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        def reap():
+            while True:
+                time.sleep(max(self.idle_timeout / 2, 1))
+                self.evict_idle()
+                with self._lock:
+                    if not self._idle:
+                        self._reaper = None
+                        return
+
+        self._reaper = threading.Thread(target=reap, name='browser-pool-reaper', daemon=True)
+        self._reaper.start()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Return this process's browser pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close_all)
+        return _pool
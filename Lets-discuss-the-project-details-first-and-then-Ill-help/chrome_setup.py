@@ -3,12 +3,19 @@ Chrome WebDriver setup for Replit environment
 """
 import os
 import logging
+from config import Config
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 
-def setup_chrome_for_replit():
-    """Setup Chrome WebDriver optimized for Replit environment"""
+def setup_chrome_for_replit(network_log=False, profile='full'):
+    """Setup Chrome WebDriver optimized for Replit environment.
+    
+    With network_log, Network events are recorded in the 'performance' log
+    so responses can be read back over the DevTools protocol. The 'lean'
+    profile blocks images, fonts, media and trackers and caps renderer
+    processes and caches to cut page weight and memory per session.
+    """
     try:
         # Set up Chrome options
         chrome_options = Options()
@@ -37,6 +44,24 @@ def setup_chrome_for_replit():
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
+        if profile == 'lean':
+            chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+            chrome_options.add_argument(f'--renderer-process-limit={Config.LEAN_RENDERER_PROCESS_LIMIT}')
+            chrome_options.add_argument(f'--disk-cache-size={Config.LEAN_DISK_CACHE_MB * 1024 * 1024}')
+            chrome_options.add_argument('--media-cache-size=1')
+            chrome_options.add_argument('--aggressive-cache-discard')
+            chrome_options.add_argument('--disable-extensions')
+            chrome_options.add_argument('--disable-component-update')
+            chrome_options.add_argument('--mute-audio')
+            chrome_options.add_experimental_option('prefs', {
+                'profile.managed_default_content_settings.images': 2,
+                'profile.managed_default_content_settings.media_stream': 2
+            })
+        
+        if network_log:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+        
         # Set up service with automatic driver management
         service = Service()
         
@@ -46,6 +71,11 @@ def setup_chrome_for_replit():
         # Execute script to hide automation
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
+        if profile == 'lean':
+            # Blocked before the request is sent, for every page this session loads
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': Config.LEAN_BLOCKED_URLS})
+        
         logging.info("Chrome WebDriver setup successful")
         return driver, None
         
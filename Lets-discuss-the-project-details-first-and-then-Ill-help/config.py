@@ -9,6 +9,46 @@ class Config:
     MAX_DELAY = int(os.environ.get('MAX_DELAY', '50'))  # 50 seconds maximum
     DEFAULT_DELAY = int(os.environ.get('DEFAULT_DELAY', '10'))  # 10 seconds default
     
+    # Adaptive pacing (AIMD over a sliding window of recent page loads)
+    PACING_WINDOW = int(os.environ.get('PACING_WINDOW', '20'))  # Page loads considered
+    PACING_INCREASE = float(os.environ.get('PACING_INCREASE', '0.5'))  # Pages/minute added after a healthy load
+    PACING_BACKOFF = float(os.environ.get('PACING_BACKOFF', '0.5'))  # Rate multiplier after a failed or slow load
+    PACING_SLOW_FACTOR = float(os.environ.get('PACING_SLOW_FACTOR', '2.0'))  # Slow = this many times the window's fastest load
+    PACING_MAX_ERROR_RATE = float(os.environ.get('PACING_MAX_ERROR_RATE', '0.2'))  # No speed-up above this failure share
+    
+    # Page readiness (replaces fixed sleeps after navigation)
+    PAGE_READY_TIMEOUT = int(os.environ.get('PAGE_READY_TIMEOUT', '20'))  # Max seconds to wait for results to settle
+    DOM_QUIET_MS = int(os.environ.get('DOM_QUIET_MS', '500'))  # DOM must be unchanged this long to count as rendered
+    
+    # Extraction: 'dom' scrapes the rendered results, 'api' reads Apollo's search XHR
+    # responses from Chrome's network log (falling back to the rendered page)
+    EXTRACTION_MODES = ('dom', 'api')
+    DEFAULT_EXTRACTION_MODE = os.environ.get('EXTRACTION_MODE', 'dom')
+    APOLLO_SEARCH_API_PATTERN = r'/api/v\d+/(mixed_people|people|contacts)/search(\?|$)'
+    
+    # Parallel page fetching
+    RESULTS_PER_PAGE = 25  # Apollo people search page size
+    MAX_PAGES_PER_JOB = 1000  # Safety stop for runaway pagination
+    MAX_PAGE_CONCURRENCY = int(os.environ.get('MAX_PAGE_CONCURRENCY', '4'))  # Browser sessions per job
+    MAX_PAGES_PER_MINUTE = int(os.environ.get('MAX_PAGES_PER_MINUTE', '12'))  # Per Apollo account, shared by all workers via Redis
+    PAGE_RATE_BURST = int(os.environ.get('PAGE_RATE_BURST', '3'))
+    
+    # Learned field selector order, shared through Redis
+    SELECTOR_CACHE_SYNC_SECONDS = int(os.environ.get('SELECTOR_CACHE_SYNC_SECONDS', '30'))  # Min seconds between syncs per process
+    SELECTOR_CACHE_TTL = int(os.environ.get('SELECTOR_CACHE_TTL', str(7 * 24 * 3600)))  # Scores expire after a week unused
+    
+    # Account pool scheduling (jobs submitted without cookies)
+    WORK_UNIT_PAGES = int(os.environ.get('WORK_UNIT_PAGES', '4'))  # Results pages per work unit
+    WORK_UNIT_MAX_ATTEMPTS = int(os.environ.get('WORK_UNIT_MAX_ATTEMPTS', '2'))  # Runs before a unit is given up
+    WORK_UNIT_TIMEOUT = int(os.environ.get('WORK_UNIT_TIMEOUT', '1800'))  # Seconds before a running unit is presumed lost
+    ACCOUNT_DAILY_PAGES = int(os.environ.get('ACCOUNT_DAILY_PAGES', '200'))  # Default page budget per account per day
+    DEFAULT_JOB_PRIORITY = 3  # Priorities run 1-5 and weight a job's share of the pool
+    DISPATCH_RETRY_SECONDS = int(os.environ.get('DISPATCH_RETRY_SECONDS', '60'))  # Units waiting for an account are dispatched again after this
+    
+    # Metrics (requires prometheus_client); Celery workers serve theirs on this port if set,
+    # which needs PROMETHEUS_MULTIPROC_DIR so the main process sees its children's metrics
+    CELERY_METRICS_PORT = int(os.environ.get('CELERY_METRICS_PORT', '0'))
+    
     # Daily limits
     MAX_DAILY_LEADS = int(os.environ.get('MAX_DAILY_LEADS', '50000'))  # 50k per day
     MAX_DAILY_REQUESTS = int(os.environ.get('MAX_DAILY_REQUESTS', '5000'))  # 5k requests per day
@@ -22,6 +62,52 @@ class Config:
         '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     ]
     
+    # Browser pool settings (per worker process)
+    BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', '2'))  # Idle sessions kept warm, 0 disables reuse
+    BROWSER_MAX_USES = int(os.environ.get('BROWSER_MAX_USES', '50'))  # Recycle a session after this many leases
+    BROWSER_IDLE_TIMEOUT = int(os.environ.get('BROWSER_IDLE_TIMEOUT', '600'))  # Seconds before an idle session is closed
+    BROWSER_AUTH_TTL = int(os.environ.get('BROWSER_AUTH_TTL', '900'))  # Seconds a verified login is trusted
+    
+    # Browser profiles: 'full' loads everything, 'lean' skips what reading lead rows doesn't need
+    BROWSER_PROFILES = ('full', 'lean')
+    DEFAULT_BROWSER_PROFILE = os.environ.get('BROWSER_PROFILE', 'full')
+    LEAN_RENDERER_PROCESS_LIMIT = int(os.environ.get('LEAN_RENDERER_PROCESS_LIMIT', '2'))
+    LEAN_DISK_CACHE_MB = int(os.environ.get('LEAN_DISK_CACHE_MB', '64'))  # Keeps Apollo's app bundle cached between pages
+    LEAN_BLOCKED_URLS = [
+        # Images, fonts and media
+        '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*',
+        '*.woff*', '*.ttf*', '*.otf*', '*.eot*',
+        '*.mp4*', '*.webm*', '*.mp3*', '*.wav*',
+        # Third-party analytics, chat and session recording
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+        '*segment.com*', '*segment.io*', '*hotjar.com*', '*fullstory.com*',
+        '*intercom.io*', '*intercomcdn.com*', '*facebook.net*', '*clarity.ms*',
+        '*hubspot.com*', '*hs-analytics.net*', '*linkedin.com/px*', '*ads.linkedin.com*'
+    ]
+    
+    # Persistence settings
+    LEAD_FLUSH_BATCH_SIZE = int(os.environ.get('LEAD_FLUSH_BATCH_SIZE', '100'))  # Leads buffered before a DB/CSV flush
+    LEAD_INSERT_BATCH_SIZE = int(os.environ.get('LEAD_INSERT_BATCH_SIZE', '1000'))  # Rows per executemany/COPY statement
+    LEAD_EXPORT_BATCH_SIZE = int(os.environ.get('LEAD_EXPORT_BATCH_SIZE', '1000'))  # Rows fetched per cursor batch when exporting
+    PARQUET_ROW_GROUP_SIZE = int(os.environ.get('PARQUET_ROW_GROUP_SIZE', '10000'))  # Rows per Parquet row group
+    PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+    WRITE_CSV_FILES = os.environ.get('WRITE_CSV_FILES', 'false').lower() == 'true'  # Also keep a CSV copy in EXPORT_FOLDER
+    
+    # Cross-job deduplication: 'skip' drops known leads, 'merge' fills blanks in the stored lead, 'off' stores everything
+    DEDUP_MODE = os.environ.get('DEDUP_MODE', 'skip')
+    
+    # Leads API
+    LEADS_PAGE_SIZE = int(os.environ.get('LEADS_PAGE_SIZE', '100'))  # Default page size for /leads
+    LEADS_MAX_PAGE_SIZE = int(os.environ.get('LEADS_MAX_PAGE_SIZE', '1000'))
+    
+    # Dashboard
+    DASHBOARD_JOBS_PER_PAGE = int(os.environ.get('DASHBOARD_JOBS_PER_PAGE', '25'))
+    DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', '30'))  # Seconds job statistics are cached in Redis
+    
+    # Live job progress stream (server-sent events)
+    SSE_KEEPALIVE_SECONDS = int(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))  # Idle streams get a comment this often so proxies keep them open
+    SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', '300'))  # Streams close after this and the browser reconnects
+    
     # File paths
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     EXPORT_FOLDER = os.environ.get('EXPORT_FOLDER', 'exports')
@@ -0,0 +1,24 @@
+"""
+Shared fixtures: tests run against a throwaway SQLite database
+"""
+import os
+import tempfile
+import pytest
+from sqlalchemy import text
+
+# Set before app is imported, so tests never touch a real database
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='apollo-tests-'), 'test.db')}"
+
+from app import app, db
+
+@pytest.fixture
+def database():
+    """An app context over freshly migrated tables, dropped afterwards"""
+    import migrations
+    with app.app_context():
+        migrations.run_migrations()
+        yield db
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as conn:
+            conn.execute(text('DROP TABLE IF EXISTS schema_version'))
@@ -0,0 +1,40 @@
+"""
+Weighted fair queuing arithmetic for the account pool scheduler.
+
+A job's tag is its virtual start plus the pages it has been served divided
+by its priority. The next unit goes to the job whose tag after that unit
+would be lowest. A job joining the backlog starts at the system virtual
+time (the lowest tag among jobs already waiting) rather than at zero, so
+it shares the pool with them instead of taking every unit until it has
+caught up.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+Backlog = namedtuple('Backlog', ['job_id', 'start', 'served_pages', 'priority', 'created_at'])
+
+def _weight(priority):
+    return max(priority or 1, 1)
+
+def current_tag(backlog):
+    """Virtual time a job has reached with the pages served so far"""
+    return (backlog.start or 0.0) + backlog.served_pages / _weight(backlog.priority)
+
+def finish_tag(backlog, unit_pages):
+    """Virtual time the job would reach after one more unit"""
+    return current_tag(backlog) + unit_pages / _weight(backlog.priority)
+
+def virtual_time(backlogs):
+    """System virtual time: the lowest tag among backlogged jobs, 0 when none are waiting"""
+    return min((current_tag(backlog) for backlog in backlogs), default=0.0)
+
+def catch_up_start(backlog, now):
+    """Virtual start that puts a job joining the backlog at least at virtual time now"""
+    return max(backlog.start or 0.0, now - backlog.served_pages / _weight(backlog.priority))
+
+def pick_next(backlogs, unit_pages):
+    """Job ID to serve next: earliest finish tag, then oldest job"""
+    best = min(backlogs, key=lambda backlog: (
+        finish_tag(backlog, unit_pages), backlog.created_at or datetime.min, backlog.job_id
+    ))
+    return best.job_id
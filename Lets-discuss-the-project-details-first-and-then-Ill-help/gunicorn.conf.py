@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for the web process, shared by every deploy target.
+
+Browsers hold progress streams (/events, /job_events/<id>) open for up to
+SSE_MAX_STREAM_SECONDS, one per dashboard tab and progress modal. Requests
+therefore run on gevent greenlets: an open stream costs a greenlet instead
+of one of a few threads every other request also needs.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = 'gevent'
+# One process: without Redis, progress events are only delivered within it
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', '1000'))  # Concurrent requests and streams per worker
+
+def post_fork(server, worker):
+    # psycopg2 would block every greenlet in the worker while a query runs
+    if os.environ.get('DATABASE_URL', '').startswith('postgres'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -0,0 +1,60 @@
+"""
+Dashboard job statistics, aggregated in SQL and cached briefly in Redis
+"""
+import json
+import logging
+from sqlalchemy import func
+from app import db, redis_client
+from models import ScrapingJob
+from config import Config
+
+STATS_CACHE_KEY = 'dashboard_stats'
+
+def compute_job_stats():
+    """Job counts and lead totals from a single GROUP BY over status"""
+    rows = db.session.query(
+        ScrapingJob.status,
+        func.count(ScrapingJob.id),
+        func.coalesce(func.sum(ScrapingJob.scraped_leads), 0)
+    ).group_by(ScrapingJob.status).all()
+
+    counts = {status: count for status, count, _ in rows}
+    leads = {status: total for status, _, total in rows}
+    total_jobs = sum(counts.values())
+    completed_jobs = counts.get('completed', 0)
+
+    return {
+        'total_jobs': total_jobs,
+        'completed_jobs': completed_jobs,
+        'failed_jobs': counts.get('failed', 0),
+        'running_jobs': counts.get('pending', 0) + counts.get('running', 0),
+        'total_leads_scraped': int(leads.get('completed', 0)),
+        'success_rate': (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
+    }
+
+def get_job_stats():
+    """Dashboard statistics, served from Redis for up to DASHBOARD_STATS_TTL seconds"""
+    if redis_client is not None:
+        try:
+            cached = redis_client.get(STATS_CACHE_KEY)
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logging.warning(f"Could not read cached dashboard stats: {str(e)}")
+
+    stats = compute_job_stats()
+
+    if redis_client is not None:
+        try:
+            redis_client.setex(STATS_CACHE_KEY, Config.DASHBOARD_STATS_TTL, json.dumps(stats))
+        except Exception as e:
+            logging.warning(f"Could not cache dashboard stats: {str(e)}")
+    return stats
+
+def invalidate_job_stats():
+    """Drop cached statistics after a job is created, changes status or is deleted"""
+    if redis_client is not None:
+        try:
+            redis_client.delete(STATS_CACHE_KEY)
+        except Exception as e:
+            logging.warning(f"Could not invalidate dashboard stats: {str(e)}")
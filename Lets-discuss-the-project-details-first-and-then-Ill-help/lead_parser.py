@@ -0,0 +1,255 @@
+"""
+Lead extraction from Apollo search results: single-pass parsing of the
+rendered HTML, or mapping of the search API's JSON response
+"""
+import json
+import time
+from datetime import date
+import soupsieve as sv
+from bs4 import BeautifulSoup
+from utils import clean_text, extract_email, extract_phone
+from metrics import SELECTOR_MISSES_TOTAL
+from selector_cache import SelectorCache
+
+# Selectors identifying a single lead row, tried in order
+LEAD_ROW_SELECTORS = [
+    '[data-cy="person"]',
+    '.zp_xVJ20',
+    '[class*="person-row"]',
+    '[class*="contact-row"]'
+]
+
+# Fallback selectors for each field, tried in order until one yields a value
+FIELD_SELECTORS = {
+    'full_name': [
+        '[data-cy="person-name"]',
+        '.zp_xVJ20',
+        '.person-name',
+        '[class*="name"]'
+    ],
+    'email': [
+        '[data-cy="person-email"]',
+        '.zp_Iu6Pf',
+        '[class*="email"]',
+        'a[href^="mailto:"]'
+    ],
+    'phone': [
+        '[data-cy="person-phone"]',
+        '.zp_Yz4Ml',
+        '[class*="phone"]'
+    ],
+    'linkedin_url': [
+        'a[href*="linkedin.com"]',
+        '[data-cy="person-linkedin"]'
+    ],
+    'job_title': [
+        '[data-cy="person-title"]',
+        '.zp_Y6y8d',
+        '[class*="title"]',
+        '[class*="job-title"]'
+    ],
+    'company_name': [
+        '[data-cy="person-company"]',
+        '.zp_J1j1x',
+        '[class*="company"]'
+    ],
+    'location': [
+        '[data-cy="person-location"]',
+        '.zp_MC4wf',
+        '[class*="location"]'
+    ],
+    'company_domain': [
+        'a[href*="/companies/"]'
+    ]
+}
+
+def _compile(selectors):
+    return [(selector, sv.compile(selector)) for selector in selectors]
+
+# Compiled once at import so parsing a page never re-parses selector strings
+ROW_PATTERNS = _compile(LEAD_ROW_SELECTORS)
+FIELD_PATTERNS = {field: _compile(selectors) for field, selectors in FIELD_SELECTORS.items()}
+
+# Field selectors reordered by which ones have been producing values
+SELECTOR_CACHE = SelectorCache(FIELD_PATTERNS)
+
+def _read_text(element):
+    return clean_text(element.get_text(' ', strip=True))
+
+def _read_email(element):
+    email = _read_text(element) or element.get('href', '').replace('mailto:', '')
+    return email if '@' in email else ''
+
+def _read_linkedin(element):
+    href = element.get('href', '')
+    return href if 'linkedin.com' in href else ''
+
+def _read_company_domain(element):
+    href = element.get('href', '')
+    if '/companies/' in href:
+        return href.split('/companies/')[-1].split('/')[0]
+    return ''
+
+FIELD_READERS = {
+    'full_name': _read_text,
+    'email': _read_email,
+    'phone': _read_text,
+    'linkedin_url': _read_linkedin,
+    'job_title': _read_text,
+    'company_name': _read_text,
+    'location': _read_text,
+    'company_domain': _read_company_domain
+}
+
+# Regex fallbacks over the row HTML when no selector produced a value
+FIELD_FALLBACKS = {
+    'email': extract_email,
+    'phone': extract_phone
+}
+
+def empty_lead():
+    """Return a lead dict with every field at its default value"""
+    return {
+        'first_name': '',
+        'last_name': '',
+        'full_name': '',
+        'email': '',
+        'phone': '',
+        'linkedin_url': '',
+        'job_title': '',
+        'seniority': '',
+        'department': '',
+        'company_name': '',
+        'company_domain': '',
+        'company_website': '',
+        'company_industry': '',
+        'company_size': '',
+        'company_location': '',
+        'company_linkedin': '',
+        'years_experience': 0,
+        'location': '',
+        'raw_data': ''
+    }
+
+def extract_field(row, field, row_html=''):
+    """Return the first non-empty value for a field from a parsed lead row"""
+    read = FIELD_READERS[field]
+    patterns = SELECTOR_CACHE.ordered(field)
+    for position, (selector, pattern) in enumerate(patterns):
+        element = pattern.select_one(row)
+        if element is not None:
+            value = read(element)
+            if value:
+                SELECTOR_CACHE.record(field, selector, [missed for missed, _ in patterns[:position]])
+                return value
+
+    fallback = FIELD_FALLBACKS.get(field)
+    value = fallback(row_html) if fallback and row_html else ''
+    if not value:
+        SELECTOR_MISSES_TOTAL.labels(field).inc()
+    return value
+
+def parse_lead_row(row, timings=None):
+    """Extract lead data from a parsed lead row.
+
+    If a timings dict is given, seconds spent per field are accumulated into it.
+    """
+    row_html = row.decode_contents()
+    lead_data = empty_lead()
+    lead_data['raw_data'] = json.dumps(row_html)
+
+    for field in FIELD_SELECTORS:
+        if timings is None:
+            lead_data[field] = extract_field(row, field, row_html)
+        else:
+            started = time.perf_counter()
+            lead_data[field] = extract_field(row, field, row_html)
+            timings[field] = timings.get(field, 0.0) + time.perf_counter() - started
+
+    if lead_data['full_name']:
+        name_parts = lead_data['full_name'].split(' ')
+        lead_data['first_name'] = name_parts[0]
+        lead_data['last_name'] = ' '.join(name_parts[1:])
+
+    return lead_data
+
+def find_lead_rows(soup):
+    """Return lead row elements using the first row selector that matches"""
+    for selector, pattern in ROW_PATTERNS:
+        rows = pattern.select(soup)
+        if rows:
+            return rows
+    return []
+
+def parse_results_html(html, timings=None):
+    """Parse every lead with a name out of a results page HTML fragment"""
+    soup = BeautifulSoup(html, 'html.parser')
+    leads = []
+    for row in find_lead_rows(soup):
+        lead_data = parse_lead_row(row, timings)
+        if lead_data['full_name']:
+            leads.append(lead_data)
+    return leads
+
+def _join(*parts):
+    return ', '.join(clean_text(part) for part in parts if part)
+
+def _years_experience(person):
+    """Years since the earliest start date in the person's employment history"""
+    years = [int(job['start_date'][:4]) for job in person.get('employment_history') or []
+             if (job.get('start_date') or '')[:4].isdigit()]
+    return max(date.today().year - min(years), 0) if years else 0
+
+def parse_api_person(person):
+    """Map one person (or saved contact) from the search API response to lead fields"""
+    organization = person.get('organization') or person.get('account') or {}
+    lead_data = empty_lead()
+    lead_data['raw_data'] = json.dumps(person)
+
+    lead_data['first_name'] = clean_text(person.get('first_name'))
+    lead_data['last_name'] = clean_text(person.get('last_name'))
+    lead_data['full_name'] = clean_text(person.get('name')) or ' '.join(
+        part for part in (lead_data['first_name'], lead_data['last_name']) if part
+    )
+
+    # Locked emails come back as a placeholder address
+    email = person.get('email') or ''
+    if '@' in email and not email.startswith('email_not_unlocked'):
+        lead_data['email'] = email.strip()
+
+    phones = [phone.get('sanitized_number') or phone.get('raw_number') for phone in person.get('phone_numbers') or []]
+    lead_data['phone'] = next((phone for phone in phones if phone), None) or person.get('sanitized_phone') or ''
+    lead_data['linkedin_url'] = person.get('linkedin_url') or ''
+
+    lead_data['job_title'] = clean_text(person.get('title'))
+    lead_data['seniority'] = clean_text(person.get('seniority'))
+    lead_data['department'] = _join(*(person.get('departments') or []))
+
+    lead_data['company_name'] = clean_text(organization.get('name') or person.get('organization_name'))
+    lead_data['company_domain'] = organization.get('primary_domain') or ''
+    lead_data['company_website'] = organization.get('website_url') or ''
+    lead_data['company_industry'] = clean_text(organization.get('industry'))
+    if organization.get('estimated_num_employees'):
+        lead_data['company_size'] = str(organization['estimated_num_employees'])
+    lead_data['company_location'] = (_join(organization.get('city'), organization.get('state'), organization.get('country'))
+                                     or clean_text(organization.get('raw_address')))
+    lead_data['company_linkedin'] = organization.get('linkedin_url') or ''
+
+    lead_data['years_experience'] = _years_experience(person)
+    lead_data['location'] = (_join(person.get('city'), person.get('state'), person.get('country'))
+                             or clean_text(person.get('present_raw_address')))
+
+    return lead_data
+
+def parse_api_people(payload):
+    """Every lead with a name in a people search API response, saved contacts first"""
+    leads = []
+    for person in (payload.get('contacts') or []) + (payload.get('people') or []):
+        lead_data = parse_api_person(person)
+        if lead_data['full_name']:
+            leads.append(lead_data)
+    return leads
+
+def api_total_results(payload):
+    """Total matches reported by a people search API response, or None"""
+    return (payload.get('pagination') or {}).get('total_entries')
@@ -0,0 +1,497 @@
+"""
+Incremental persistence of scraped leads to the database and CSV export
+"""
+import io
+import os
+import csv
+import hashlib
+import time
+import logging
+from datetime import datetime
+from sqlalchemy import insert, select, text
+from app import db
+from models import Lead, LeadFingerprint, LeadRawData
+from utils import sanitize_filename, normalize_linkedin_url, normalize_email, normalize_person_company
+from config import Config
+from metrics import DB_FLUSH_SECONDS, LEADS_TOTAL
+
+# Lead columns populated from scraped lead dicts, with their defaults
+LEAD_FIELDS = {
+    'first_name': '',
+    'last_name': '',
+    'full_name': '',
+    'email': '',
+    'phone': '',
+    'linkedin_url': '',
+    'job_title': '',
+    'seniority': '',
+    'department': '',
+    'company_name': '',
+    'company_domain': '',
+    'company_website': '',
+    'company_industry': '',
+    'company_size': '',
+    'company_location': '',
+    'company_linkedin': '',
+    'years_experience': 0,
+    'location': ''
+}
+
+CSV_HEADERS = [
+    'First Name', 'Last Name', 'Full Name', 'Email', 'Phone',
+    'LinkedIn URL', 'Job Title', 'Seniority', 'Department',
+    'Company Name', 'Company Domain', 'Company Website',
+    'Company Industry', 'Company Size', 'Company Location',
+    'Company LinkedIn', 'Years Experience', 'Location', 'Scraped At'
+]
+
+# Lead fields in CSV column order (everything but the trailing timestamp)
+CSV_FIELDS = list(LEAD_FIELDS)
+
+# Fields the leads API can return, in Lead.to_dict() order
+LEAD_API_FIELDS = ['id', 'job_id'] + CSV_FIELDS + ['created_at']
+
+# Fields the leads API can filter on by exact match (each has a (job_id, field) index)
+LEAD_FILTER_FIELDS = ['email', 'company_domain', 'company_name', 'seniority']
+
+def lead_values(job_id, lead_data):
+    """Map a scraped lead dict to Lead column values, plus its raw_data for the side table"""
+    values = {field: lead_data.get(field, default) for field, default in LEAD_FIELDS.items()}
+    values['job_id'] = job_id
+    values['raw_data'] = lead_data.get('raw_data', '')
+    return values
+
+def lead_fingerprints(lead_data):
+    """Dedup keys for a lead: normalized LinkedIn URL, email, and name + company"""
+    keys = [
+        ('linkedin', normalize_linkedin_url(lead_data.get('linkedin_url'))),
+        ('email', normalize_email(lead_data.get('email'))),
+        ('name_company', normalize_person_company(lead_data.get('full_name'), lead_data.get('company_name')))
+    ]
+    return [f"{kind}:{hashlib.sha1(value.encode('utf-8')).hexdigest()}" for kind, value in keys if value]
+
+def _insert_ignoring_conflicts(model):
+    """INSERT that silently skips rows violating a unique constraint"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(model).prefix_with('IGNORE')
+    return dialect_insert(model).on_conflict_do_nothing()
+
+def _insert_fingerprints(rows, ids):
+    """Index inserted leads; a key already indexed keeps pointing at the first lead"""
+    fingerprints = [
+        {'fingerprint': fingerprint, 'lead_id': lead_id, 'job_id': row['job_id']}
+        for row, lead_id in zip(rows, ids)
+        for fingerprint in lead_fingerprints(row)
+    ]
+    if fingerprints:
+        db.session.execute(_insert_ignoring_conflicts(LeadFingerprint), fingerprints)
+
+def find_known_leads(fingerprints):
+    """Map each already-indexed fingerprint to the lead id it belongs to"""
+    known = {}
+    fingerprints = list(fingerprints)
+    for start in range(0, len(fingerprints), 500):
+        chunk = fingerprints[start:start + 500]
+        known.update(db.session.execute(
+            select(LeadFingerprint.fingerprint, LeadFingerprint.lead_id)
+            .where(LeadFingerprint.fingerprint.in_(chunk))
+        ).tuples().all())
+    return known
+
+def merge_into_leads(merges):
+    """Fill blank columns of stored leads from duplicates scraped later.
+
+    ``merges`` is a list of (lead_id, lead_data); new keys (say, an email
+    the first scrape missed) are added to the dedup index.
+    """
+    leads = {lead.id: lead for lead in Lead.query.filter(Lead.id.in_({lead_id for lead_id, _ in merges}))}
+    for lead_id, lead_data in merges:
+        lead = leads.get(lead_id)
+        if lead is None:
+            continue
+        for field in CSV_FIELDS:
+            value = lead_data.get(field)
+            if value and not getattr(lead, field):
+                setattr(lead, field, value)
+
+    _insert_fingerprints([lead_values(lead.job_id, {field: getattr(lead, field) for field in CSV_FIELDS})
+                          for lead in leads.values()], list(leads))
+    db.session.commit()
+    return len(leads)
+
+def _copy_value(value):
+    """Render one value for PostgreSQL COPY ... CSV (unquoted empty means NULL)"""
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_insert(rows):
+    """Insert rows with PostgreSQL COPY, allocating ids from the sequence up front"""
+    session = db.session
+    ids = [row[0] for row in session.execute(
+        text("SELECT nextval(pg_get_serial_sequence('lead', 'id')) FROM generate_series(1, :n)"),
+        {'n': len(rows)}
+    )]
+    created_at = datetime.utcnow()
+    columns = ['id', 'created_at', 'job_id'] + list(LEAD_FIELDS)
+
+    buffer = io.StringIO()
+    for lead_id, row in zip(ids, rows):
+        values = [lead_id, created_at, row['job_id']] + [row.get(field) for field in LEAD_FIELDS]
+        buffer.write(','.join(_copy_value(value) for value in values) + '\n')
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY lead ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+    return ids
+
+def _executemany_insert(rows):
+    """Insert rows with a single executemany, returning ids where the dialect supports it"""
+    dialect = db.session.get_bind().dialect
+    if getattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False):
+        result = db.session.execute(insert(Lead).returning(Lead.id, sort_by_parameter_order=True), rows)
+        return list(result.scalars())
+    db.session.execute(insert(Lead), rows)
+    return [None] * len(rows)
+
+def _insert_raw_data(rows, ids):
+    """Store compressed raw_data for inserted leads that have any"""
+    raw_rows = [
+        {'lead_id': lead_id, 'data': LeadRawData.compress(row['raw_data'])}
+        for row, lead_id in zip(rows, ids)
+        if row.get('raw_data') and lead_id is not None
+    ]
+    if raw_rows:
+        db.session.execute(insert(LeadRawData), raw_rows)
+
+def _insert_batch(rows):
+    lead_rows = [{key: value for key, value in row.items() if key != 'raw_data'} for row in rows]
+    if db.session.get_bind().dialect.name == 'postgresql':
+        ids = _copy_insert(lead_rows)
+    else:
+        ids = _executemany_insert(lead_rows)
+    _insert_fingerprints(rows, ids)
+    _insert_raw_data(rows, ids)
+    return ids
+
+def bulk_insert_leads(rows, batch_size=None):
+    """Insert Lead column dicts in batches and commit each batch.
+
+    Uses COPY on PostgreSQL and executemany elsewhere. The new leads'
+    fingerprints and compressed raw_data are written in the same transaction. A failing batch is
+    rolled back and retried row by row, so one bad row only loses itself.
+    Returns a list aligned with ``rows``: the new id (None if the dialect
+    cannot return it) or False for rows that could not be inserted.
+    """
+    batch_size = batch_size or Config.LEAD_INSERT_BATCH_SIZE
+    inserted = []
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        try:
+            inserted.extend(_insert_batch(batch))
+            db.session.commit()
+            continue
+        except Exception as e:
+            db.session.rollback()
+            logging.warning(f"Lead batch insert failed, retrying {len(batch)} rows individually: {str(e)}")
+
+        for row in batch:
+            try:
+                inserted.extend(_insert_batch([row]))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                inserted.append(False)
+                logging.error(f"Error saving lead: {str(e)}")
+
+    return inserted
+
+def parse_lead_fields(fields_param):
+    """Parse a comma-separated ?fields= projection; all API fields when empty"""
+    if not fields_param:
+        return list(LEAD_API_FIELDS)
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in LEAD_API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown lead fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+def lead_select(job_id, fields, filters=None, after_id=None):
+    """SELECT of the given lead columns (plus id) for a job, or all jobs if job_id is None, ordered by id"""
+    columns = [getattr(Lead, field) for field in dict.fromkeys(['id'] + fields)]
+
+    query = select(*columns)
+    if job_id is not None:
+        query = query.where(Lead.job_id == job_id)
+    for field, value in (filters or {}).items():
+        query = query.where(getattr(Lead, field) == value)
+    if after_id is not None:
+        query = query.where(Lead.id > after_id)
+    return query.order_by(Lead.id)
+
+def select_leads(job_id, fields=None, filters=None, after_id=None, limit=None):
+    """Fetch one keyset page of a job's leads, ordered by id.
+
+    Only the requested columns are selected and no ORM objects are built.
+    Returns (leads, last_id) where last_id is the cursor for the next page.
+    """
+    fields = fields or LEAD_API_FIELDS
+    query = lead_select(job_id, fields, filters, after_id)
+    if limit:
+        query = query.limit(limit)
+
+    leads = []
+    last_id = None
+    for row in db.session.execute(query).mappings():
+        last_id = row['id']
+        lead = {field: row[field] for field in fields}
+        if lead.get('created_at') is not None:
+            lead['created_at'] = lead['created_at'].isoformat()
+        leads.append(lead)
+    return leads, last_id
+
+def iter_leads(job_id, fields=None, filters=None, after_id=None, batch_size=None):
+    """Yield every matching lead, reading the table in keyset batches"""
+    batch_size = batch_size or Config.LEADS_MAX_PAGE_SIZE
+    while True:
+        leads, last_id = select_leads(job_id, fields, filters, after_id, batch_size)
+        # Don't keep a transaction open while the caller streams the batch out
+        db.session.close()
+        yield from leads
+        if len(leads) < batch_size:
+            return
+        after_id = last_id
+
+def csv_row(lead_data, scraped_at):
+    return [lead_data.get(field, LEAD_FIELDS[field]) for field in CSV_FIELDS] + [scraped_at]
+
+def new_csv_filename(job_id):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return sanitize_filename(f"apollo_leads_job_{job_id}_{timestamp}.csv")
+
+def append_csv_rows(filename, leads_data):
+    """Append leads to a CSV export, writing the header if the file is new"""
+    os.makedirs(Config.EXPORT_FOLDER, exist_ok=True)
+    csv_path = os.path.join(Config.EXPORT_FOLDER, filename)
+    write_header = not os.path.exists(csv_path)
+    scraped_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        if write_header:
+            writer.writerow(CSV_HEADERS)
+        for lead in leads_data:
+            writer.writerow(csv_row(lead, scraped_at))
+    return csv_path
+
+def iter_csv_export(job_id, filters=None):
+    """Yield a job's leads as CSV text, one chunk per batch.
+
+    Rows are read through a server-side cursor (yield_per), so memory stays
+    constant however many leads the job has.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADERS)
+    yield buffer.getvalue()
+
+    query = lead_select(job_id, CSV_FIELDS + ['created_at'], filters)
+    result = db.session.execute(query.execution_options(yield_per=Config.LEAD_EXPORT_BATCH_SIZE))
+    for partition in result.mappings().partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        for row in partition:
+            scraped_at = row['created_at'].strftime("%Y-%m-%d %H:%M:%S") if row['created_at'] else ''
+            writer.writerow([row[field] for field in CSV_FIELDS] + [scraped_at])
+        yield buffer.getvalue()
+
+# Low-cardinality columns stored dictionary-encoded in Parquet exports
+PARQUET_DICTIONARY_FIELDS = ['company_name', 'company_industry', 'seniority', 'location']
+
+class _ChunkSink:
+    """Write-only file object that collects what the Parquet writer emits.
+
+    Lets a writer that expects a file stream its output: the caller drains
+    the collected bytes after every row group. tell() tracks the total
+    written so the writer can record column chunk offsets.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_schema():
+    """Arrow schema for exported leads, derived from the Lead column types"""
+    import pyarrow as pa
+
+    types = {'INTEGER': pa.int64(), 'DATETIME': pa.timestamp('us')}
+    return pa.schema([
+        pa.field(field, types.get(str(Lead.__table__.columns[field].type), pa.string()))
+        for field in LEAD_API_FIELDS
+    ])
+
+def parquet_export(job_id, filters=None):
+    """Return a generator of Parquet bytes for a job's leads.
+
+    pyarrow is optional: it is imported here, so a missing install raises
+    ImportError before any response is started. Each cursor batch of
+    PARQUET_ROW_GROUP_SIZE rows becomes one row group, so memory stays
+    bounded by a single group.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema,
+                                  compression=Config.PARQUET_COMPRESSION,
+                                  use_dictionary=PARQUET_DICTIONARY_FIELDS)
+        try:
+            query = lead_select(job_id, LEAD_API_FIELDS, filters)
+            result = db.session.execute(query.execution_options(yield_per=Config.PARQUET_ROW_GROUP_SIZE))
+            for partition in result.mappings().partitions():
+                columns = {field: [row[field] for row in partition] for field in LEAD_API_FIELDS}
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    return generate()
+
+class LeadWriter:
+    """Buffers scraped leads and flushes them in batches to the database.
+
+    Memory stays bounded by the batch size, and everything flushed before a
+    failure remains in the database. Downloads stream CSV from the database,
+    so the on-disk CSV copy is only written when write_csv is enabled.
+
+    Leads already in the dedup index are not stored again: with
+    dedup_mode='skip' they are dropped, with 'merge' their new details fill
+    blanks in the stored lead, and 'off' stores everything.
+    """
+
+    def __init__(self, job_id, batch_size=None, csv_filename=None, on_flush=None, write_csv=None, dedup_mode=None, profile=None):
+        self.job_id = job_id
+        self.batch_size = batch_size or Config.LEAD_FLUSH_BATCH_SIZE
+        self.csv_filename = csv_filename
+        self.write_csv = Config.WRITE_CSV_FILES if write_csv is None else write_csv
+        self.dedup_mode = dedup_mode or Config.DEDUP_MODE
+        self.on_flush = on_flush  # called as on_flush(last_page_persisted, saved) after each flush
+        self.profile = profile  # optional profiling.PhaseProfile timing persistence and export
+        self.buffer = []
+        self.buffered_page = None
+        self.saved = 0
+        self.failed = 0
+        self.duplicates = 0
+
+    def add(self, leads_data, page_num=None):
+        """Queue a page of leads, flushing whenever a full batch is buffered"""
+        self.buffer.extend(leads_data)
+        if page_num is not None:
+            self.buffered_page = page_num
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered leads to the database (and the CSV file, if enabled)"""
+        if not self.buffer:
+            return 0
+
+        batch, self.buffer = self.buffer, []
+        duplicates = self.duplicates
+        started = time.perf_counter()
+        with DB_FLUSH_SECONDS.time():
+            if self.dedup_mode != 'off':
+                batch = self.drop_duplicates(batch)
+            
+            inserted = bulk_insert_leads([lead_values(self.job_id, lead_data) for lead_data in batch])
+        if self.profile:
+            self.profile.add('persistence', time.perf_counter() - started)
+        saved = [lead_data for lead_data, lead_id in zip(batch, inserted) if lead_id is not False]
+        self.failed += len(batch) - len(saved)
+        self.saved += len(saved)
+        LEADS_TOTAL.labels('saved').inc(len(saved))
+        LEADS_TOTAL.labels('duplicate').inc(self.duplicates - duplicates)
+        LEADS_TOTAL.labels('failed').inc(len(batch) - len(saved))
+
+        if self.write_csv:
+            started = time.perf_counter()
+            try:
+                if self.csv_filename is None:
+                    self.csv_filename = new_csv_filename(self.job_id)
+                append_csv_rows(self.csv_filename, saved)
+            except Exception as e:
+                logging.error(f"Error appending to CSV export: {str(e)}")
+            if self.profile:
+                self.profile.add('export', time.perf_counter() - started)
+
+        if self.on_flush and self.buffered_page is not None:
+            self.on_flush(self.buffered_page, self.saved)
+
+        logging.debug(f"Flushed {len(saved)} leads for job {self.job_id} ({self.saved} total)")
+        return len(saved)
+
+    def drop_duplicates(self, batch):
+        """Return the leads of a batch not already known, merging the rest if configured"""
+        fingerprints = [lead_fingerprints(lead_data) for lead_data in batch]
+        known = find_known_leads({fingerprint for keys in fingerprints for fingerprint in keys})
+
+        fresh = []
+        merges = []
+        seen = set()
+        for lead_data, keys in zip(batch, fingerprints):
+            known_ids = [known[key] for key in keys if key in known]
+            if known_ids or seen.intersection(keys):
+                self.duplicates += 1
+                if self.dedup_mode == 'merge' and known_ids and known_ids[0] is not None:
+                    merges.append((known_ids[0], lead_data))
+                continue
+            seen.update(keys)
+            fresh.append(lead_data)
+
+        if merges:
+            try:
+                merge_into_leads(merges)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error merging duplicate leads: {str(e)}")
+
+        if len(fresh) < len(batch):
+            logging.info(f"Skipped {len(batch) - len(fresh)} duplicate leads for job {self.job_id}")
+        return fresh
+
+    def close(self):
+        """Flush whatever is still buffered"""
+        return self.flush()
@@ -1,4 +1,8 @@
 from app import app
 
 if __name__ == '__main__':
+    # The development server brings its own database up to date
+    import migrations
+    with app.app_context():
+        migrations.run_migrations()
     app.run(host='0.0.0.0', port=5000, debug=True)
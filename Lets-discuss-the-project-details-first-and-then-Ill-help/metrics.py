@@ -0,0 +1,105 @@
+"""
+Prometheus metrics for the scraping hot paths.
+
+prometheus_client is optional (pip install .[metrics]); without it every
+metric below is a no-op, so instrumented code never has to check. When
+PROMETHEUS_MULTIPROC_DIR is set, samples from all gunicorn and Celery
+prefork processes are written there and aggregated when scraped.
+"""
+import os
+import logging
+from contextlib import nullcontext
+from config import Config
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+# Where a job's wall-clock time goes
+PAGE_LOAD_SECONDS = _metric('Histogram', 'apollo_page_load_seconds',
+                            'Time from navigating to a results page until it is scraped', ['outcome'],
+                            buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60))
+LEAD_EXTRACTION_SECONDS = _metric('Histogram', 'apollo_lead_extraction_seconds',
+                                  'Time to extract one lead from its parsed row',
+                                  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+DELAY_SECONDS = _metric('Histogram', 'apollo_delay_seconds',
+                        'Time spent waiting between page loads', ['reason'],
+                        buckets=(0.1, 0.5, 1, 2, 5, 10, 20, 30, 60))
+DB_FLUSH_SECONDS = _metric('Histogram', 'apollo_db_flush_seconds',
+                           'Time to write one batch of leads to the database',
+                           buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+# Volumes
+LEADS_TOTAL = _metric('Counter', 'apollo_leads_total', 'Leads by what happened to them', ['result'])
+PAGES_TOTAL = _metric('Counter', 'apollo_pages_total', 'Results pages loaded, by outcome', ['outcome'])
+WEBDRIVER_CALLS_TOTAL = _metric('Counter', 'apollo_webdriver_calls_total', 'WebDriver round trips', ['call'])
+SELECTOR_MISSES_TOTAL = _metric('Counter', 'apollo_selector_misses_total',
+                                'Lead fields no selector or fallback produced a value for', ['field'])
+AUTH_FAILURES_TOTAL = _metric('Counter', 'apollo_auth_failures_total',
+                              'Sessions found logged out or failing the auth check')
+
+# Current state
+ACTIVE_DRIVERS = _metric('Gauge', 'apollo_active_drivers', 'Pooled Chrome sessions', ['state'],
+                         multiprocess_mode='livesum')
+QUEUE_DEPTH = _metric('Gauge', 'apollo_queue_depth', 'Work waiting to start', ['queue'],
+                      multiprocess_mode='livemax')
+
+def _registry():
+    """Registry to expose: aggregated across processes in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+def render_metrics():
+    """(payload, content type) for a /metrics response"""
+    return prometheus_client.generate_latest(_registry()), prometheus_client.CONTENT_TYPE_LATEST
+
+def start_worker_server():
+    """Serve metrics from a Celery worker on CELERY_METRICS_PORT, if configured.
+
+    Tasks run in the pool's child processes, so this server in the main process
+    only reports their metrics when PROMETHEUS_MULTIPROC_DIR is set; without it
+    the counters it serves stay at zero.
+    """
+    if prometheus_client is None or not Config.CELERY_METRICS_PORT:
+        return
+    try:
+        prometheus_client.start_http_server(Config.CELERY_METRICS_PORT, registry=_registry())
+        logging.info(f"Serving worker metrics on port {Config.CELERY_METRICS_PORT}")
+    except Exception as e:
+        logging.error(f"Could not start worker metrics server: {str(e)}")
+
+def mark_process_dead(pid):
+    """Drop a finished worker process's live gauges in multiprocess mode"""
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,232 @@
+"""
+Versioned schema migrations, applied by `flask --app main migrate` as a
+release step (and by the development server in main.py).
+
+db.create_all() only creates missing tables, so changes to existing tables
+are listed here and applied once per database, tracked in schema_version.
+Two deploys can release at once, so it holds a lock across processes while
+checking and applying migrations.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import MetaData, inspect, insert, text
+from app import db
+from models import ScrapingJob, Lead, LeadRawData
+
+def add_columns(table, columns):
+    """Add columns (name -> SQL type) that the table does not have yet"""
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table)}
+    with db.engine.begin() as conn:
+        for name, sql_type in columns.items():
+            if name not in existing:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {sql_type}'))
+                logging.info(f"Added column {table}.{name}")
+
+def create_indexes(model):
+    """Create the indexes declared on a model that the table does not have yet"""
+    for index in model.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+        logging.info(f"Ensured index {index.name}")
+
+def add_job_checkpoint_columns():
+    add_columns('scraping_job', {
+        'last_completed_page': 'INTEGER DEFAULT 0',
+        'checkpoint_leads': 'INTEGER DEFAULT 0',
+        'checkpoint_url': 'TEXT',
+        'checkpoint_at': 'TIMESTAMP'
+    })
+
+def add_lead_indexes():
+    create_indexes(Lead)
+
+def backfill_lead_fingerprints(batch_size=1000):
+    """Index leads stored before deduplication existed (the oldest lead keeps each key)"""
+    from lead_store import lead_select, _insert_fingerprints
+    
+    add_columns('scraping_job', {'duplicate_leads': 'INTEGER DEFAULT 0'})
+    
+    fields = ['job_id', 'linkedin_url', 'email', 'full_name', 'company_name']
+    after_id = None
+    indexed = 0
+    while True:
+        rows = db.session.execute(lead_select(None, fields, after_id=after_id).limit(batch_size)).mappings().all()
+        if not rows:
+            break
+        _insert_fingerprints(rows, [row['id'] for row in rows])
+        db.session.commit()
+        indexed += len(rows)
+        after_id = rows[-1]['id']
+    logging.info(f"Indexed fingerprints for {indexed} existing leads")
+
+def move_raw_data_to_side_table(batch_size=1000):
+    """Copy lead.raw_data into lead_raw_data, compressed (leads already copied are skipped)"""
+    raw_data = text('SELECT id, raw_data FROM lead WHERE id > :after_id AND raw_data IS NOT NULL '
+                    "AND raw_data != '' AND id NOT IN (SELECT lead_id FROM lead_raw_data) "
+                    'ORDER BY id LIMIT :limit')
+    after_id = 0
+    moved = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(raw_data, {'after_id': after_id, 'limit': batch_size}).all()
+            if not rows:
+                break
+            conn.execute(insert(LeadRawData.__table__), [
+                {'lead_id': lead_id, 'data': LeadRawData.compress(value)} for lead_id, value in rows
+            ])
+        moved += len(rows)
+        after_id = rows[-1][0]
+    logging.info(f"Moved raw_data of {moved} leads to lead_raw_data")
+
+def rebuild_sqlite_lead_table():
+    """Recreate lead from the model: drops raw_data and adds ON DELETE CASCADE.
+
+    SQLite cannot alter a column or foreign key in place, so this follows its
+    documented procedure: build a new table, copy, drop, rename.
+    """
+    columns = ', '.join(column.name for column in Lead.__table__.columns)
+    metadata = MetaData()
+    ScrapingJob.__table__.to_metadata(metadata)
+    new_table = Lead.__table__.to_metadata(metadata, name='lead_new')
+    
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        conn.commit()
+        with conn.begin():
+            for index in inspect(conn).get_indexes('lead'):
+                conn.execute(text(f'DROP INDEX {index["name"]}'))
+            new_table.create(conn)
+            conn.execute(text(f'INSERT INTO lead_new ({columns}) SELECT {columns} FROM lead'))
+            conn.execute(text('DROP TABLE lead'))
+            conn.execute(text('ALTER TABLE lead_new RENAME TO lead'))
+        conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+        conn.commit()
+
+def alter_postgresql_lead_table():
+    """Drop raw_data and replace the job foreign key with an ON DELETE CASCADE one"""
+    with db.engine.begin() as conn:
+        for foreign_key in inspect(conn).get_foreign_keys('lead'):
+            if foreign_key['referred_table'] == 'scraping_job':
+                conn.execute(text(f'ALTER TABLE lead DROP CONSTRAINT {foreign_key["name"]}'))
+        conn.execute(text('ALTER TABLE lead ADD CONSTRAINT lead_job_id_fkey FOREIGN KEY (job_id) '
+                          'REFERENCES scraping_job (id) ON DELETE CASCADE'))
+        conn.execute(text('ALTER TABLE lead DROP COLUMN IF EXISTS raw_data'))
+
+def lead_table_is_current():
+    """True if lead has no raw_data column and cascades job deletes"""
+    inspector = inspect(db.engine)
+    if 'raw_data' in {column['name'] for column in inspector.get_columns('lead')}:
+        return False
+    return all(foreign_key['options'].get('ondelete', '').upper() == 'CASCADE'
+               for foreign_key in inspector.get_foreign_keys('lead')
+               if foreign_key['referred_table'] == 'scraping_job')
+
+def tune_job_and_lead_schema():
+    create_indexes(ScrapingJob)
+    
+    if 'raw_data' in {column['name'] for column in inspect(db.engine).get_columns('lead')}:
+        move_raw_data_to_side_table()
+    
+    if not lead_table_is_current():
+        if db.engine.dialect.name == 'sqlite':
+            rebuild_sqlite_lead_table()
+        elif db.engine.dialect.name == 'postgresql':
+            alter_postgresql_lead_table()
+        else:
+            logging.warning(f"Lead table not altered on {db.engine.dialect.name}; raw_data column left in place")
+    
+    create_indexes(Lead)
+
+def add_job_request_count():
+    add_columns('scraping_job', {'requests_made': 'INTEGER DEFAULT 0'})
+
+def add_job_scheduling_columns():
+    add_columns('scraping_job', {
+        'scheduled': 'BOOLEAN DEFAULT FALSE',
+        'priority': 'INTEGER DEFAULT 3'
+    })
+
+def add_phase_profiles():
+    add_columns('scraping_job', {'profile': 'JSON'})
+    add_columns('work_unit', {'profile': 'JSON'})
+
+def add_job_extraction_mode():
+    add_columns('scraping_job', {'extraction_mode': "VARCHAR(10) DEFAULT 'dom'"})
+
+def add_job_browser_profile():
+    add_columns('scraping_job', {'browser_profile': "VARCHAR(10) DEFAULT 'full'"})
+
+def add_job_virtual_start():
+    add_columns('scraping_job', {'virtual_start': 'FLOAT DEFAULT 0'})
+
+# (version, description, function) in the order they must be applied
+MIGRATIONS = [
+    (1, 'Add scraping job checkpoint columns', add_job_checkpoint_columns),
+    (2, 'Add lead pagination and filter indexes', add_lead_indexes),
+    (3, 'Add cross-job lead dedup index', backfill_lead_fingerprints),
+    (4, 'Index jobs and leads, cascade lead deletes, move raw_data to a side table', tune_job_and_lead_schema),
+    (5, 'Add scraping job request count', add_job_request_count),
+    (6, 'Add scraping job scheduling columns', add_job_scheduling_columns),
+    (7, 'Add phase timing profiles', add_phase_profiles),
+    (8, 'Add scraping job extraction mode', add_job_extraction_mode),
+    (9, 'Add scraping job browser profile', add_job_browser_profile),
+    (10, 'Add scraping job fair queuing start tag', add_job_virtual_start),
+]
+
+MIGRATION_LOCK_KEY = 7316001  # pg_advisory_lock key reserved for schema migrations
+
+@contextmanager
+def migration_lock():
+    """Hold a lock shared by every process using the database while migrating.
+
+    PostgreSQL uses a session advisory lock. SQLite uses an exclusive flock on
+    a temp file named after the database path instead of BEGIN IMMEDIATE: a
+    write transaction held that long would block the migrations' own
+    connections, and PRAGMA foreign_keys (needed to rebuild lead) cannot
+    change inside one.
+    """
+    dialect = db.engine.dialect.name
+    database = db.engine.url.database
+    if dialect == 'postgresql':
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+                conn.commit()
+    elif dialect == 'sqlite' and database and database != ':memory:':
+        import fcntl
+
+        digest = hashlib.sha256(os.path.abspath(database).encode('utf-8')).hexdigest()[:16]
+        with open(os.path.join(tempfile.gettempdir(), f'apollo-migrations-{digest}.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+def get_schema_version():
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+        version = conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar()
+    return version or 0
+
+def run_migrations():
+    """Create missing tables, then apply every migration newer than the database's schema version"""
+    with migration_lock():
+        db.create_all()
+        # Read under the lock: another process may have just migrated
+        current = get_schema_version()
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            logging.info(f"Applying migration {version}: {description}")
+            migrate()
+            with db.engine.begin() as conn:
+                conn.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': version})
@@ -1,8 +1,16 @@
 from app import db
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 import json
+import zlib
 
 class ScrapingJob(db.Model):
+    __table_args__ = (
+        # Newest-first job listings, overall and per status
+        db.Index('ix_scraping_job_created_at', 'created_at'),
+        db.Index('ix_scraping_job_status_created_at', 'status', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.String(255), unique=True, nullable=False)
     search_url = db.Column(db.Text, nullable=False)
@@ -19,6 +27,38 @@ class ScrapingJob(db.Model):
     delay_between_requests = db.Column(db.Integer, default=10)
     max_results = db.Column(db.Integer, default=1000)
     
+    # Resume checkpoint: last page whose leads are persisted and where to continue
+    last_completed_page = db.Column(db.Integer, default=0)
+    checkpoint_leads = db.Column(db.Integer, default=0)
+    checkpoint_url = db.Column(db.Text)
+    checkpoint_at = db.Column(db.DateTime)
+    
+    # Scraped leads that were already known from earlier jobs and not stored again
+    duplicate_leads = db.Column(db.Integer, default=0)
+    
+    # Page loads actually made for this job across all its runs (including auth checks and retries)
+    requests_made = db.Column(db.Integer, default=0)
+    
+    # Jobs run on the account pool are split into work units; priority is their fair-queuing weight
+    scheduled = db.Column(db.Boolean, default=False)
+    priority = db.Column(db.Integer, default=3)
+    virtual_start = db.Column(db.Float, default=0.0)  # Fair queuing start tag, see fair_queue
+    extraction_mode = db.Column(db.String(10), default='dom')  # 'dom' or 'api'
+    browser_profile = db.Column(db.String(10), default='full')  # 'full' or 'lean'
+    
+    # Seconds spent per phase of the run (profiling.PhaseProfile.to_dict())
+    profile = db.Column(db.JSON)
+    
+    def record_checkpoint(self, page_num, leads_persisted, cursor_url):
+        """Record that every lead up to page_num is persisted"""
+        self.last_completed_page = page_num
+        self.checkpoint_leads = leads_persisted
+        self.checkpoint_url = cursor_url
+        self.checkpoint_at = datetime.utcnow()
+    
+    def can_resume(self):
+        return self.status in ['failed', 'cancelled'] and (bool(self.checkpoint_url) or bool(self.scheduled))
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -33,12 +73,38 @@ class ScrapingJob(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'delay_between_requests': self.delay_between_requests,
-            'max_results': self.max_results
+            'max_results': self.max_results,
+            'checkpoint': {
+                'last_completed_page': self.last_completed_page or 0,
+                'leads_persisted': self.checkpoint_leads or 0,
+                'cursor_url': self.checkpoint_url,
+                'checkpoint_at': self.checkpoint_at.isoformat() if self.checkpoint_at else None
+            },
+            'can_resume': self.can_resume(),
+            'duplicate_leads': self.duplicate_leads or 0,
+            'requests_made': self.requests_made or 0,
+            'scheduled': bool(self.scheduled),
+            'priority': self.priority,
+            'extraction_mode': self.extraction_mode or 'dom',
+            'browser_profile': self.browser_profile or 'full',
+            'profile': self.profile
         }
 
 class Lead(db.Model):
+    __table_args__ = (
+        # Keyset pagination within a job, and the filters the leads API accepts
+        db.Index('ix_lead_job_id_id', 'job_id', 'id'),
+        db.Index('ix_lead_job_id_email', 'job_id', 'email'),
+        db.Index('ix_lead_job_id_company_domain', 'job_id', 'company_domain'),
+        db.Index('ix_lead_job_id_company_name', 'job_id', 'company_name'),
+        db.Index('ix_lead_job_id_seniority', 'job_id', 'seniority'),
+        # Lookups of a person across jobs
+        db.Index('ix_lead_email', 'email'),
+        db.Index('ix_lead_linkedin_url', 'linkedin_url'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    job_id = db.Column(db.Integer, db.ForeignKey('scraping_job.id'), nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('scraping_job.id', ondelete='CASCADE'), nullable=False)
     
     # Personal information
     first_name = db.Column(db.String(100))
@@ -65,11 +131,21 @@ class Lead(db.Model):
     # Additional data
     years_experience = db.Column(db.Integer)
     location = db.Column(db.String(200))
-    raw_data = db.Column(db.Text)  # Store original scraped data as JSON
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    job = db.relationship('ScrapingJob', backref=db.backref('leads', lazy=True))
+    # Deleting a job deletes its leads in the database (ON DELETE CASCADE)
+    job = db.relationship('ScrapingJob', backref=db.backref('leads', lazy=True, cascade='all, delete-orphan', passive_deletes=True))
+    raw = db.relationship('LeadRawData', uselist=False, cascade='all, delete-orphan', passive_deletes=True)
+    
+    @property
+    def raw_data(self):
+        """Original scraped data as JSON, stored compressed in lead_raw_data"""
+        return self.raw.text if self.raw else None
+    
+    @raw_data.setter
+    def raw_data(self, value):
+        self.raw = LeadRawData.from_text(value) if value else None
     
     def to_dict(self):
         return {
@@ -96,6 +172,100 @@ class Lead(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class LeadRawData(db.Model):
+    """Scraped markup for a lead, zlib-compressed and kept out of the hot lead table"""
+    lead_id = db.Column(db.Integer, db.ForeignKey('lead.id', ondelete='CASCADE'), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    
+    @staticmethod
+    def compress(text):
+        return zlib.compress(text.encode('utf-8'), 6)
+    
+    @classmethod
+    def from_text(cls, text):
+        return cls(data=cls.compress(text))
+    
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode('utf-8')
+
+class LeadFingerprint(db.Model):
+    """Cross-job dedup index: one row per normalized key identifying a stored lead"""
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), unique=True, nullable=False)  # '<kind>:<sha1 of normalized value>'
+    lead_id = db.Column(db.Integer, db.ForeignKey('lead.id', ondelete='CASCADE'), index=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('scraping_job.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ApolloAccount(db.Model):
+    """An Apollo cookie set in the shared pool that scheduled work units run on"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    cookies = db.Column(db.Text, nullable=False)
+    active = db.Column(db.Boolean, default=True)
+    
+    # Budget: results pages per day, and work units running at once
+    daily_page_budget = db.Column(db.Integer, nullable=False)
+    max_concurrent_units = db.Column(db.Integer, nullable=False, default=1)
+    
+    # Pages reserved on usage_date, and units currently leased
+    usage_date = db.Column(db.Date)
+    pages_used = db.Column(db.Integer, nullable=False, default=0)
+    running_units = db.Column(db.Integer, nullable=False, default=0)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        """Account details without the cookies"""
+        pages_used = self.pages_used if self.usage_date == date.today() else 0
+        return {
+            'id': self.id,
+            'name': self.name,
+            'active': bool(self.active),
+            'daily_page_budget': self.daily_page_budget,
+            'pages_used_today': pages_used,
+            'pages_remaining_today': max(self.daily_page_budget - pages_used, 0),
+            'max_concurrent_units': self.max_concurrent_units,
+            'running_units': self.running_units,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
+
+class WorkUnit(db.Model):
+    """A page range of a scheduled job, run as one Celery task on a leased account"""
+    __table_args__ = (
+        db.Index('ix_work_unit_status_job_id', 'status', 'job_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('scraping_job.id', ondelete='CASCADE'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('apollo_account.id', ondelete='SET NULL'))
+    task_id = db.Column(db.String(255))
+    status = db.Column(db.String(50), nullable=False, default='queued')  # queued, running, completed, failed, cancelled, skipped
+    
+    # Pages first_page..last_page; next_page is where a retry continues
+    first_page = db.Column(db.Integer, nullable=False)
+    last_page = db.Column(db.Integer, nullable=False)
+    next_page = db.Column(db.Integer, nullable=False)
+    max_results = db.Column(db.Integer, nullable=False)
+    
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    leads_saved = db.Column(db.Integer, nullable=False, default=0)
+    pages_reserved = db.Column(db.Integer, nullable=False, default=0)
+    error_message = db.Column(db.Text)
+    profile = db.Column(db.JSON)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    job = db.relationship('ScrapingJob', backref=db.backref('work_units', lazy=True, cascade='all, delete-orphan', passive_deletes=True))
+    
+    @property
+    def pages(self):
+        return self.last_page - self.first_page + 1
+
 class DailyUsage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, default=date.today, unique=True)
@@ -108,9 +278,14 @@ class DailyUsage(db.Model):
         today = date.today()
         usage = cls.query.filter_by(date=today).first()
         if not usage:
-            usage = cls(date=today)
-            db.session.add(usage)
-            db.session.commit()
+            try:
+                usage = cls(date=today, leads_scraped=0, requests_made=0, jobs_completed=0)
+                db.session.add(usage)
+                db.session.commit()
+            except IntegrityError:
+                # Another worker created today's row between our read and insert
+                db.session.rollback()
+                usage = cls.query.filter_by(date=today).first()
         return usage
     
     def can_scrape_more_leads(self, additional_leads=0):
@@ -120,3 +295,18 @@ class DailyUsage(db.Model):
     def can_make_more_requests(self, additional_requests=0):
         from config import Config
         return (self.requests_made + additional_requests) <= Config.MAX_DAILY_REQUESTS
+    
+    def to_dict(self):
+        from config import Config
+        return {
+            'date': self.date.isoformat(),
+            'leads_scraped': self.leads_scraped,
+            'requests_made': self.requests_made,
+            'jobs_completed': self.jobs_completed,
+            'leads_remaining': Config.MAX_DAILY_LEADS - self.leads_scraped,
+            'requests_remaining': Config.MAX_DAILY_REQUESTS - self.requests_made,
+            'limits': {
+                'max_daily_leads': Config.MAX_DAILY_LEADS,
+                'max_daily_requests': Config.MAX_DAILY_REQUESTS
+            }
+        }
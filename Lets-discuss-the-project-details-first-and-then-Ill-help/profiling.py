@@ -0,0 +1,74 @@
+"""
+Per-job phase timing profile: where a scraping run's wall-clock time goes
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+# Phases in the order a run goes through them
+PHASES = ['setup', 'navigation', 'wait', 'extraction', 'delay', 'persistence', 'export']
+
+class PhaseProfile:
+    """Seconds and call counts per phase of a scraping run.
+
+    Shared by a job's scraper and its parallel page workers, so phase times
+    are summed across sessions and can exceed the wall-clock time. A
+    profile saved by an earlier run of the job can be passed in to keep
+    accumulating across resumes.
+    """
+
+    def __init__(self, previous=None):
+        previous = previous or {}
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.counts = {phase: 0 for phase in PHASES}
+        for phase, stats in (previous.get('phases') or {}).items():
+            self.seconds[phase] = stats.get('seconds', 0.0)
+            self.counts[phase] = stats.get('count', 0)
+        self.previous_wall_seconds = previous.get('wall_seconds', 0.0)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one occurrence of a phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds, count=1):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def to_dict(self):
+        """JSON-ready profile: wall-clock total and seconds, count and share per phase"""
+        with self._lock:
+            wall_seconds = self.previous_wall_seconds + time.monotonic() - self.started
+            timed = sum(self.seconds.values())
+            return {
+                'wall_seconds': round(wall_seconds, 3),
+                'phases': {
+                    phase: {
+                        'seconds': round(seconds, 3),
+                        'count': self.counts.get(phase, 0),
+                        'share': round(seconds / timed * 100, 1) if timed else 0.0
+                    }
+                    for phase, seconds in self.seconds.items()
+                }
+            }
+
+def merge_profiles(profiles):
+    """Combine saved profiles of separate runs (e.g. a job's work units); wall time is summed too"""
+    merged = PhaseProfile()
+    wall_seconds = 0.0
+    for profile in profiles:
+        if not profile:
+            continue
+        wall_seconds += profile.get('wall_seconds', 0.0)
+        for phase, stats in (profile.get('phases') or {}).items():
+            merged.add(phase, stats.get('seconds', 0.0), stats.get('count', 0))
+    result = merged.to_dict()
+    result['wall_seconds'] = round(wall_seconds, 3)
+    return result
@@ -0,0 +1,106 @@
+"""
+Job progress events: published by scraping tasks, streamed to browsers over SSE.
+
+Events go through Redis pub/sub when Redis is available, so Celery workers
+can reach every web process. Without Redis, jobs run in the web process's
+sync fallback thread, and an in-process broadcaster delivers them instead.
+"""
+import json
+import queue
+import logging
+import threading
+from app import redis_client
+from job_stats import invalidate_job_stats
+
+JOB_CHANNEL = 'job_events:{job_id}'
+ALL_JOBS_CHANNEL = 'job_events'
+
+TERMINAL_STATUSES = ['completed', 'failed', 'cancelled']
+
+_local_subscribers = {}
+_local_lock = threading.Lock()
+
+def _publish(channel, payload):
+    if redis_client is not None:
+        try:
+            redis_client.publish(channel, payload)
+            return
+        except Exception as e:
+            logging.warning(f"Redis publish failed, delivering locally: {str(e)}")
+
+    with _local_lock:
+        subscribers = list(_local_subscribers.get(channel, []))
+    for subscriber in subscribers:
+        subscriber.put(payload)
+
+def publish_job_event(job_id, event, data):
+    """Publish an event for one job.
+
+    Everything but 'progress' ticks is also sent to the all-jobs channel the
+    dashboard listens on.
+    """
+    payload = json.dumps({'event': event, 'data': dict(data, id=job_id)})
+    _publish(JOB_CHANNEL.format(job_id=job_id), payload)
+    if event != 'progress':
+        _publish(ALL_JOBS_CHANNEL, payload)
+
+def publish_job_status(job):
+    """Publish a job's full state after a status transition"""
+    # Every transition passes through here, so it is also where cached job statistics go stale
+    invalidate_job_stats()
+    publish_job_event(job.id, 'status', job.to_dict())
+
+def publish_usage_event(usage_data):
+    """Publish updated daily usage figures to the dashboard channel"""
+    _publish(ALL_JOBS_CHANNEL, json.dumps({'event': 'usage', 'data': usage_data}))
+
+class Subscription:
+    """A subscription to one channel, via Redis or the in-process broadcaster.
+
+    Subscribing happens on construction, so nothing published afterwards is
+    missed while the caller reads its initial snapshot.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.pubsub = None
+        self.queue = None
+
+        if redis_client is not None:
+            try:
+                self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                self.pubsub.subscribe(channel)
+                return
+            except Exception as e:
+                self.pubsub = None
+                logging.warning(f"Redis subscribe failed, using local events: {str(e)}")
+
+        self.queue = queue.Queue()
+        with _local_lock:
+            _local_subscribers.setdefault(channel, []).append(self.queue)
+
+    def get(self, timeout):
+        """Return the next event as {'event', 'data'}, or None after ``timeout`` seconds of silence"""
+        if self.pubsub is not None:
+            message = self.pubsub.get_message(timeout=timeout)
+            return json.loads(message['data']) if message else None
+        try:
+            return json.loads(self.queue.get(timeout=timeout))
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if self.pubsub is not None:
+            try:
+                self.pubsub.close()
+            except Exception as e:
+                logging.warning(f"Error closing Redis subscription: {str(e)}")
+        else:
+            with _local_lock:
+                subscribers = _local_subscribers[self.channel]
+                subscribers.remove(self.queue)
+                if not subscribers:
+                    del _local_subscribers[self.channel]
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
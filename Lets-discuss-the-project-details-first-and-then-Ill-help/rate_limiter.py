@@ -0,0 +1,178 @@
+"""
+Token-bucket rate limiting for Apollo page loads.
+
+Buckets are kept in Redis when it is available so every worker process
+scraping with the same Apollo account draws from one budget; otherwise
+they fall back to a bucket shared by the sessions of this process.
+"""
+import time
+import random
+import logging
+import threading
+from collections import deque
+from statistics import median
+from config import Config
+
+# Refill and take tokens atomically; returns the seconds to wait (as a string,
+# since Lua numbers are truncated to integers on the way out)
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+class TokenBucket:
+    """Thread-safe in-process token bucket"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; otherwise return the seconds until they will be"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1, stop_event=None):
+        """Block until tokens are available and return the seconds spent waiting.
+        
+        If stop_event is set while waiting, returns early without the tokens.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return waited
+            else:
+                time.sleep(wait)
+            waited += wait
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket stored in Redis and shared by every worker process.
+    
+    Falls back to its in-process state if Redis cannot be reached.
+    """
+
+    def __init__(self, rate, capacity, client, key):
+        super().__init__(rate, capacity)
+        self.key = key
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, tokens=1):
+        try:
+            return float(self._script(keys=[self.key], args=[self.rate, self.capacity, tokens]))
+        except Exception as e:
+            logging.warning(f"Redis rate limiter unavailable, using local bucket: {str(e)}")
+            return super().try_acquire(tokens)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_page_rate_limiter(key):
+    """Return the page-load bucket for an Apollo account (``key`` identifies its cookie set)"""
+    from app import redis_client
+    
+    with _buckets_lock:
+        if key not in _buckets:
+            rate = Config.MAX_PAGES_PER_MINUTE / 60.0
+            if redis_client is not None:
+                _buckets[key] = RedisTokenBucket(rate, Config.PAGE_RATE_BURST, redis_client, f'rate_limit:{key}')
+            else:
+                _buckets[key] = TokenBucket(rate, Config.PAGE_RATE_BURST)
+        return _buckets[key]
+
+class AdaptiveDelay:
+    """AIMD pacing for one job, driven by its recent page loads.
+    
+    The page rate grows by PACING_INCREASE pages/minute after each healthy
+    load while failures in the sliding window stay under
+    PACING_MAX_ERROR_RATE, and is cut by PACING_BACKOFF after a timeout, an
+    empty page or a load much slower than the window's fastest. Old
+    samples leave the window, so the rate recovers after a burst of errors
+    and backs off again when the site starts struggling.
+    
+    The rate is the job's total. When several sessions share the controller
+    (parallel page workers), each waits sessions times the delay, so
+    together they still load rate pages per minute.
+    """
+
+    def __init__(self, base_delay=None, window=None):
+        base_delay = Config.DEFAULT_DELAY if base_delay is None else base_delay
+        self.min_rate = 60.0 / Config.MAX_DELAY
+        self.max_rate = 60.0 / Config.MIN_DELAY
+        self.rate = self._clamp(60.0 / max(base_delay, Config.MIN_DELAY))
+        self.samples = deque(maxlen=window or Config.PACING_WINDOW)  # (latency, ok)
+        self.sessions = 1
+        self._lock = threading.Lock()
+
+    def _clamp(self, rate):
+        return max(self.min_rate, min(rate, self.max_rate))
+
+    def record(self, latency, ok):
+        """Feed one page load: its latency in seconds and whether it yielded leads in time"""
+        with self._lock:
+            self.samples.append((latency, ok))
+            good = [sample_latency for sample_latency, sample_ok in self.samples if sample_ok]
+            slow = ok and len(good) >= 3 and latency > min(good) * Config.PACING_SLOW_FACTOR
+            error_rate = 1 - len(good) / len(self.samples)
+
+            if not ok or slow:
+                self.rate = self._clamp(self.rate * Config.PACING_BACKOFF)
+            elif error_rate <= Config.PACING_MAX_ERROR_RATE:
+                self.rate = self._clamp(self.rate + Config.PACING_INCREASE)
+
+    def set_sessions(self, sessions):
+        """Number of sessions currently loading pages under this controller"""
+        with self._lock:
+            self.sessions = max(sessions, 1)
+    
+    def next_delay(self):
+        """Seconds one session waits before its next page load, jittered to avoid a fixed pattern"""
+        with self._lock:
+            delay = 60.0 / self.rate
+            sessions = self.sessions
+        return max(Config.MIN_DELAY, min(delay * random.uniform(0.8, 1.2), Config.MAX_DELAY)) * sessions
+
+    def snapshot(self):
+        """Current pace and window statistics, for progress reporting"""
+        with self._lock:
+            latencies = [latency for latency, _ in self.samples]
+            failures = sum(1 for _, ok in self.samples if not ok)
+            return {
+                'pages_per_minute': round(self.rate, 2),
+                'delay': round(60.0 / self.rate, 2),
+                'sessions': self.sessions,
+                'window': len(self.samples),
+                'error_rate': round(failures / len(self.samples), 3) if self.samples else 0.0,
+                'median_latency': round(median(latencies), 2) if latencies else None
+            }
@@ -1,13 +1,22 @@
 import os
 import json
+import time
 import logging
-from flask import render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 from app import app, db, celery, redis_client
-from models import ScrapingJob, Lead, DailyUsage
+from models import ScrapingJob, Lead, DailyUsage, ApolloAccount, WorkUnit
 from tasks import scrape_apollo_leads
-from utils import validate_apollo_url, estimate_scraping_time
+from utils import validate_apollo_url, estimate_scraping_time, gzip_chunks
+from lead_store import (parse_lead_fields, select_leads, iter_leads, iter_csv_export,
+                        parquet_export, new_csv_filename, LEAD_FILTER_FIELDS)
+from job_stats import get_job_stats, invalidate_job_stats
+from progress_events import (Subscription, publish_job_status, format_sse,
+                             JOB_CHANNEL, ALL_JOBS_CHANNEL, TERMINAL_STATUSES)
 from config import Config
+import scheduler
+import metrics
 import uuid
 
 @app.route('/')
@@ -26,34 +35,29 @@ def index():
 
 @app.route('/dashboard')
 def dashboard():
-    """Dashboard showing all jobs and statistics"""
-    # Get all jobs
-    jobs = ScrapingJob.query.order_by(ScrapingJob.created_at.desc()).all()
+    """Dashboard showing jobs and statistics"""
+    page = request.args.get('page', 1, type=int)
+    status = request.args.get('status', 'all')
+    
+    # One page of jobs, newest first, optionally filtered by status
+    query = ScrapingJob.query
+    if status == 'running':
+        query = query.filter(ScrapingJob.status.in_(['pending', 'running']))
+    elif status != 'all':
+        query = query.filter_by(status=status)
+    pagination = query.order_by(ScrapingJob.created_at.desc()).paginate(
+        page=page, per_page=Config.DASHBOARD_JOBS_PER_PAGE, error_out=False
+    )
     
     # Get daily usage
     daily_usage = DailyUsage.get_today_usage()
     
-    # Calculate statistics
-    total_jobs = len(jobs)
-    completed_jobs = len([j for j in jobs if j.status == 'completed'])
-    failed_jobs = len([j for j in jobs if j.status == 'failed'])
-    running_jobs = len([j for j in jobs if j.status in ['pending', 'running']])
-    
-    total_leads_scraped = sum([j.scraped_leads or 0 for j in jobs if j.status == 'completed'])
-    
-    stats = {
-        'total_jobs': total_jobs,
-        'completed_jobs': completed_jobs,
-        'failed_jobs': failed_jobs,
-        'running_jobs': running_jobs,
-        'total_leads_scraped': total_leads_scraped,
-        'success_rate': (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
-    }
-    
     return render_template('dashboard.html', 
-                         jobs=jobs,
+                         jobs=pagination.items,
+                         pagination=pagination,
+                         status_filter=status,
                          daily_usage=daily_usage,
-                         stats=stats,
+                         stats=get_job_stats(),
                          config=Config)
 
 @app.route('/start_scraping', methods=['POST'])
@@ -65,6 +69,10 @@ def start_scraping():
         cookies = request.form.get('cookies', '').strip()
         max_results = int(request.form.get('max_results', 1000))
         delay = int(request.form.get('delay', Config.DEFAULT_DELAY))
+        concurrency = int(request.form.get('concurrency', 1))
+        priority = int(request.form.get('priority', Config.DEFAULT_JOB_PRIORITY))
+        extraction_mode = request.form.get('extraction_mode', Config.DEFAULT_EXTRACTION_MODE)
+        browser_profile = request.form.get('browser_profile', Config.DEFAULT_BROWSER_PROFILE)
         
         # Validate inputs
         if not search_url:
@@ -80,6 +88,21 @@ def start_scraping():
         if delay < Config.MIN_DELAY or delay > Config.MAX_DELAY:
             return jsonify({'error': f'Delay must be between {Config.MIN_DELAY} and {Config.MAX_DELAY} seconds'}), 400
         
+        if concurrency < 1 or concurrency > Config.MAX_PAGE_CONCURRENCY:
+            return jsonify({'error': f'Parallel sessions must be between 1 and {Config.MAX_PAGE_CONCURRENCY}'}), 400
+        
+        if priority < 1 or priority > 5:
+            return jsonify({'error': 'Priority must be between 1 and 5'}), 400
+        
+        if extraction_mode not in Config.EXTRACTION_MODES:
+            return jsonify({'error': f"Extraction mode must be one of: {', '.join(Config.EXTRACTION_MODES)}"}), 400
+        
+        if browser_profile not in Config.BROWSER_PROFILES:
+            return jsonify({'error': f"Browser profile must be one of: {', '.join(Config.BROWSER_PROFILES)}"}), 400
+        
+        # Without cookies the job runs on the account pool, if there is one
+        use_pool = not cookies and ApolloAccount.query.filter_by(active=True).count() > 0
+        
         # Check daily limits
         daily_usage = DailyUsage.get_today_usage()
         if not daily_usage.can_scrape_more_leads(max_results):
@@ -96,16 +119,41 @@ def start_scraping():
             search_url=search_url,
             delay_between_requests=delay,
             max_results=max_results,
-            status='pending'
+            status='pending',
+            scheduled=use_pool,
+            priority=priority,
+            extraction_mode=extraction_mode,
+            browser_profile=browser_profile
         )
         db.session.add(job)
         db.session.commit()
+        publish_job_status(job)
+        
+        if use_pool:
+            try:
+                scheduler.plan_work_units(job)
+                scheduler.dispatch()
+            except Exception as e:
+                logging.error(f"Could not schedule job {job.id}: {str(e)}")
+                job.status = 'failed'
+                job.error_message = 'Background processing unavailable; job could not be scheduled'
+                db.session.commit()
+                publish_job_status(job)
+                return jsonify({'error': 'Scraping service is temporarily unavailable. Please try again later.'}), 503
+            
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'task_id': task_id,
+                'work_units': scheduler.unit_summary(job.id),
+                'message': 'Scraping job queued on the account pool'
+            })
         
         # Start background task (with fallback to sync processing)
         try:
             from app import celery
             task = celery.send_task('tasks.scrape_apollo_leads',
-                args=[job.id, search_url, cookies, max_results, delay],
+                args=[job.id, search_url, cookies, max_results, delay, concurrency],
                 task_id=task_id
             )
         except Exception as e:
@@ -178,38 +226,148 @@ def job_status(job_id):
         response = job.to_dict()
         if task_info:
             response['task_info'] = task_info
+        if job.scheduled:
+            response['work_units'] = scheduler.unit_summary(job.id)
+            if job.status in ['pending', 'running']:
+                response['profile'] = scheduler.job_profile(job.id)
         
         return jsonify(response)
         
+    except HTTPException:
+        # get_or_404 and abort() responses, not failures
+        raise
     except Exception as e:
         logging.error(f"Error getting job status: {str(e)}")
         return jsonify({'error': 'Failed to get job status'}), 500
 
+def stream_events(subscription, initial_events=(), job_id=None):
+    """Server-sent event stream: initial events, then everything published to the subscription.
+
+    Job streams end after the job reaches a terminal status. Every stream is
+    closed after SSE_MAX_STREAM_SECONDS and EventSource reconnects on its
+    own. The web process serves streams on gevent greenlets (see
+    gunicorn.conf.py), so open streams do not tie up a fixed thread pool.
+    """
+    def ends_stream(event, data):
+        return job_id is not None and event == 'status' and data.get('status') in TERMINAL_STATUSES
+    
+    def generate():
+        deadline = time.monotonic() + Config.SSE_MAX_STREAM_SECONDS
+        try:
+            yield 'retry: 3000\n\n'
+            for event, data in initial_events:
+                yield format_sse(event, data)
+                if ends_stream(event, data):
+                    yield format_sse('end', {'id': job_id})
+                    return
+            
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=Config.SSE_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                event, data = message['event'], message['data']
+                yield format_sse(event, data)
+                if ends_stream(event, data):
+                    yield format_sse('end', {'id': job_id})
+                    return
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/job_events/<int:job_id>')
+def job_events(job_id):
+    """Stream progress and status changes for one job"""
+    job = ScrapingJob.query.get_or_404(job_id)
+    
+    # Subscribe before taking the snapshot so no update falls in between
+    subscription = Subscription(JOB_CHANNEL.format(job_id=job_id))
+    snapshot = job.to_dict()
+    
+    # Don't hold a database connection for the life of the stream
+    db.session.close()
+    return stream_events(subscription, [('status', snapshot)], job_id=job_id)
+
+@app.route('/events')
+def all_job_events():
+    """Stream status changes of every job and daily usage updates"""
+    subscription = Subscription(ALL_JOBS_CHANNEL)
+    snapshot = DailyUsage.get_today_usage().to_dict()
+    db.session.close()
+    return stream_events(subscription, [('usage', snapshot)])
+
 @app.route('/download_csv/<int:job_id>')
 def download_csv(job_id):
-    """Download CSV file for a completed job"""
+    """Download a job's leads as CSV, streamed straight from the database.
+    
+    Accepts the same exact-match filters as /leads. The response is gzipped
+    on the fly for clients that accept it; gzip=1 downloads a .csv.gz file.
+    """
     try:
         job = ScrapingJob.query.get_or_404(job_id)
         
-        if job.status != 'completed' or not job.csv_file_path:
-            return jsonify({'error': 'CSV file not available'}), 404
+        filters = {field: request.args[field] for field in LEAD_FILTER_FIELDS if field in request.args}
+        if db.session.query(Lead.id).filter_by(job_id=job.id, **filters).first() is None:
+            return jsonify({'error': 'No leads available for this job'}), 404
         
-        csv_path = os.path.join(Config.EXPORT_FOLDER, job.csv_file_path)
+        filename = new_csv_filename(job.id)
+        chunks = stream_with_context(iter_csv_export(job.id, filters))
         
-        if not os.path.exists(csv_path):
-            return jsonify({'error': 'CSV file not found'}), 404
+        if request.args.get('gzip') == '1':
+            return Response(gzip_chunks(chunks), mimetype='application/gzip', headers={
+                'Content-Disposition': f'attachment; filename={filename}.gz'
+            })
         
-        return send_file(
-            csv_path,
-            as_attachment=True,
-            download_name=job.csv_file_path,
-            mimetype='text/csv'
-        )
+        headers = {
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Vary': 'Accept-Encoding'
+        }
+        if 'gzip' in request.accept_encodings:
+            headers['Content-Encoding'] = 'gzip'
+            chunks = gzip_chunks(chunks)
         
+        return Response(chunks, mimetype='text/csv', headers=headers)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error downloading CSV: {str(e)}")
         return jsonify({'error': 'Failed to download CSV'}), 500
 
+@app.route('/download_parquet/<int:job_id>')
+def download_parquet(job_id):
+    """Download a job's leads as a Parquet file (requires pyarrow).
+    
+    Accepts the same exact-match filters as /leads.
+    """
+    try:
+        job = ScrapingJob.query.get_or_404(job_id)
+        
+        filters = {field: request.args[field] for field in LEAD_FILTER_FIELDS if field in request.args}
+        if db.session.query(Lead.id).filter_by(job_id=job.id, **filters).first() is None:
+            return jsonify({'error': 'No leads available for this job'}), 404
+        
+        try:
+            chunks = parquet_export(job.id, filters)
+        except ImportError:
+            return jsonify({'error': 'Parquet export requires pyarrow to be installed'}), 501
+        
+        filename = new_csv_filename(job.id).replace('.csv', '.parquet')
+        return Response(stream_with_context(chunks), mimetype='application/vnd.apache.parquet', headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error downloading Parquet: {str(e)}")
+        return jsonify({'error': 'Failed to download Parquet'}), 500
+
 @app.route('/cancel_job/<int:job_id>', methods=['POST'])
 def cancel_job(job_id):
     """Cancel a running scraping job"""
@@ -226,17 +384,93 @@ def cancel_job(job_id):
             except Exception as e:
                 logging.warning(f"Could not revoke task: {str(e)}")
         
+        if job.scheduled:
+            scheduler.cancel_units(job)
+        
         # Update job status
         job.status = 'cancelled'
         job.error_message = 'Job cancelled by user'
         db.session.commit()
+        publish_job_status(job)
         
         return jsonify({'success': True, 'message': 'Job cancelled successfully'})
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error cancelling job: {str(e)}")
         return jsonify({'error': 'Failed to cancel job'}), 500
 
+@app.route('/resume_job/<int:job_id>', methods=['POST'])
+def resume_job(job_id):
+    """Resume a failed or cancelled job from its last checkpoint"""
+    try:
+        job = ScrapingJob.query.get_or_404(job_id)
+        
+        if not job.can_resume():
+            return jsonify({'error': 'Job has no checkpoint to resume from'}), 400
+        
+        if job.scheduled:
+            # Failed and cancelled units continue from their last saved page
+            scheduler.requeue_units(job)
+            job.status = 'pending'
+            job.error_message = None
+            db.session.commit()
+            publish_job_status(job)
+            try:
+                scheduler.dispatch()
+            except Exception as e:
+                logging.error(f"Could not dispatch resumed job {job.id}: {str(e)}")
+                return jsonify({'error': 'Scraping service is temporarily unavailable. Please try again later.'}), 503
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'work_units': scheduler.unit_summary(job.id),
+                'message': 'Job requeued on the account pool'
+            })
+        
+        cookies = request.form.get('cookies', '').strip()
+        concurrency = int(request.form.get('concurrency', 1))
+        if concurrency < 1 or concurrency > Config.MAX_PAGE_CONCURRENCY:
+            return jsonify({'error': f'Parallel sessions must be between 1 and {Config.MAX_PAGE_CONCURRENCY}'}), 400
+        
+        # Each run gets its own Celery task id
+        task_id = str(uuid.uuid4())
+        job.task_id = task_id
+        job.status = 'pending'
+        db.session.commit()
+        
+        try:
+            celery.send_task('tasks.scrape_apollo_leads',
+                args=[job.id, job.search_url, cookies, job.max_results, job.delay_between_requests, concurrency],
+                kwargs={'resume': True},
+                task_id=task_id
+            )
+            publish_job_status(job)
+        except Exception as e:
+            logging.error(f"Could not queue resume task: {str(e)}")
+            job.status = 'failed'
+            job.error_message = 'Background processing unavailable; job could not be resumed'
+            db.session.commit()
+            publish_job_status(job)
+            return jsonify({'error': 'Scraping service is temporarily unavailable. Please try again later.'}), 503
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'task_id': task_id,
+            'resume_page': (job.last_completed_page or 0) + 1,
+            'message': f'Job resumed from page {(job.last_completed_page or 0) + 1}'
+        })
+        
+    except ValueError:
+        return jsonify({'error': 'Invalid input values'}), 400
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error resuming job: {str(e)}")
+        return jsonify({'error': 'Failed to resume job'}), 500
+
 @app.route('/delete_job/<int:job_id>', methods=['POST'])
 def delete_job(job_id):
     """Delete a job and its associated data"""
@@ -249,34 +483,64 @@ def delete_job(job_id):
             if os.path.exists(csv_path):
                 os.remove(csv_path)
         
-        # Delete associated leads
-        Lead.query.filter_by(job_id=job.id).delete()
-        
-        # Delete job
+        # Delete job; its leads, their raw data and dedup fingerprints go with it (ON DELETE CASCADE),
+        # so those people can be scraped again
         db.session.delete(job)
         db.session.commit()
+        invalidate_job_stats()
         
         return jsonify({'success': True, 'message': 'Job deleted successfully'})
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error deleting job: {str(e)}")
         return jsonify({'error': 'Failed to delete job'}), 500
 
 @app.route('/leads/<int:job_id>')
 def view_leads(job_id):
-    """View leads for a specific job"""
+    """View leads for a specific job.
+    
+    Query parameters:
+      after_id - keyset cursor: return leads with a larger id (use next_after_id)
+      limit    - page size, up to LEADS_MAX_PAGE_SIZE
+      fields   - comma-separated projection, e.g. fields=email,company_name
+      email, company_domain, company_name, seniority - exact-match filters
+      format   - 'ndjson' streams every matching lead, one JSON object per line
+    """
     try:
         job = ScrapingJob.query.get_or_404(job_id)
-        leads = Lead.query.filter_by(job_id=job_id).all()
         
-        leads_data = [lead.to_dict() for lead in leads]
+        fields = parse_lead_fields(request.args.get('fields', ''))
+        filters = {field: request.args[field] for field in LEAD_FILTER_FIELDS if field in request.args}
+        after_id = request.args.get('after_id', type=int)
+        
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for lead in iter_leads(job_id, fields, filters, after_id):
+                    yield json.dumps(lead) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        limit = request.args.get('limit', Config.LEADS_PAGE_SIZE, type=int)
+        if limit < 1 or limit > Config.LEADS_MAX_PAGE_SIZE:
+            return jsonify({'error': f'Limit must be between 1 and {Config.LEADS_MAX_PAGE_SIZE}'}), 400
+        
+        leads_data, last_id = select_leads(job_id, fields, filters, after_id, limit)
+        
+        total_query = Lead.query.filter_by(job_id=job_id, **filters)
         
         return jsonify({
             'job': job.to_dict(),
             'leads': leads_data,
-            'total_leads': len(leads_data)
+            'total_leads': total_query.count(),
+            'next_after_id': last_id if len(leads_data) == limit else None
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting leads: {str(e)}")
         return jsonify({'error': 'Failed to get leads'}), 500
@@ -291,7 +555,9 @@ def test_authentication():
             return jsonify({'error': 'Cookies are required for authentication test'}), 400
         
         from scraper import ApolloScraper
+        from usage import UsageCounters
         scraper = ApolloScraper(cookies=cookies)
+        scraper.usage = UsageCounters()
         
         success, message = scraper.test_authentication()
         
@@ -304,24 +570,100 @@ def test_authentication():
         logging.error(f"Error testing authentication: {str(e)}")
         return jsonify({'error': 'Authentication test failed'}), 500
 
+@app.route('/accounts', methods=['GET'])
+def list_accounts():
+    """Apollo accounts in the scheduling pool, with today's budget use"""
+    accounts = ApolloAccount.query.order_by(ApolloAccount.name).all()
+    return jsonify({'accounts': [account.to_dict() for account in accounts]})
+
+@app.route('/accounts', methods=['POST'])
+def save_account():
+    """Add an Apollo account to the pool, or update the one with the same name"""
+    try:
+        name = request.form.get('name', '').strip()
+        cookies = request.form.get('cookies', '').strip()
+        daily_page_budget = int(request.form.get('daily_page_budget', Config.ACCOUNT_DAILY_PAGES))
+        max_concurrent_units = int(request.form.get('max_concurrent_units', 1))
+        active = request.form.get('active', 'true').lower() == 'true'
+        
+        if not name:
+            return jsonify({'error': 'Account name is required'}), 400
+        
+        if daily_page_budget < 1:
+            return jsonify({'error': 'Daily page budget must be at least 1'}), 400
+        
+        if max_concurrent_units < 1 or max_concurrent_units > Config.MAX_PAGE_CONCURRENCY:
+            return jsonify({'error': f'Concurrent units must be between 1 and {Config.MAX_PAGE_CONCURRENCY}'}), 400
+        
+        account = ApolloAccount.query.filter_by(name=name).first()
+        if account is None:
+            if not cookies:
+                return jsonify({'error': 'Cookies are required for a new account'}), 400
+            account = ApolloAccount(name=name, cookies=cookies)
+            db.session.add(account)
+        elif cookies:
+            account.cookies = cookies
+        
+        account.daily_page_budget = daily_page_budget
+        account.max_concurrent_units = max_concurrent_units
+        account.active = active
+        db.session.commit()
+        
+        # New capacity may let queued work units start
+        try:
+            scheduler.dispatch()
+        except Exception as e:
+            logging.warning(f"Could not dispatch work units: {str(e)}")
+        
+        return jsonify({'success': True, 'account': account.to_dict()})
+        
+    except ValueError:
+        return jsonify({'error': 'Invalid input values'}), 400
+    except Exception as e:
+        logging.error(f"Error saving account: {str(e)}")
+        return jsonify({'error': 'Failed to save account'}), 500
+
+@app.route('/accounts/<int:account_id>/delete', methods=['POST'])
+def delete_account(account_id):
+    """Remove an idle Apollo account from the pool"""
+    try:
+        account = ApolloAccount.query.get_or_404(account_id)
+        
+        if account.running_units:
+            return jsonify({'error': 'Account is running work units; deactivate it first'}), 400
+        
+        db.session.delete(account)
+        db.session.commit()
+        
+        return jsonify({'success': True, 'message': 'Account deleted'})
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error deleting account: {str(e)}")
+        return jsonify({'error': 'Failed to delete account'}), 500
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    if metrics.prometheus_client is None:
+        return jsonify({'error': 'Metrics are not available: prometheus_client is not installed'}), 501
+    
+    try:
+        metrics.QUEUE_DEPTH.labels('jobs').set(ScrapingJob.query.filter_by(status='pending').count())
+        metrics.QUEUE_DEPTH.labels('work_units').set(WorkUnit.query.filter_by(status='queued').count())
+    except Exception as e:
+        logging.warning(f"Could not measure queue depth: {str(e)}")
+    
+    payload, content_type = metrics.render_metrics()
+    return Response(payload, content_type=content_type)
+
 @app.route('/daily_stats')
 def daily_stats():
     """Get daily usage statistics"""
     try:
         daily_usage = DailyUsage.get_today_usage()
-        
-        return jsonify({
-            'date': daily_usage.date.isoformat(),
-            'leads_scraped': daily_usage.leads_scraped,
-            'requests_made': daily_usage.requests_made,
-            'jobs_completed': daily_usage.jobs_completed,
-            'leads_remaining': Config.MAX_DAILY_LEADS - daily_usage.leads_scraped,
-            'requests_remaining': Config.MAX_DAILY_REQUESTS - daily_usage.requests_made,
-            'limits': {
-                'max_daily_leads': Config.MAX_DAILY_LEADS,
-                'max_daily_requests': Config.MAX_DAILY_REQUESTS
-            }
-        })
+        return jsonify(daily_usage.to_dict())
         
     except Exception as e:
         logging.error(f"Error getting daily stats: {str(e)}")
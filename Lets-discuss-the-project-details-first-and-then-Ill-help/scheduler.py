@@ -0,0 +1,354 @@
+"""
+Account pool scheduler.
+
+Jobs submitted without cookies are split into page-range work units that
+run as separate Celery tasks on Apollo accounts from the pool. Units are
+started with weighted fair queuing (see fair_queue): the next unit belongs
+to the job whose virtual start plus pages served, including this unit,
+divided by its priority is lowest. Jobs joining the queue start at the
+current virtual time, so a new job interleaves with running ones instead
+of waiting behind them or starving them, and priority sets each job's share. An account runs at most
+max_concurrent_units units at once and reserves each unit's pages from its
+daily page budget when the unit is leased.
+"""
+import math
+import uuid
+import logging
+from datetime import datetime, date, timedelta
+from sqlalchemy import case, func, or_, update
+from app import db, celery, redis_client
+from models import ScrapingJob, WorkUnit, ApolloAccount
+from config import Config
+from utils import get_search_page
+from progress_events import publish_job_status
+from usage import UsageCounters
+from fair_queue import Backlog, catch_up_start, pick_next, virtual_time
+from profiling import merge_profiles
+
+DISPATCH_RETRY_KEY = 'dispatch_work_units:retry'
+
+OPEN_UNIT_STATUSES = ('queued', 'running')
+SERVED_UNIT_STATUSES = ('running', 'completed', 'failed')
+
+def served_pages(job_ids):
+    """Pages already handed to units of each job, by job ID"""
+    if not job_ids:
+        return {}
+    return dict(db.session.query(
+        WorkUnit.job_id, func.sum(WorkUnit.last_page - WorkUnit.first_page + 1)
+    ).filter(
+        WorkUnit.job_id.in_(job_ids),
+        WorkUnit.status.in_(SERVED_UNIT_STATUSES)
+    ).group_by(WorkUnit.job_id).tuples().all())
+
+def backlogs(jobs):
+    """Fair queuing state of jobs"""
+    served = served_pages([job.id for job in jobs])
+    return [
+        Backlog(job.id, job.virtual_start or 0.0, served.get(job.id) or 0,
+                job.priority or Config.DEFAULT_JOB_PRIORITY, job.created_at)
+        for job in jobs
+    ]
+
+def join_backlog(job):
+    """Move a job that is about to queue units up to the current virtual time"""
+    waiting = ScrapingJob.query.join(WorkUnit).filter(
+        ScrapingJob.id != job.id,
+        ScrapingJob.status.in_(['pending', 'running']),
+        WorkUnit.status.in_(OPEN_UNIT_STATUSES)
+    ).distinct().all()
+    now = virtual_time(backlogs(waiting))
+    job.virtual_start = catch_up_start(backlogs([job])[0], now)
+
+def plan_work_units(job):
+    """Split a job's result pages into queued work units of WORK_UNIT_PAGES pages"""
+    join_backlog(job)
+    first_page = get_search_page(job.search_url)
+    pages = min(math.ceil(job.max_results / Config.RESULTS_PER_PAGE), Config.MAX_PAGES_PER_JOB)
+
+    units = []
+    for offset in range(0, pages, Config.WORK_UNIT_PAGES):
+        unit_pages = min(Config.WORK_UNIT_PAGES, pages - offset)
+        units.append(WorkUnit(
+            job_id=job.id,
+            first_page=first_page + offset,
+            last_page=first_page + offset + unit_pages - 1,
+            next_page=first_page + offset,
+            max_results=min(unit_pages * Config.RESULTS_PER_PAGE, job.max_results - offset * Config.RESULTS_PER_PAGE)
+        ))
+    db.session.add_all(units)
+    db.session.commit()
+    logging.info(f"Planned {len(units)} work units for job {job.id}")
+    return units
+
+def reset_account_budgets():
+    """Start a fresh page budget for accounts last used on an earlier day"""
+    today = date.today()
+    db.session.execute(
+        update(ApolloAccount)
+        .where(or_(ApolloAccount.usage_date.is_(None), ApolloAccount.usage_date != today))
+        .values(usage_date=today, pages_used=0)
+    )
+    db.session.commit()
+
+def lease_account(pages):
+    """Reserve a unit slot and pages on the least busy account that has both, or return None"""
+    candidates = ApolloAccount.query.filter(
+        ApolloAccount.active.is_(True),
+        ApolloAccount.running_units < ApolloAccount.max_concurrent_units,
+        ApolloAccount.pages_used + pages <= ApolloAccount.daily_page_budget
+    ).order_by(ApolloAccount.running_units, ApolloAccount.pages_used).all()
+
+    for account in candidates:
+        # Conditional so concurrent dispatchers can't overbook the account
+        result = db.session.execute(
+            update(ApolloAccount)
+            .where(
+                ApolloAccount.id == account.id,
+                ApolloAccount.running_units < ApolloAccount.max_concurrent_units,
+                ApolloAccount.pages_used + pages <= ApolloAccount.daily_page_budget
+            )
+            .values(
+                running_units=ApolloAccount.running_units + 1,
+                pages_used=ApolloAccount.pages_used + pages,
+                last_used_at=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return account
+    return None
+
+def release_account(account_id, unused_pages=0):
+    """Free a unit slot on an account and give back pages the unit did not load"""
+    if account_id is None:
+        return
+    today = date.today()
+    db.session.execute(
+        update(ApolloAccount)
+        .where(ApolloAccount.id == account_id)
+        .values(
+            running_units=case((ApolloAccount.running_units > 0, ApolloAccount.running_units - 1), else_=0),
+            # Pages reserved on an earlier day were already reset with the budget
+            pages_used=case((ApolloAccount.usage_date == today, ApolloAccount.pages_used - unused_pages),
+                            else_=ApolloAccount.pages_used)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def next_unit():
+    """The queued unit with the earliest virtual finish time across jobs, or None"""
+    heads = db.session.query(WorkUnit.job_id, func.min(WorkUnit.first_page)).join(ScrapingJob).filter(
+        WorkUnit.status == 'queued',
+        ScrapingJob.status.in_(['pending', 'running'])
+    ).group_by(WorkUnit.job_id).all()
+    if not heads:
+        return None
+
+    first_pages = dict(heads)
+    jobs = ScrapingJob.query.filter(ScrapingJob.id.in_(first_pages)).all()
+    job_id = pick_next(backlogs(jobs), Config.WORK_UNIT_PAGES)
+    first_page = first_pages[job_id]
+    return WorkUnit.query.filter_by(job_id=job_id, first_page=first_page, status='queued').first()
+
+def claim_unit(unit, account, pages):
+    """Move a queued unit to running on the leased account; False if another dispatcher took it"""
+    task_id = str(uuid.uuid4())
+    result = db.session.execute(
+        update(WorkUnit)
+        .where(WorkUnit.id == unit.id, WorkUnit.status == 'queued')
+        .values(
+            status='running',
+            account_id=account.id,
+            task_id=task_id,
+            pages_reserved=pages,
+            attempts=WorkUnit.attempts + 1,
+            started_at=datetime.utcnow(),
+            error_message=None
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return task_id if result.rowcount == 1 else None
+
+def requeue_lost_units():
+    """Put back units whose worker has not reported for WORK_UNIT_TIMEOUT seconds"""
+    cutoff = datetime.utcnow() - timedelta(seconds=Config.WORK_UNIT_TIMEOUT)
+    for unit in WorkUnit.query.filter(WorkUnit.status == 'running', WorkUnit.started_at < cutoff).all():
+        logging.warning(f"Work unit {unit.id} of job {unit.job_id} timed out, requeueing")
+        finish_unit(unit.id, 'failed', error_message='Work unit timed out', dispatch_next=False)
+
+def dispatch():
+    """Start queued units on free accounts until either runs out; returns how many were started"""
+    reset_account_budgets()
+    requeue_lost_units()
+
+    started = 0
+    while True:
+        unit = next_unit()
+        if unit is None:
+            break
+
+        pages = unit.last_page - unit.next_page + 1
+        account = lease_account(pages)
+        if account is None:
+            schedule_dispatch_retry()
+            break
+
+        task_id = claim_unit(unit, account, pages)
+        if task_id is None:
+            release_account(account.id, pages)
+            continue
+
+        try:
+            celery.send_task('tasks.run_work_unit', args=[unit.id], task_id=task_id)
+        except Exception:
+            db.session.execute(
+                update(WorkUnit).where(WorkUnit.id == unit.id)
+                .values(status='queued', attempts=WorkUnit.attempts - 1, task_id=None, account_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            release_account(account.id, pages)
+            raise
+
+        logging.info(f"Dispatched work unit {unit.id} (job {unit.job_id}, pages {unit.next_page}-{unit.last_page}) to account {account.name}")
+        started += 1
+    return started
+
+def schedule_dispatch_retry():
+    """Dispatch again in DISPATCH_RETRY_SECONDS, unless a retry is already pending.
+
+    Units left waiting for an account otherwise only start when another unit
+    finishes or a job is submitted, which never happens once every account's
+    daily budget is spent. Celery beat runs dispatch too, but may not be deployed.
+    """
+    try:
+        if redis_client is not None and not redis_client.set(DISPATCH_RETRY_KEY, 1, nx=True, ex=Config.DISPATCH_RETRY_SECONDS):
+            return
+        celery.send_task('tasks.dispatch_work_units', countdown=Config.DISPATCH_RETRY_SECONDS)
+    except Exception as e:
+        logging.warning(f"Could not schedule a dispatch retry: {str(e)}")
+
+def finish_unit(unit_id, status, pages_loaded=0, error_message=None, dispatch_next=True):
+    """Record a running unit's outcome, free its account and complete the job once no units are open.
+
+    Failed units are queued again until they have run WORK_UNIT_MAX_ATTEMPTS times.
+    """
+    unit = db.session.get(WorkUnit, unit_id)
+    if unit is None:
+        return
+    if status == 'failed' and unit.attempts < Config.WORK_UNIT_MAX_ATTEMPTS:
+        status = 'queued'
+
+    # Conditional so a cancelled or requeued unit is not released twice
+    result = db.session.execute(
+        update(WorkUnit)
+        .where(WorkUnit.id == unit_id, WorkUnit.status == 'running')
+        .values(
+            status=status,
+            error_message=error_message,
+            finished_at=None if status == 'queued' else datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return
+
+    release_account(unit.account_id, max(unit.pages_reserved - pages_loaded, 0))
+    complete_job_if_done(unit.job_id)
+
+    if dispatch_next:
+        try:
+            dispatch()
+        except Exception as e:
+            logging.error(f"Could not dispatch work units: {str(e)}")
+
+def skip_units_after(job_id, page_num):
+    """Skip queued units past the last page with results"""
+    db.session.execute(
+        update(WorkUnit)
+        .where(WorkUnit.job_id == job_id, WorkUnit.status == 'queued', WorkUnit.first_page > page_num)
+        .values(status='skipped', finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def complete_job_if_done(job_id):
+    """Mark a scheduled job completed (or failed, if units gave up) when its last unit finishes"""
+    if WorkUnit.query.filter(WorkUnit.job_id == job_id, WorkUnit.status.in_(OPEN_UNIT_STATUSES)).count():
+        return
+
+    failed = WorkUnit.query.filter_by(job_id=job_id, status='failed').order_by(WorkUnit.finished_at.desc()).all()
+    status = 'failed' if failed else 'completed'
+
+    # Conditional so only the last unit to finish completes the job
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(ScrapingJob)
+        .where(ScrapingJob.id == job_id, ScrapingJob.status.in_(['pending', 'running']))
+        .values(
+            status=status,
+            error_message=f"{len(failed)} work units failed: {failed[0].error_message}" if failed else None,
+            total_leads=ScrapingJob.scraped_leads,
+            progress=100.0 if status == 'completed' else ScrapingJob.progress,
+            completed_at=now if status == 'completed' else None,
+            profile=job_profile(job_id)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return
+
+    job = db.session.get(ScrapingJob, job_id)
+    db.session.refresh(job)
+    if status == 'completed':
+        UsageCounters().record(jobs_completed=1)
+    logging.info(f"Scheduled job {job_id} {status} with {job.scraped_leads} leads")
+    publish_job_status(job)
+
+def cancel_units(job):
+    """Cancel a job's open units, revoking running ones and freeing their accounts"""
+    for unit in WorkUnit.query.filter(WorkUnit.job_id == job.id, WorkUnit.status.in_(OPEN_UNIT_STATUSES)).all():
+        was_running = unit.status == 'running'
+        result = db.session.execute(
+            update(WorkUnit)
+            .where(WorkUnit.id == unit.id, WorkUnit.status == unit.status)
+            .values(status='cancelled', finished_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if was_running and result.rowcount == 1:
+            try:
+                celery.control.revoke(unit.task_id, terminate=True)
+            except Exception as e:
+                logging.warning(f"Could not revoke work unit task: {str(e)}")
+            release_account(unit.account_id, unit.pages_reserved)
+
+def requeue_units(job):
+    """Queue a job's failed and cancelled units again, continuing from their last saved page"""
+    join_backlog(job)
+    db.session.execute(
+        update(WorkUnit)
+        .where(WorkUnit.job_id == job.id, WorkUnit.status.in_(['failed', 'cancelled']))
+        .values(status='queued', attempts=0, error_message=None, finished_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def job_profile(job_id):
+    """Phase profile of a scheduled job, summed over its units' runs"""
+    rows = db.session.query(WorkUnit.profile).filter(
+        WorkUnit.job_id == job_id, WorkUnit.profile.isnot(None)
+    ).all()
+    return merge_profiles(profile for (profile,) in rows)
+
+def unit_summary(job_id):
+    """Work unit counts by status for a job"""
+    return dict(db.session.query(WorkUnit.status, func.count(WorkUnit.id)).filter(
+        WorkUnit.job_id == job_id
+    ).group_by(WorkUnit.status).tuples().all())
@@ -1,7 +1,11 @@
-import time
+import re
 import json
+import math
+import time
+import heapq
+import base64
 import logging
-import random
+import threading
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,46 +15,226 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from bs4 import BeautifulSoup
 from config import Config
+from browser_pool import cookie_fingerprint, get_browser_pool
+from lead_parser import (LEAD_ROW_SELECTORS, SELECTOR_CACHE, find_lead_rows, parse_lead_row,
+                         parse_api_people, api_total_results)
+from rate_limiter import AdaptiveDelay, get_page_rate_limiter
+from usage import UsageLimitExceeded
+from profiling import PhaseProfile
+from metrics import (PAGE_LOAD_SECONDS, LEAD_EXTRACTION_SECONDS, DELAY_SECONDS, LEADS_TOTAL,
+                     PAGES_TOTAL, WEBDRIVER_CALLS_TOTAL, AUTH_FAILURES_TOTAL)
 from utils import (
-    clean_text, extract_email, extract_phone, extract_linkedin_url,
-    calculate_smart_delay, format_company_size, log_scraping_metrics,
-    parse_apollo_cookies
+    clean_text, log_scraping_metrics, parse_apollo_cookies,
+    get_search_page, build_page_url
 )
 
+# Returns the outerHTML of the element holding the lead rows (falls back to <body>)
+RESULTS_HTML_SCRIPT = """
+var selectors = arguments[0];
+for (var i = 0; i < selectors.length; i++) {
+    var row = document.querySelector(selectors[i]);
+    if (row) {
+        var container = row.closest('table, [role="grid"], [role="table"]');
+        return (container || document.body).outerHTML;
+    }
+}
+return document.body.outerHTML;
+"""
+
+# Polled by wait_for_page_ready. On first call per document it installs a
+# MutationObserver and fetch/XHR hooks; each call reports whether the DOM has
+# been quiet for quietMs with no requests in flight and (optionally) rows present.
+# Results pages differ only in the URL hash, so the hooks survive a page change;
+# a hashchange counts as a mutation so the old page never reads as settled.
+# previous is the row signature shown before navigating, if any.
+PAGE_READY_SCRIPT = """
+var selectors = arguments[0], quietMs = arguments[1], requireRows = arguments[2], previous = arguments[3];
+var w = window.__apolloWait;
+if (!w) {
+    w = window.__apolloWait = {lastMutation: Date.now(), pending: 0};
+    new MutationObserver(function() { w.lastMutation = Date.now(); })
+        .observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    window.addEventListener('hashchange', function() { w.lastMutation = Date.now(); });
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function() {
+            w.pending++;
+            return originalFetch.apply(this, arguments).finally(function() { w.pending--; });
+        };
+    }
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        w.pending++;
+        this.addEventListener('loadend', function() { w.pending--; });
+        return originalSend.apply(this, arguments);
+    };
+}
+var rows = [];
+for (var i = 0; i < selectors.length && !rows.length; i++) {
+    rows = document.querySelectorAll(selectors[i]);
+}
+var signature = rows.length ? rows.length + ':' + rows[0].textContent.slice(0, 120) : '';
+var idleFor = Date.now() - w.lastMutation;
+// A long-lived request (analytics, polling) must not block forever: a DOM
+// quiet for four windows counts as settled even with requests pending
+var ready = idleFor >= quietMs && (w.pending <= 0 || idleFor >= quietMs * 4) &&
+    (!requireRows || rows.length > 0) &&
+    (previous === null || signature !== previous);
+// No rows after four quiet windows with nothing in flight: the page has no results
+var empty = requireRows && !rows.length && idleFor >= quietMs * 4 && w.pending <= 0;
+return {ready: ready || empty, empty: empty, rows: rows.length, pending: w.pending, signature: signature};
+"""
+
+SEARCH_API_URL = re.compile(Config.APOLLO_SEARCH_API_PATTERN)
+
+def finished_search_requests(log_entries, responses):
+    """Request IDs of people search API calls that finished loading, from performance log entries.
+    
+    responses collects the matching responses seen so far, since a response
+    and its loadingFinished event can arrive in different batches.
+    """
+    for entry in log_entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.responseReceived':
+            response = params.get('response', {})
+            if response.get('status') == 200 and SEARCH_API_URL.search(response.get('url', '')):
+                responses.add(params.get('requestId'))
+        elif method == 'Network.loadingFinished' and params.get('requestId') in responses:
+            responses.discard(params['requestId'])
+            yield params['requestId']
+
+class PageFanOut:
+    """Work queue and ordered results shared by the page workers of a parallel scrape.
+    
+    Workers take the lowest page still to load, but never one lookahead or
+    more pages past the page the consumer is waiting for, so at most that
+    many loaded pages are held out of order.
+    """
+    
+    MAX_ATTEMPTS = 2
+    
+    def __init__(self, pages, workers, lookahead=None):
+        self.pages = list(pages)
+        heapq.heapify(self.pages)
+        self.stop_page = pages[-1] + 1 if len(pages) else 0
+        self.wanted = pages[0] if len(pages) else 0
+        self.lookahead = lookahead or 2 * workers
+        self.active = workers
+        self.results = {}
+        self.attempts = {}
+        self.cancelled = threading.Event()
+        self.cond = threading.Condition()
+        self.error = None
+    
+    def next_page(self):
+        """Next page to load, or None once the queue is drained or the scrape has stopped"""
+        with self.cond:
+            while not self.cancelled.is_set():
+                if not self.pages or self.pages[0] >= self.stop_page:
+                    return None
+                if self.pages[0] < self.wanted + self.lookahead:
+                    return heapq.heappop(self.pages)
+                self.cond.wait()
+        return None
+    
+    def complete(self, page_num, leads):
+        with self.cond:
+            self.results[page_num] = leads
+            if not leads:
+                # An empty page marks the end of the results; skip everything after it
+                self.stop_page = min(self.stop_page, page_num)
+            self.cond.notify_all()
+    
+    def fail(self, page_num, error):
+        """Requeue a failed page once, then stop the scrape with the error"""
+        with self.cond:
+            self.attempts[page_num] = self.attempts.get(page_num, 0) + 1
+            if self.attempts[page_num] < self.MAX_ATTEMPTS:
+                heapq.heappush(self.pages, page_num)
+                self.cond.notify_all()
+                return
+        self.abort(Exception(f"Page {page_num} failed after {self.MAX_ATTEMPTS} attempts: {str(error)}"))
+    
+    def worker_done(self, scraper, worker):
+        with self.cond:
+            scraper.success_count += worker.success_count
+            scraper.error_count += worker.error_count
+            scraper.requests_made += worker.requests_made
+            self.active -= 1
+            self.cond.notify_all()
+    
+    def wait_for(self, page_num):
+        """Block until a page is loaded; raises if the workers stopped without loading it"""
+        with self.cond:
+            self.wanted = page_num
+            self.cond.notify_all()
+            while page_num not in self.results and self.active > 0 and self.error is None:
+                self.cond.wait()
+            if page_num not in self.results:
+                # Missing because the scrape broke down, not because results ran out
+                raise self.error or Exception(f"All page workers stopped before page {page_num} was loaded")
+            return self.results.pop(page_num)
+    
+    def abort(self, error):
+        """Stop every worker and re-raise error to the consumer"""
+        with self.cond:
+            self.error = self.error or error
+        self.cancel()
+    
+    def cancel(self):
+        self.cancelled.set()
+        with self.cond:
+            self.cond.notify_all()
+
 class ApolloScraper:
     def __init__(self, cookies=None, delay=Config.DEFAULT_DELAY):
         self.cookies = parse_apollo_cookies(cookies) if cookies else {}
         self.delay = delay
         self.driver = None
+        self.lease = None
         self.error_count = 0
         self.success_count = 0
         self.session_leads = []
+        # Page loads actually performed, and the optional usage.UsageCounters they are reserved from
+        self.requests_made = 0
+        self.usage = None
+        # Job-wide pacing controller (shared with parallel page workers) and the page load it is timing
+        self.pacing = AdaptiveDelay(delay)
+        self.page_started = None
+        self.page_settled = True
+        self.page_empty = False
+        self.previous_signature = None
+        # Exact result count reported by the search (None if only estimated), and whether
+        # the scrape stopped because the results ran out rather than on an error
+        self.total_results = None
+        self.results_exhausted = False
+        # Where the run's time goes (shared with parallel page workers)
+        self.profile = PhaseProfile()
+        # 'api' reads leads from the search API response instead of the rendered page
+        self.extraction_mode = 'dom'
+        self.api_payload = None
+        # Chrome profile to lease sessions with ('full' or 'lean')
+        self.browser_profile = 'full'
         
     def setup_driver(self):
-        """Setup Chrome WebDriver with optimal settings"""
+        """Lease a warm, cookie-loaded Chrome session from the worker's browser pool"""
         try:
-            from chrome_setup import setup_chrome_for_replit
-            
-            # Use the optimized Chrome setup
-            self.driver, error = setup_chrome_for_replit()
-            if not self.driver:
-                raise Exception(error)
-            
-            # Execute script to hide automation
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            # Set cookies if provided
-            if self.cookies:
-                self.driver.get(Config.APOLLO_BASE_URL)
-                for name, value in self.cookies.items():
-                    try:
-                        self.driver.add_cookie({
-                            'name': name,
-                            'value': value,
-                            'domain': '.apollo.io'
-                        })
-                    except Exception as e:
-                        logging.warning(f"Failed to set cookie {name}: {str(e)}")
+            with self.profile.phase('setup'):
+                self.lease = get_browser_pool().acquire(self.cookies, network_log=self.extraction_mode == 'api',
+                                                        profile=self.browser_profile)
+            self.driver = self.lease.driver
+            
+            # Bill the cookie-priming load a freshly launched session made, and
+            # take its token so the account's next load still keeps the pace
+            if self.lease.unrecorded_requests:
+                self.record_requests(self.lease.unrecorded_requests)
+                self.rate_limiter().acquire(self.lease.unrecorded_requests)
+                self.lease.unrecorded_requests = 0
             
             logging.info("Chrome WebDriver setup completed successfully")
             return True
@@ -59,201 +243,155 @@ class ApolloScraper:
             logging.error(f"Failed to setup Chrome WebDriver: {str(e)}")
             return False
     
-    def wait_for_page_load(self, timeout=30):
-        """Wait for page to fully load"""
+    def release_driver(self, discard=False):
+        """Return the leased Chrome session to the pool (or close it if discarded)"""
+        if self.lease:
+            get_browser_pool().release(self.lease, discard=discard)
+            logging.info("WebDriver released")
+        self.lease = None
+        self.driver = None
+    
+    def wait_for_page_load(self, timeout=30, require_rows=False, previous_signature=None):
+        """Wait for page to fully load (and, if given, replace the rows with previous_signature)"""
         try:
-            WebDriverWait(self.driver, timeout).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
-            )
-            # Additional wait for Apollo's React components
-            time.sleep(3)
-            return True
+            with self.profile.phase('wait'):
+                WebDriverWait(self.driver, timeout).until(
+                    lambda driver: driver.execute_script("return document.readyState") == "complete"
+                )
         except TimeoutException:
             logging.warning("Page load timeout")
+            self.page_settled = False
             return False
+        
+        # Wait for Apollo's React components to finish rendering
+        self.wait_for_page_ready(require_rows=require_rows, previous_signature=previous_signature)
+        return True
+    
+    def wait_for_page_ready(self, require_rows=True, previous_signature=None, timeout=None):
+        """Wait until the results are rendered instead of sleeping a fixed time.
+        
+        Ready means no DOM mutation for Config.DOM_QUIET_MS, no fetch/XHR in
+        flight and, if required, lead rows present (and different from
+        previous_signature, to detect a page change). A page that stays
+        quiet without rows is ready too and sets page_empty. Returns the row
+        signature, or None if Config.PAGE_READY_TIMEOUT passed first.
+        """
+        state = {}
+        
+        def page_ready(driver):
+            WEBDRIVER_CALLS_TOTAL.labels('execute_script').inc()
+            result = driver.execute_script(
+                PAGE_READY_SCRIPT, LEAD_ROW_SELECTORS, Config.DOM_QUIET_MS, require_rows, previous_signature
+            ) or {}
+            state.update(result)
+            return result.get('ready', False)
+        
+        try:
+            with self.profile.phase('wait'):
+                WebDriverWait(self.driver, timeout or Config.PAGE_READY_TIMEOUT, poll_frequency=0.2).until(page_ready)
+            self.page_settled = True
+            self.page_empty = bool(state.get('empty'))
+            return state.get('signature', '')
+        except TimeoutException:
+            self.page_settled = False
+            self.page_empty = False
+            logging.warning(f"Page not settled after {timeout or Config.PAGE_READY_TIMEOUT}s "
+                            f"(rows={state.get('rows', 0)}, pending requests={state.get('pending', 0)}), continuing")
+            return None
     
-    def smart_delay(self):
-        """Apply smart delay between requests"""
-        delay = calculate_smart_delay(self.delay, self.error_count, self.success_count)
-        logging.debug(f"Applying delay of {delay:.2f} seconds")
-        time.sleep(delay)
+    def wait_for_results(self):
+        """Wait until the page just requested can be scraped.
+        
+        In API mode that is as soon as the search API response has arrived,
+        without waiting for it to render; otherwise, or if no response was
+        captured, once the rendered rows have settled.
+        """
+        if self.extraction_mode == 'api' and self.capture_search_response():
+            return True
+        return self.wait_for_page_load(require_rows=True, previous_signature=self.previous_signature)
     
-    def extract_lead_data(self, lead_element):
-        """Extract comprehensive lead data from a lead element"""
+    def row_signature(self):
+        """Signature of the lead rows currently shown, or None if it cannot be read"""
         try:
-            lead_data = {
-                'first_name': '',
-                'last_name': '',
-                'full_name': '',
-                'email': '',
-                'phone': '',
-                'linkedin_url': '',
-                'job_title': '',
-                'seniority': '',
-                'department': '',
-                'company_name': '',
-                'company_domain': '',
-                'company_website': '',
-                'company_industry': '',
-                'company_size': '',
-                'company_location': '',
-                'company_linkedin': '',
-                'years_experience': 0,
-                'location': '',
-                'raw_data': ''
-            }
-            
-            # Get the HTML content
-            html_content = lead_element.get_attribute('innerHTML')
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Store raw data
-            lead_data['raw_data'] = json.dumps(html_content)
-            
-            # Extract name information
-            name_selectors = [
-                '[data-cy="person-name"]',
-                '.zp_xVJ20',
-                '.person-name',
-                '[class*="name"]'
-            ]
-            
-            for selector in name_selectors:
-                try:
-                    name_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    full_name = clean_text(name_element.text)
-                    if full_name:
-                        lead_data['full_name'] = full_name
-                        name_parts = full_name.split(' ')
-                        if len(name_parts) >= 1:
-                            lead_data['first_name'] = name_parts[0]
-                        if len(name_parts) >= 2:
-                            lead_data['last_name'] = ' '.join(name_parts[1:])
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # Extract email
-            email_selectors = [
-                '[data-cy="person-email"]',
-                '.zp_Iu6Pf',
-                '[class*="email"]',
-                'a[href^="mailto:"]'
-            ]
-            
-            for selector in email_selectors:
-                try:
-                    email_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    email = clean_text(email_element.text) or email_element.get_attribute('href', '').replace('mailto:', '')
-                    if '@' in email:
-                        lead_data['email'] = email
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # If no email found, try to extract from text content
-            if not lead_data['email']:
-                lead_data['email'] = extract_email(html_content)
-            
-            # Extract phone number
-            phone_selectors = [
-                '[data-cy="person-phone"]',
-                '.zp_Yz4Ml',
-                '[class*="phone"]'
-            ]
-            
-            for selector in phone_selectors:
-                try:
-                    phone_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    phone = clean_text(phone_element.text)
-                    if phone:
-                        lead_data['phone'] = phone
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # If no phone found, try to extract from text content
-            if not lead_data['phone']:
-                lead_data['phone'] = extract_phone(html_content)
-            
-            # Extract LinkedIn URL
-            linkedin_selectors = [
-                'a[href*="linkedin.com"]',
-                '[data-cy="person-linkedin"]'
-            ]
-            
-            for selector in linkedin_selectors:
-                try:
-                    linkedin_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    linkedin_url = linkedin_element.get_attribute('href')
-                    if linkedin_url and 'linkedin.com' in linkedin_url:
-                        lead_data['linkedin_url'] = linkedin_url
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # Extract job title
-            title_selectors = [
-                '[data-cy="person-title"]',
-                '.zp_Y6y8d',
-                '[class*="title"]',
-                '[class*="job-title"]'
-            ]
-            
-            for selector in title_selectors:
-                try:
-                    title_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    job_title = clean_text(title_element.text)
-                    if job_title:
-                        lead_data['job_title'] = job_title
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # Extract company information
-            company_selectors = [
-                '[data-cy="person-company"]',
-                '.zp_J1j1x',
-                '[class*="company"]'
-            ]
-            
-            for selector in company_selectors:
-                try:
-                    company_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    company_name = clean_text(company_element.text)
-                    if company_name:
-                        lead_data['company_name'] = company_name
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # Extract location
-            location_selectors = [
-                '[data-cy="person-location"]',
-                '.zp_MC4wf',
-                '[class*="location"]'
-            ]
-            
-            for selector in location_selectors:
-                try:
-                    location_element = lead_element.find_element(By.CSS_SELECTOR, selector)
-                    location = clean_text(location_element.text)
-                    if location:
-                        lead_data['location'] = location
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            # Extract additional company details from company link/popup if available
-            try:
-                company_link = lead_element.find_element(By.CSS_SELECTOR, 'a[href*="/companies/"]')
-                if company_link:
-                    company_url = company_link.get_attribute('href')
-                    # Extract company domain from URL if possible
-                    if '/companies/' in company_url:
-                        lead_data['company_domain'] = company_url.split('/companies/')[-1].split('/')[0]
-            except NoSuchElementException:
-                pass
+            WEBDRIVER_CALLS_TOTAL.labels('execute_script').inc()
+            return (self.driver.execute_script(
+                PAGE_READY_SCRIPT, LEAD_ROW_SELECTORS, 0, False, None
+            ) or {}).get('signature')
+        except WebDriverException:
+            return None
+    
+    def clear_network_log(self):
+        """Drop network events from earlier page loads before requesting a new one"""
+        self.api_payload = None
+        if self.extraction_mode == 'api':
+            WEBDRIVER_CALLS_TOTAL.labels('get_log').inc()
+            self.driver.get_log('performance')
+    
+    def capture_search_response(self, timeout=None):
+        """Wait for the people search API response and keep its JSON payload in api_payload.
+        
+        Returns False if none arrived within Config.PAGE_READY_TIMEOUT.
+        """
+        timeout = timeout or Config.PAGE_READY_TIMEOUT
+        deadline = time.monotonic() + timeout
+        responses = set()
+        with self.profile.phase('wait'):
+            while time.monotonic() < deadline:
+                WEBDRIVER_CALLS_TOTAL.labels('get_log').inc()
+                for request_id in finished_search_requests(self.driver.get_log('performance'), responses):
+                    payload = self.read_response_json(request_id)
+                    if isinstance(payload, dict) and ('people' in payload or 'contacts' in payload):
+                        self.api_payload = payload
+                        self.page_settled = True
+                        return True
+                time.sleep(0.2)
+        
+        self.page_settled = False
+        logging.warning(f"No search API response captured after {timeout}s, falling back to the rendered page")
+        return False
+    
+    def read_response_json(self, request_id):
+        """Body of a captured network response parsed as JSON, or None if unavailable"""
+        try:
+            WEBDRIVER_CALLS_TOTAL.labels('execute_cdp_cmd').inc()
+            response = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            body = response.get('body', '')
+            if response.get('base64Encoded'):
+                body = base64.b64decode(body).decode('utf-8')
+            return json.loads(body)
+        except Exception as e:
+            logging.warning(f"Could not read search API response: {str(e)}")
+            return None
+    
+    def rate_limiter(self):
+        """Page-load token bucket shared by every session and worker using this account"""
+        return get_page_rate_limiter(cookie_fingerprint(self.cookies))
+    
+    def smart_delay(self, stop_event=None):
+        """Wait for the account's page budget before the next page load.
+        
+        Time spent waiting for a token counts towards this job's own pacing
+        delay, so only the remainder of that delay is slept. Returns early
+        if stop_event is set.
+        """
+        with self.profile.phase('delay'):
+            waited = self.rate_limiter().acquire(stop_event=stop_event)
+            DELAY_SECONDS.labels('rate_limit').observe(waited)
+            delay = self.pacing.next_delay() - waited
+            if delay <= 0:
+                return
+            DELAY_SECONDS.labels('pacing').observe(delay)
+            logging.debug(f"Applying delay of {delay:.2f} seconds")
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+    
+    def extract_lead_data(self, lead_row):
+        """Extract comprehensive lead data from a parsed lead row"""
+        try:
+            with LEAD_EXTRACTION_SECONDS.time():
+                lead_data = parse_lead_row(lead_row)
             
             self.success_count += 1
             logging.debug(f"Successfully extracted lead data for: {lead_data['full_name']}")
@@ -267,6 +405,11 @@ class ApolloScraper:
     def get_total_results(self):
         """Get total number of results from the search"""
         try:
+            if self.api_payload is not None and api_total_results(self.api_payload) is not None:
+                total = self.total_results = api_total_results(self.api_payload)
+                logging.info(f"Found {total} total results")
+                return total
+            
             # Common selectors for result count
             result_selectors = [
                 '[data-cy="results-count"]',
@@ -281,10 +424,9 @@ class ApolloScraper:
                     result_text = clean_text(result_element.text)
                     
                     # Extract number from text like "1,234 results" or "1234 people"
-                    import re
                     numbers = re.findall(r'[\d,]+', result_text)
                     if numbers:
-                        total = int(numbers[0].replace(',', ''))
+                        total = self.total_results = int(numbers[0].replace(',', ''))
                         logging.info(f"Found {total} total results")
                         return total
                 except NoSuchElementException:
@@ -301,65 +443,67 @@ class ApolloScraper:
     
     def scrape_current_page(self):
         """Scrape leads from the current page"""
+        if self.api_payload is not None:
+            return self.scrape_api_payload()
+        
+        if self.page_empty:
+            logging.info("Results page has no leads")
+            return []
+        
         leads = []
         
         try:
             # Wait for leads to load
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, '[data-cy="person"], .zp_xVJ20, [class*="person-row"]'))
-            )
-            
-            # Find all lead elements on the page
-            lead_selectors = [
-                '[data-cy="person"]',
-                '.zp_xVJ20',
-                '[class*="person-row"]',
-                '[class*="contact-row"]'
-            ]
-            
-            lead_elements = []
-            for selector in lead_selectors:
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                if elements:
-                    lead_elements = elements
-                    break
-            
-            logging.info(f"Found {len(lead_elements)} lead elements on current page")
-            
-            # Extract data from each lead
-            for i, lead_element in enumerate(lead_elements):
-                try:
-                    # Scroll element into view
-                    self.driver.execute_script("arguments[0].scrollIntoView(true);", lead_element)
-                    time.sleep(0.5)
-                    
-                    lead_data = self.extract_lead_data(lead_element)
-                    if lead_data and lead_data['full_name']:  # Only add if we got meaningful data
-                        leads.append(lead_data)
-                        log_scraping_metrics(None, 'lead_extracted', {
-                            'lead_name': lead_data['full_name'],
-                            'has_email': bool(lead_data['email']),
-                            'has_phone': bool(lead_data['phone'])
-                        })
-                    
-                    # Short delay between lead extractions
-                    if i < len(lead_elements) - 1:
-                        time.sleep(random.uniform(0.5, 1.5))
-                        
-                except Exception as e:
-                    logging.error(f"Error processing lead element {i}: {str(e)}")
-                    continue
+            with self.profile.phase('wait'):
+                WebDriverWait(self.driver, 20).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, '[data-cy="person"], .zp_xVJ20, [class*="person-row"]'))
+                )
+            
+            with self.profile.phase('extraction'):
+                # Pull the results table HTML in a single WebDriver call and parse it locally
+                WEBDRIVER_CALLS_TOTAL.labels('execute_script').inc()
+                html_content = self.driver.execute_script(RESULTS_HTML_SCRIPT, LEAD_ROW_SELECTORS)
+                lead_rows = find_lead_rows(BeautifulSoup(html_content or '', 'html.parser'))
+                
+                logging.info(f"Found {len(lead_rows)} lead elements on current page")
+                
+                # Extract data from each lead
+                for i, lead_row in enumerate(lead_rows):
+                    try:
+                        lead_data = self.extract_lead_data(lead_row)
+                        if lead_data and lead_data['full_name']:  # Only add if we got meaningful data
+                            leads.append(lead_data)
+                            LEADS_TOTAL.labels('extracted').inc()
+                            
+                    except Exception as e:
+                        logging.error(f"Error processing lead element {i}: {str(e)}")
+                        continue
+                
+                SELECTOR_CACHE.sync()
             
             logging.info(f"Successfully scraped {len(leads)} leads from current page")
             return leads
             
         except TimeoutException:
             logging.error("Timeout waiting for leads to load")
+            self.page_settled = False
             return []
         except Exception as e:
             logging.error(f"Error scraping current page: {str(e)}")
+            self.page_settled = False
             return []
     
+    def scrape_api_payload(self):
+        """Leads from the captured search API response (consumed, so each response is scraped once)"""
+        payload, self.api_payload = self.api_payload, None
+        with self.profile.phase('extraction'):
+            leads = parse_api_people(payload)
+        
+        self.success_count += len(leads)
+        LEADS_TOTAL.labels('extracted').inc(len(leads))
+        logging.info(f"Successfully scraped {len(leads)} leads from the search API response")
+        return leads
+    
     def go_to_next_page(self):
         """Navigate to the next page of results"""
         try:
@@ -376,13 +520,18 @@ class ApolloScraper:
                 try:
                     next_button = self.driver.find_element(By.CSS_SELECTOR, selector)
                     if next_button.is_enabled() and next_button.is_displayed():
+                        current_signature = self.row_signature()
+                        
                         # Scroll to button and click
                         self.driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
-                        time.sleep(1)
-                        next_button.click()
+                        self.reserve_request()
+                        self.page_started = time.monotonic()
+                        WEBDRIVER_CALLS_TOTAL.labels('click').inc()
+                        with self.profile.phase('navigation'):
+                            next_button.click()
                         
-                        # Wait for page to load
-                        self.wait_for_page_load()
+                        # Wait until the rows have been replaced by the next page's
+                        self.wait_for_page_ready(previous_signature=current_signature)
                         logging.info("Successfully navigated to next page")
                         return True
                 except NoSuchElementException:
@@ -391,26 +540,220 @@ class ApolloScraper:
             logging.info("No next page button found or available")
             return False
             
+        except UsageLimitExceeded:
+            raise
         except Exception as e:
             logging.error(f"Error navigating to next page: {str(e)}")
             return False
     
-    def scrape_apollo_search(self, search_url, max_results=1000, progress_callback=None):
-        """Main scraping method for Apollo search results"""
+    def iter_pages_serial(self, search_url, max_pages=None):
+        """Yield (page number, leads) by clicking through pages from the one already loaded (by URL in API mode)"""
+        page_num = get_search_page(search_url)
+        last_page = page_num + min(max_pages or Config.MAX_PAGES_PER_JOB, Config.MAX_PAGES_PER_JOB) - 1
+        
+        while True:
+            logging.info(f"Scraping page {page_num}")
+            
+            page_leads = self.scrape_current_page()
+            self.record_page_load(page_leads)
+            if not page_leads:
+                logging.warning(f"No leads found on page {page_num}, stopping")
+                self.results_exhausted = self.page_settled
+                return
+            
+            yield page_num, page_leads
+            
+            # Safety check to prevent infinite loops
+            if page_num >= last_page:
+                logging.info(f"Reached page limit (page {last_page}), stopping")
+                return
+            
+            # Apply smart delay before next page
+            self.smart_delay()
+            
+            # In API mode the page is never waited on to render, so load the
+            # next one by URL instead of looking for its Next button
+            if self.extraction_mode == 'api':
+                self.navigate(build_page_url(search_url, page_num + 1))
+                self.wait_for_results()
+            elif not self.go_to_next_page():
+                logging.info("No more pages available")
+                return
+            
+            page_num += 1
+    
+    def iter_pages_parallel(self, search_url, max_results, concurrency, max_pages=None):
+        """Yield (page number, leads) in page order, fetching later pages on concurrent sessions"""
+        first_page = get_search_page(search_url)
+        pages_needed = min(math.ceil(max_results / Config.RESULTS_PER_PAGE), max_pages or Config.MAX_PAGES_PER_JOB, Config.MAX_PAGES_PER_JOB)
+        last_page = first_page + pages_needed - 1
+        
+        # The first page is already loaded in our own session
+        page_leads = self.scrape_current_page()
+        self.record_page_load(page_leads)
+        if not page_leads:
+            logging.warning(f"No leads found on page {first_page}, stopping")
+            self.results_exhausted = self.page_settled
+            return
+        yield first_page, page_leads
+        
+        if last_page <= first_page:
+            return
+        
+        # Hand our warm session back to the pool so a page worker can lease it
+        self.release_driver()
+        
+        remaining_pages = range(first_page + 1, last_page + 1)
+        fan_out = PageFanOut(remaining_pages, workers=min(concurrency, len(remaining_pages)))
+        threads = [
+            threading.Thread(target=self._page_worker, args=(search_url, fan_out), daemon=True)
+            for _ in range(fan_out.active)
+        ]
+        logging.info(f"Fetching pages {first_page + 1}-{last_page} with {len(threads)} concurrent sessions")
+        self.pacing.set_sessions(len(threads))
+        for thread in threads:
+            thread.start()
+        
+        try:
+            for page_num in remaining_pages:
+                page_leads = fan_out.wait_for(page_num)
+                if not page_leads:
+                    # Workers only complete pages that settled empty; failures raise above
+                    logging.warning(f"No leads found on page {page_num}, stopping")
+                    self.results_exhausted = True
+                    return
+                yield page_num, page_leads
+        finally:
+            fan_out.cancel()
+            for thread in threads:
+                thread.join()
+            self.pacing.set_sessions(1)
+    
+    def _page_worker(self, search_url, fan_out):
+        """Lease a session and load pages from the shared queue until it is drained"""
+        worker = type(self)(delay=self.delay)
+        worker.cookies = self.cookies
+        worker.usage = self.usage
+        worker.pacing = self.pacing
+        worker.profile = self.profile
+        worker.extraction_mode = self.extraction_mode
+        worker.browser_profile = self.browser_profile
+        try:
+            if not worker.setup_driver():
+                return
+            
+            while True:
+                page_num = fan_out.next_page()
+                if page_num is None:
+                    return
+                
+                # Per-session pacing within the account's page budget;
+                # interrupted immediately if the job is cancelled
+                worker.smart_delay(fan_out.cancelled)
+                if fan_out.cancelled.is_set():
+                    return
+                
+                try:
+                    page_leads = worker.load_page(build_page_url(search_url, page_num))
+                    if not page_leads and not worker.page_settled:
+                        raise Exception("Page had no leads before it finished loading")
+                    fan_out.complete(page_num, page_leads)
+                except UsageLimitExceeded as e:
+                    logging.warning(f"Stopping page workers: {str(e)}")
+                    fan_out.abort(e)
+                    return
+                except Exception as e:
+                    logging.error(f"Error loading page {page_num}: {str(e)}")
+                    fan_out.fail(page_num, e)
+        finally:
+            worker.release_driver()
+            fan_out.worker_done(self, worker)
+            # The sessions still running share the job's pace
+            self.pacing.set_sessions(fan_out.active)
+    
+    def reserve_request(self):
+        """Count a page load about to be made against the daily budget (raises UsageLimitExceeded when spent)"""
+        if self.usage is not None:
+            self.usage.reserve_requests()
+        self.requests_made += 1
+    
+    def record_requests(self, count):
+        """Count page loads that were already made outside the scraper's control"""
+        if self.usage is not None:
+            self.usage.record(requests_made=count)
+        self.requests_made += count
+    
+    def navigate(self, url):
+        """Load a URL in the browser, counting it as a request"""
+        self.reserve_request()
+        self.clear_network_log()
+        # Moving between results pages only changes the hash, so the old rows
+        # stay in the DOM until the new ones render; remember them to wait past
+        self.previous_signature = self.row_signature() if self.driver.current_url != url else None
+        self.page_empty = False
+        self.page_started = time.monotonic()
+        WEBDRIVER_CALLS_TOTAL.labels('get').inc()
+        with self.profile.phase('navigation'):
+            self.driver.get(url)
+    
+    def record_page_load(self, leads):
+        """Feed the latency and outcome of the page just loaded to the pacing controller"""
+        if self.page_started is None:
+            return
+        latency = time.monotonic() - self.page_started
+        outcome = ('ok' if leads else 'empty') if self.page_settled else 'timeout'
+        PAGE_LOAD_SECONDS.labels(outcome).observe(latency)
+        PAGES_TOTAL.labels(outcome).inc()
+        self.pacing.record(latency, ok=outcome == 'ok')
+        self.page_started = None
+    
+    def load_page(self, url):
+        """Navigate directly to a results page URL and scrape it"""
+        logging.info(f"Loading results page: {url}")
+        self.navigate(url)
+        if not self.wait_for_results():
+            self.record_page_load([])
+            raise Exception("Page failed to load")
+        
+        if '/sign-in' in self.driver.current_url or 'login' in self.driver.current_url.lower():
+            self.lease.authenticated_at = None
+            AUTH_FAILURES_TOTAL.inc()
+            raise Exception("Authentication required. Please provide valid cookies or login credentials.")
+        
+        page_leads = self.scrape_current_page()
+        self.record_page_load(page_leads)
+        return page_leads
+    
+    def iter_apollo_search(self, search_url, max_results=1000, progress_callback=None, concurrency=1, max_pages=None):
+        """Stream Apollo search results as (page number, leads) pairs.
+        
+        Only one page of leads is held at a time, so callers can persist each
+        page as it arrives. With concurrency > 1 later pages are loaded by URL
+        on that many browser sessions in parallel; otherwise pages are walked
+        with the Next button. max_pages stops after that many pages.
+        """
+        driver_failed = False
+        pages = None
         try:
             if not self.setup_driver():
                 raise Exception("Failed to setup WebDriver")
             
+            # Start from the selector order other jobs have learned
+            SELECTOR_CACHE.sync()
+            
             # Navigate to search URL
             logging.info(f"Navigating to search URL: {search_url}")
-            self.driver.get(search_url)
+            self.rate_limiter().acquire()
+            self.navigate(search_url)
             
-            # Wait for page to load
-            if not self.wait_for_page_load():
+            # Wait for page to load (or just its search API response)
+            if not self.wait_for_results():
                 raise Exception("Page failed to load")
             
             # Check if we need to login
             if '/sign-in' in self.driver.current_url or 'login' in self.driver.current_url.lower():
+                self.lease.authenticated_at = None
+                AUTH_FAILURES_TOTAL.inc()
                 raise Exception("Authentication required. Please provide valid cookies or login credentials.")
             
             # Get total results
@@ -419,66 +762,61 @@ class ApolloScraper:
             
             logging.info(f"Starting to scrape {actual_max} leads from {total_results} total results")
             
-            all_leads = []
-            page_num = 1
+            if concurrency > 1:
+                pages = self.iter_pages_parallel(search_url, actual_max, concurrency, max_pages)
+            else:
+                pages = self.iter_pages_serial(search_url, max_pages)
             
-            while len(all_leads) < actual_max:
-                logging.info(f"Scraping page {page_num}")
-                
-                # Scrape current page
-                page_leads = self.scrape_current_page()
-                
-                if not page_leads:
-                    logging.warning(f"No leads found on page {page_num}, stopping")
-                    break
+            leads_scraped = 0
+            pages_scraped = 0
+            
+            for page_num, page_leads in pages:
+                pages_scraped += 1
                 
                 # Add leads up to our limit
-                remaining_slots = actual_max - len(all_leads)
+                remaining_slots = actual_max - leads_scraped
                 leads_to_add = page_leads[:remaining_slots]
-                all_leads.extend(leads_to_add)
+                leads_scraped += len(leads_to_add)
                 
                 # Update progress
-                progress = len(all_leads) / actual_max * 100
+                progress = leads_scraped / actual_max * 100
                 if progress_callback:
-                    progress_callback(progress, len(all_leads), actual_max)
+                    progress_callback(progress, leads_scraped, actual_max)
                 
-                logging.info(f"Page {page_num} complete. Total leads: {len(all_leads)}/{actual_max}")
+                logging.info(f"Page {page_num} complete. Total leads: {leads_scraped}/{actual_max}")
+                if self.total_results is not None and page_num * Config.RESULTS_PER_PAGE >= self.total_results:
+                    self.results_exhausted = True
+                yield page_num, leads_to_add
                 
                 # Check if we've reached our limit
-                if len(all_leads) >= actual_max:
-                    break
-                
-                # Apply smart delay before next page
-                self.smart_delay()
-                
-                # Try to go to next page
-                if not self.go_to_next_page():
-                    logging.info("No more pages available")
-                    break
-                
-                page_num += 1
-                
-                # Safety check to prevent infinite loops
-                if page_num > 1000:
-                    logging.warning("Reached maximum page limit (1000), stopping")
+                if leads_scraped >= actual_max:
                     break
             
-            logging.info(f"Scraping completed. Total leads extracted: {len(all_leads)}")
+            logging.info(f"Scraping completed. Total leads extracted: {leads_scraped}")
             log_scraping_metrics(None, 'scraping_completed', {
-                'total_leads': len(all_leads),
-                'pages_scraped': page_num,
+                'total_leads': leads_scraped,
+                'pages_scraped': pages_scraped,
+                'requests_made': self.requests_made,
                 'success_rate': self.success_count / (self.success_count + self.error_count) if (self.success_count + self.error_count) > 0 else 0
             })
             
-            return all_leads
-            
         except Exception as e:
+            driver_failed = isinstance(e, WebDriverException)
             logging.error(f"Scraping failed: {str(e)}")
             raise e
         finally:
-            if self.driver:
-                self.driver.quit()
-                logging.info("WebDriver closed")
+            if pages is not None:
+                pages.close()
+            self.release_driver(discard=driver_failed)
+            SELECTOR_CACHE.sync(force=True)
+    
+    def scrape_apollo_search(self, search_url, max_results=1000, progress_callback=None, concurrency=1):
+        """Main scraping method for Apollo search results; returns every lead as one list"""
+        return [
+            lead
+            for _, page_leads in self.iter_apollo_search(search_url, max_results, progress_callback, concurrency)
+            for lead in page_leads
+        ]
     
     def test_authentication(self):
         """Test if authentication is working"""
@@ -486,13 +824,19 @@ class ApolloScraper:
             if not self.setup_driver():
                 return False, "Failed to setup WebDriver"
             
+            # A pooled session verified recently does not need another round trip
+            if self.lease.is_authenticated():
+                return True, "Authentication successful (verified session)"
+            
             # Navigate to Apollo dashboard
-            self.driver.get(f"{Config.APOLLO_BASE_URL}/#/home")
+            self.rate_limiter().acquire()
+            self.navigate(f"{Config.APOLLO_BASE_URL}/#/home")
             self.wait_for_page_load()
             
             # Check if we're redirected to login
             current_url = self.driver.current_url
             if '/sign-in' in current_url or 'login' in current_url.lower():
+                AUTH_FAILURES_TOTAL.inc()
                 return False, "Authentication failed - redirected to login page"
             
             # Check for user-specific elements
@@ -506,6 +850,7 @@ class ApolloScraper:
             for selector in user_indicators:
                 try:
                     self.driver.find_element(By.CSS_SELECTOR, selector)
+                    self.lease.mark_authenticated()
                     return True, "Authentication successful"
                 except NoSuchElementException:
                     continue
@@ -515,5 +860,4 @@ class ApolloScraper:
         except Exception as e:
             return False, f"Authentication test failed: {str(e)}"
         finally:
-            if self.driver:
-                self.driver.quit()
+            self.release_driver()
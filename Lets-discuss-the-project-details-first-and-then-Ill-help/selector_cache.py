@@ -0,0 +1,132 @@
+"""
+Learned selector order for lead field extraction.
+
+Apollo's obfuscated zp_* class names change between deploys, so a fixed
+fallback order keeps paying for the same misses on every row. Every hit
+scores the selector that produced the value and halves the score of each
+selector tried before it on that row; exact selectors (data-cy, zp_*,
+named classes) are then tried highest score first. Generic selectors that
+match attribute substrings, like [class*="name"], also match unrelated
+elements (a company-name div), so they are never promoted: they keep their
+default positions as last resorts. Scores are shared through Redis when
+it is available, so a new job starts from what earlier jobs learned. The
+full list is always tried on a miss, so a stale order costs time.
+"""
+import re
+import time
+import logging
+import threading
+from config import Config
+
+# Attribute substring/prefix/suffix/word matches ([class*="name"], a[href^="mailto:"])
+GENERIC_SELECTOR = re.compile(r'[*^$~|]=')
+
+def is_learnable(selector):
+    """True for exact selectors, whose order may be learned"""
+    return not GENERIC_SELECTOR.search(selector)
+
+class SelectorCache:
+    """Per-field selector scores and the order they imply, shared by every scraper in the process"""
+
+    def __init__(self, field_patterns, prefix='selector_scores'):
+        self.field_patterns = field_patterns  # field -> [(selector, compiled pattern)] in default order
+        self.prefix = prefix
+        self.order = {field: list(patterns) for field, patterns in field_patterns.items()}
+        self.scores = {field: {} for field in field_patterns}
+        self.pending = {field: {} for field in field_patterns}  # score changes not yet pushed to Redis
+        self.synced_at = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget every score and go back to the default order (scores in Redis are kept)"""
+        with self._lock:
+            self.order = {field: list(patterns) for field, patterns in self.field_patterns.items()}
+            self.scores = {field: {} for field in self.field_patterns}
+            self.pending = {field: {} for field in self.field_patterns}
+            self.synced_at = None
+
+    def ordered(self, field):
+        """(selector, pattern) pairs for a field, best first"""
+        return self.order[field]
+
+    def record(self, field, selector, missed=()):
+        """Score a selector that produced a value, after the selectors in missed did not"""
+        if not is_learnable(selector):
+            return
+        with self._lock:
+            scores = self.scores[field]
+            pending = self.pending[field]
+            for miss in missed:
+                if not is_learnable(miss):
+                    continue
+                penalty = scores.get(miss, 0.0) / 2
+                if penalty:
+                    scores[miss] -= penalty
+                    pending[miss] = pending.get(miss, 0.0) - penalty
+            scores[selector] = scores.get(selector, 0.0) + 1
+            pending[selector] = pending.get(selector, 0.0) + 1
+            if missed:
+                self._reorder(field)
+
+    def _reorder(self, field):
+        scores = self.scores[field]
+        defaults = self.field_patterns[field]
+        # Stable sort, so unscored selectors keep their default order
+        ranked = iter(sorted(
+            (item for item in defaults if is_learnable(item[0])),
+            key=lambda item: -scores.get(item[0], 0.0)
+        ))
+        # Exact selectors take the slots exact selectors had; generic ones stay put
+        self.order[field] = [next(ranked) if is_learnable(item[0]) else item for item in defaults]
+
+    def sync(self, force=False):
+        """Push local score changes to Redis and pull what other workers learned.
+
+        Runs at most every SELECTOR_CACHE_SYNC_SECONDS unless forced; a no-op without Redis.
+        """
+        from app import redis_client
+
+        now = time.monotonic()
+        if redis_client is None:
+            return
+        if not force and self.synced_at is not None and now - self.synced_at < Config.SELECTOR_CACHE_SYNC_SECONDS:
+            return
+        self.synced_at = now
+
+        with self._lock:
+            pending, self.pending = self.pending, {field: {} for field in self.field_patterns}
+
+        try:
+            pipe = redis_client.pipeline()
+            for field in self.field_patterns:
+                key = f'{self.prefix}:{field}'
+                for selector, delta in pending[field].items():
+                    pipe.hincrbyfloat(key, selector, delta)
+                pipe.expire(key, Config.SELECTOR_CACHE_TTL)
+                pipe.hgetall(key)
+            stored = [result for result in pipe.execute() if isinstance(result, dict)]
+        except Exception as e:
+            logging.warning(f"Could not sync selector scores with Redis: {str(e)}")
+            with self._lock:
+                for field, deltas in pending.items():
+                    for selector, delta in deltas.items():
+                        self.pending[field][selector] = self.pending[field].get(selector, 0.0) + delta
+            return
+
+        with self._lock:
+            for field, values in zip(self.field_patterns, stored):
+                known = {selector for selector, _ in self.field_patterns[field] if is_learnable(selector)}
+                scores = {}
+                for selector, score in values.items():
+                    selector = selector.decode() if isinstance(selector, bytes) else selector
+                    if selector in known:
+                        scores[selector] = max(float(score), 0.0)
+                # Changes recorded while the pipeline ran are not in Redis yet
+                for selector, delta in self.pending[field].items():
+                    scores[selector] = max(scores.get(selector, 0.0) + delta, 0.0)
+                self.scores[field] = scores
+                self._reorder(field)
+
+    def snapshot(self):
+        """Current selector order per field, for logging"""
+        return {field: [selector for selector, _ in patterns] for field, patterns in self.order.items()}
@@ -5,13 +5,20 @@ import time
 import logging
 from datetime import datetime
 from scraper import ApolloScraper
-from models import ScrapingJob, Lead, DailyUsage, db
-from tasks import create_csv_export
+from models import ScrapingJob, DailyUsage, db
+from lead_store import LeadWriter
 from utils import log_scraping_metrics
+from progress_events import publish_job_event, publish_job_status, publish_usage_event
+from usage import UsageCounters
 
 def scrape_apollo_sync(job_id, search_url, cookies, max_results, delay):
     """Synchronous version of the scraping task"""
+    writer = None
+    scraper = None
+    leads_reserved = 0
     try:
+        usage = UsageCounters()
+        
         # Get job from database
         job = ScrapingJob.query.get(job_id)
         if not job:
@@ -20,6 +27,7 @@ def scrape_apollo_sync(job_id, search_url, cookies, max_results, delay):
         # Update job status
         job.status = 'running'
         db.session.commit()
+        publish_job_status(job)
         
         log_scraping_metrics(job_id, 'job_started', {
             'search_url': search_url,
@@ -29,6 +37,9 @@ def scrape_apollo_sync(job_id, search_url, cookies, max_results, delay):
         
         # Initialize scraper
         scraper = ApolloScraper(cookies=cookies, delay=delay)
+        scraper.usage = usage
+        scraper.extraction_mode = job.extraction_mode or 'dom'
+        scraper.browser_profile = job.browser_profile or 'full'
         
         # Simple progress callback
         def update_progress(progress, scraped_leads, total_leads):
@@ -36,81 +47,71 @@ def scrape_apollo_sync(job_id, search_url, cookies, max_results, delay):
                 job.progress = progress
                 job.scraped_leads = scraped_leads
                 job.total_leads = total_leads
+                job.requests_made = scraper.requests_made
+                job.profile = scraper.profile.to_dict()
                 db.session.commit()
+                publish_job_event(job_id, 'progress', {
+                    'status': job.status,
+                    'progress': progress,
+                    'scraped_leads': scraped_leads,
+                    'total_leads': total_leads,
+                    'requests_made': scraper.requests_made,
+                    'pacing': scraper.pacing.snapshot()
+                })
         
         # Start scraping (limited to 100 results for sync mode)
         limited_results = min(max_results, 100)  # Limit for sync processing
-        leads_data = scraper.scrape_apollo_search(
-            search_url=search_url,
-            max_results=limited_results,
-            progress_callback=update_progress
-        )
-        
-        if not leads_data:
+        writer = LeadWriter(job_id, profile=scraper.profile)
+        try:
+            for page_num, page_leads in scraper.iter_apollo_search(
+                search_url=search_url,
+                max_results=limited_results,
+                progress_callback=update_progress
+            ):
+                usage.reserve_leads(len(page_leads))
+                leads_reserved += len(page_leads)
+                writer.add(page_leads)
+        finally:
+            writer.close()
+            # Hand back the budget reserved for leads that were not stored
+            usage.record(leads_scraped=writer.saved - leads_reserved)
+        
+        saved_leads = writer.saved
+        if not saved_leads and not writer.duplicates:
             raise Exception("No leads were scraped")
         
-        # Save leads to database
-        saved_leads = 0
-        for lead_data in leads_data:
-            try:
-                lead = Lead(
-                    job_id=job_id,
-                    first_name=lead_data.get('first_name', ''),
-                    last_name=lead_data.get('last_name', ''),
-                    full_name=lead_data.get('full_name', ''),
-                    email=lead_data.get('email', ''),
-                    phone=lead_data.get('phone', ''),
-                    linkedin_url=lead_data.get('linkedin_url', ''),
-                    job_title=lead_data.get('job_title', ''),
-                    seniority=lead_data.get('seniority', ''),
-                    department=lead_data.get('department', ''),
-                    company_name=lead_data.get('company_name', ''),
-                    company_domain=lead_data.get('company_domain', ''),
-                    company_website=lead_data.get('company_website', ''),
-                    company_industry=lead_data.get('company_industry', ''),
-                    company_size=lead_data.get('company_size', ''),
-                    company_location=lead_data.get('company_location', ''),
-                    company_linkedin=lead_data.get('company_linkedin', ''),
-                    years_experience=lead_data.get('years_experience', 0),
-                    location=lead_data.get('location', ''),
-                    raw_data=lead_data.get('raw_data', '')
-                )
-                db.session.add(lead)
-                saved_leads += 1
-            except Exception as e:
-                logging.error(f"Error saving lead: {str(e)}")
-                continue
-        
-        db.session.commit()
-        
-        # Create CSV export
-        csv_filename = create_csv_export(job_id, leads_data)
+        csv_filename = writer.csv_filename
         
         # Update job with results
         job.status = 'completed'
         job.scraped_leads = saved_leads
-        job.total_leads = len(leads_data)
+        job.total_leads = saved_leads
         job.progress = 100.0
         job.completed_at = datetime.utcnow()
         job.csv_file_path = csv_filename
+        job.duplicate_leads = writer.duplicates
+        job.requests_made = scraper.requests_made
+        job.profile = scraper.profile.to_dict()
         db.session.commit()
         
-        # Update daily usage
+        # Leads and requests were counted as they were reserved
+        usage.record(jobs_completed=1)
         daily_usage = DailyUsage.get_today_usage()
-        daily_usage.leads_scraped += saved_leads
-        daily_usage.requests_made += (saved_leads // 25) + 1
-        daily_usage.jobs_completed += 1
-        db.session.commit()
+        db.session.refresh(daily_usage)
+        
+        publish_job_status(job)
+        publish_usage_event(daily_usage.to_dict())
         
         log_scraping_metrics(job_id, 'job_completed', {
             'total_leads': saved_leads,
+            'requests_made': scraper.requests_made,
             'csv_file': csv_filename
         })
         
         return {
             'status': 'completed',
             'scraped_leads': saved_leads,
-            'total_leads': len(leads_data),
+            'total_leads': saved_leads,
             'csv_file': csv_filename,
             'message': f'Successfully scraped {saved_leads} leads'
         }
@@ -119,13 +120,21 @@ def scrape_apollo_sync(job_id, search_url, cookies, max_results, delay):
         error_message = str(e)
         logging.error(f"Job {job_id} failed: {error_message}")
         
-        # Update job with error
+        # Update job with error, keeping whatever was persisted before the failure
         try:
+            db.session.rollback()
             job = ScrapingJob.query.get(job_id)
             if job:
                 job.status = 'failed'
                 job.error_message = error_message
+                if scraper:
+                    job.requests_made = scraper.requests_made
+                    job.profile = scraper.profile.to_dict()
+                if writer and writer.saved:
+                    job.scraped_leads = writer.saved
+                    job.csv_file_path = writer.csv_filename
                 db.session.commit()
+                publish_job_status(job)
         except:
             pass
         
@@ -7,8 +7,9 @@
 const ApolloScraperApp = {
     currentJobId: null,
     progressInterval: null,
+    eventSource: null,
     config: {
-        progressUpdateInterval: 2000, // 2 seconds
+        progressUpdateInterval: 2000, // 2 seconds, only used when the event stream is unavailable
         alertAutoHideDelay: 5000 // 5 seconds
     }
 };
@@ -67,12 +68,7 @@ function setupEventListeners() {
     // Progress modal close event
     const progressModal = document.getElementById('progressModal');
     if (progressModal) {
-        progressModal.addEventListener('hidden.bs.modal', function() {
-            if (ApolloScraperApp.progressInterval) {
-                clearInterval(ApolloScraperApp.progressInterval);
-                ApolloScraperApp.progressInterval = null;
-            }
-        });
+        progressModal.addEventListener('hidden.bs.modal', stopWatchingJob);
     }
 }
 
@@ -190,10 +186,7 @@ function handleJobCancellation() {
     .then(data => {
         if (data.success) {
             showAlert('Job cancelled successfully', 'info');
-            if (ApolloScraperApp.progressInterval) {
-                clearInterval(ApolloScraperApp.progressInterval);
-                ApolloScraperApp.progressInterval = null;
-            }
+            stopWatchingJob();
         } else {
             showAlert(`Error cancelling job: ${data.error}`, 'danger');
         }
@@ -234,37 +227,90 @@ function showProgressModal(jobData) {
  * Start monitoring progress for a job
  */
 function startProgressMonitoring(jobId) {
-    if (ApolloScraperApp.progressInterval) {
-        clearInterval(ApolloScraperApp.progressInterval);
+    watchJob(jobId, handleJobUpdate);
+}
+
+/**
+ * Push job updates to onUpdate as they happen.
+ * Uses the server-sent event stream, falling back to polling /job_status
+ * when EventSource is unsupported or the stream cannot be opened.
+ */
+function watchJob(jobId, onUpdate) {
+    stopWatchingJob();
+    
+    if (!window.EventSource) {
+        pollJob(jobId, onUpdate);
+        return;
     }
     
-    ApolloScraperApp.progressInterval = setInterval(() => {
-        updateJobProgress(jobId);
-    }, ApolloScraperApp.config.progressUpdateInterval);
+    const source = new EventSource(`/job_events/${jobId}`);
+    let received = false;
+    ApolloScraperApp.eventSource = source;
     
-    // Initial update
-    updateJobProgress(jobId);
+    const handleEvent = (event) => {
+        received = true;
+        onUpdate(JSON.parse(event.data));
+    };
+    source.addEventListener('status', handleEvent);
+    source.addEventListener('progress', handleEvent);
+    source.addEventListener('end', stopWatchingJob);
+    
+    source.onerror = () => {
+        // The browser reconnects dropped streams by itself; fall back to
+        // polling only if the stream never worked or was given up on
+        if (!received || source.readyState === EventSource.CLOSED) {
+            console.warn('Job event stream unavailable, polling for progress instead');
+            pollJob(jobId, onUpdate);
+        }
+    };
 }
 
 /**
- * Update job progress display
+ * Poll job status at a fixed interval
  */
-function updateJobProgress(jobId) {
-    fetch(`/job_status/${jobId}`)
-    .then(response => response.json())
-    .then(data => {
-        updateProgressDisplay(data);
-        
-        // Check if job is completed or failed
-        if (data.status === 'completed') {
-            handleJobCompletion(data);
-        } else if (data.status === 'failed') {
-            handleJobFailure(data);
-        }
-    })
-    .catch(error => {
-        console.error('Error updating job progress:', error);
-    });
+function pollJob(jobId, onUpdate) {
+    stopWatchingJob();
+    
+    const poll = () => {
+        fetch(`/job_status/${jobId}`)
+        .then(response => response.json())
+        .then(onUpdate)
+        .catch(error => {
+            console.error('Error updating job progress:', error);
+        });
+    };
+    
+    ApolloScraperApp.progressInterval = setInterval(poll, ApolloScraperApp.config.progressUpdateInterval);
+    poll();
+}
+
+/**
+ * Stop the event stream or polling for the current job
+ */
+function stopWatchingJob() {
+    if (ApolloScraperApp.eventSource) {
+        ApolloScraperApp.eventSource.close();
+        ApolloScraperApp.eventSource = null;
+    }
+    if (ApolloScraperApp.progressInterval) {
+        clearInterval(ApolloScraperApp.progressInterval);
+        ApolloScraperApp.progressInterval = null;
+    }
+}
+
+/**
+ * Apply a job update from the stream or a poll
+ */
+function handleJobUpdate(data) {
+    updateProgressDisplay(data);
+    
+    if (data.status === 'completed') {
+        handleJobCompletion(data);
+    } else if (data.status === 'failed') {
+        handleJobFailure(data);
+    } else if (data.status === 'cancelled') {
+        stopWatchingJob();
+    }
 }
 
 /**
@@ -282,12 +328,17 @@ function updateProgressDisplay(jobData) {
     const scrapedCount = document.getElementById('scraped-count');
     const totalCount = document.getElementById('total-count');
     const jobStatus = document.getElementById('job-status');
+    const jobPace = document.getElementById('job-pace');
     
     if (progressPercentage) progressPercentage.textContent = `${progress.toFixed(1)}%`;
     if (progressBar) progressBar.style.width = `${progress}%`;
     if (scrapedCount) scrapedCount.textContent = scrapedLeads.toLocaleString();
     if (totalCount) totalCount.textContent = totalLeads.toLocaleString();
     if (jobStatus) jobStatus.textContent = status.charAt(0).toUpperCase() + status.slice(1);
+    if (jobPace && jobData.pacing) {
+        const sessions = jobData.pacing.sessions > 1 ? ` across ${jobData.pacing.sessions} sessions` : '';
+        jobPace.textContent = `${jobData.pacing.pages_per_minute} pages/min${sessions} (${jobData.pacing.delay}s between pages)`;
+    }
 }
 
 /**
@@ -295,10 +346,7 @@ function updateProgressDisplay(jobData) {
  */
 function handleJobCompletion(jobData) {
     // Stop progress monitoring
-    if (ApolloScraperApp.progressInterval) {
-        clearInterval(ApolloScraperApp.progressInterval);
-        ApolloScraperApp.progressInterval = null;
-    }
+    stopWatchingJob();
     
     const scrapedLeads = jobData.scraped_leads || 0;
     showAlert(`🎉 Scraping completed successfully! ${scrapedLeads.toLocaleString()} leads extracted.`, 'success');
@@ -315,10 +363,7 @@ function handleJobCompletion(jobData) {
  */
 function handleJobFailure(jobData) {
     // Stop progress monitoring
-    if (ApolloScraperApp.progressInterval) {
-        clearInterval(ApolloScraperApp.progressInterval);
-        ApolloScraperApp.progressInterval = null;
-    }
+    stopWatchingJob();
     
     const errorMessage = jobData.error_message || 'Unknown error occurred';
     showAlert(`❌ Scraping failed: ${errorMessage}`, 'danger');
@@ -383,35 +428,69 @@ function updateEstimatedTime() {
 function updateDailyUsageDisplay() {
     fetch('/daily_stats')
     .then(response => response.json())
-    .then(data => {
-        // Update navbar badge
-        const dailyLeadsCount = document.getElementById('daily-leads-count');
-        if (dailyLeadsCount) {
-            dailyLeadsCount.textContent = data.leads_scraped.toLocaleString();
-        }
-        
-        // Update any progress bars
-        const progressBars = document.querySelectorAll('.daily-usage-progress');
-        progressBars.forEach(bar => {
-            const type = bar.dataset.type;
-            if (type === 'leads') {
-                const percentage = (data.leads_scraped / data.limits.max_daily_leads) * 100;
-                bar.style.width = `${Math.min(percentage, 100)}%`;
-            } else if (type === 'requests') {
-                const percentage = (data.requests_made / data.limits.max_daily_requests) * 100;
-                bar.style.width = `${Math.min(percentage, 100)}%`;
-            }
-        });
-    })
+    .then(applyDailyUsage)
     .catch(error => {
         console.error('Error updating daily usage:', error);
     });
 }
 
 /**
- * Start auto-refresh for dashboard
+ * Render daily usage figures into the navbar badge and progress bars
+ */
+function applyDailyUsage(data) {
+    // Update navbar badge
+    const dailyLeadsCount = document.getElementById('daily-leads-count');
+    if (dailyLeadsCount) {
+        dailyLeadsCount.textContent = data.leads_scraped.toLocaleString();
+    }
+    
+    // Update any progress bars
+    const progressBars = document.querySelectorAll('.daily-usage-progress');
+    progressBars.forEach(bar => {
+        const type = bar.dataset.type;
+        if (type === 'leads') {
+            const percentage = (data.leads_scraped / data.limits.max_daily_leads) * 100;
+            bar.style.width = `${Math.min(percentage, 100)}%`;
+        } else if (type === 'requests') {
+            const percentage = (data.requests_made / data.limits.max_daily_requests) * 100;
+            bar.style.width = `${Math.min(percentage, 100)}%`;
+        }
+    });
+}
+
+/**
+ * Keep the dashboard current: reload when a job changes status and update
+ * usage figures in place. Falls back to a periodic reload without the stream.
  */
 function startDashboardAutoRefresh() {
+    if (!window.EventSource) {
+        startDashboardPolling();
+        return;
+    }
+    
+    const source = new EventSource('/events');
+    
+    source.addEventListener('status', (event) => {
+        const job = JSON.parse(event.data);
+        // Reload for jobs on this page that changed, and for newly created jobs
+        const row = document.querySelector(`.job-row[data-job-id="${job.id}"]`);
+        if (row ? row.dataset.status !== job.status : job.status === 'pending') {
+            location.reload();
+        }
+    });
+    source.addEventListener('usage', (event) => applyDailyUsage(JSON.parse(event.data)));
+    
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+            startDashboardPolling();
+        }
+    };
+}
+
+/**
+ * Reload the dashboard every 30 seconds while jobs are running
+ */
+function startDashboardPolling() {
     setInterval(() => {
         const runningJobs = document.querySelectorAll('.job-row[data-status="running"]');
         if (runningJobs.length > 0) {
@@ -1,21 +1,53 @@
 import os
-import csv
-import json
 import logging
+import metrics
 from datetime import datetime
 from celery import current_task
+from sqlalchemy import update
+from celery.signals import worker_init, worker_process_shutdown
 from app import celery, db
-from models import ScrapingJob, Lead, DailyUsage
+from models import ScrapingJob, DailyUsage, WorkUnit, ApolloAccount
 from scraper import ApolloScraper
-from utils import sanitize_filename, log_scraping_metrics
+from lead_store import LeadWriter
+from utils import log_scraping_metrics, build_page_url
 from config import Config
+from browser_pool import get_browser_pool
+from progress_events import publish_job_event, publish_job_status, publish_usage_event
+from job_stats import invalidate_job_stats
+from usage import UsageCounters
+from profiling import PhaseProfile
+import scheduler
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs):
+    """Expose metrics from the worker's main process (aggregating its children in multiprocess mode)"""
+    metrics.start_worker_server()
+
+@worker_process_shutdown.connect
+def close_browser_pool(pid=None, **kwargs):
+    """Quit pooled Chrome sessions when a worker process exits"""
+    get_browser_pool().close_all()
+    metrics.mark_process_dead(pid or os.getpid())
 
 @celery.task(bind=True)
-def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay):
-    """Background task to scrape Apollo leads"""
+def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay, concurrency=1, resume=False):
+    """Background task to scrape Apollo leads.
+    
+    With resume=True the job continues from its last checkpoint instead of page 1.
+    """
+    # Leads persisted by earlier runs of this job (non-zero only when resuming)
+    resumed_leads = 0
+    # Page loads made by earlier runs of this job
+    resumed_requests = 0
+    scraper = None
     
     def update_progress(progress, scraped_leads, total_leads):
         """Update job progress in database"""
+        if resumed_leads:
+            scraped_leads += resumed_leads
+            total_leads += resumed_leads
+            progress = scraped_leads / total_leads * 100
+        pacing = scraper.pacing.snapshot() if scraper else None
         try:
             job = ScrapingJob.query.get(job_id)
             if job:
@@ -23,6 +55,9 @@ def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay):
                 job.scraped_leads = scraped_leads
                 job.total_leads = total_leads
                 job.status = 'running'
+                if scraper:
+                    job.requests_made = resumed_requests + scraper.requests_made
+                    job.profile = scraper.profile.to_dict()
                 db.session.commit()
                 
                 # Update task state
@@ -32,13 +67,28 @@ def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay):
                         'progress': progress,
                         'scraped_leads': scraped_leads,
                         'total_leads': total_leads,
+                        'requests_made': job.requests_made or 0,
+                        'pacing': pacing,
                         'status': 'running'
                     }
                 )
+                
+                publish_job_event(job_id, 'progress', {
+                    'status': 'running',
+                    'progress': progress,
+                    'scraped_leads': scraped_leads,
+                    'total_leads': total_leads,
+                    'requests_made': job.requests_made or 0,
+                    'pacing': pacing
+                })
         except Exception as e:
             logging.error(f"Error updating progress: {str(e)}")
     
+    writer = None
+    leads_reserved = 0
     try:
+        usage = UsageCounters()
+        
         # Get job from database
         job = ScrapingJob.query.get(job_id)
         if not job:
@@ -46,102 +96,122 @@ def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay):
         
         # Update job status
         job.status = 'running'
+        resumed_requests = job.requests_made or 0
         db.session.commit()
+        publish_job_status(job)
+        
+        start_url = search_url
+        csv_filename = None
+        if resume:
+            if not job.checkpoint_url:
+                raise Exception("Job has no checkpoint to resume from")
+            resumed_leads = job.checkpoint_leads or 0
+            start_url = job.checkpoint_url
+            csv_filename = job.csv_file_path
+            job.error_message = None
+            db.session.commit()
+        
+        def save_checkpoint(page_num, saved):
+            job.record_checkpoint(page_num, resumed_leads + saved, build_page_url(search_url, page_num + 1))
+            db.session.commit()
         
-        log_scraping_metrics(job_id, 'job_started', {
-            'search_url': search_url,
+        log_scraping_metrics(job_id, 'job_resumed' if resume else 'job_started', {
+            'search_url': start_url,
             'max_results': max_results,
-            'delay': delay
+            'delay': delay,
+            'concurrency': concurrency,
+            'resumed_leads': resumed_leads
         })
         
-        # Check daily limits
+        # Fail fast if today's budget is already spent; pages and leads are
+        # reserved atomically as the scrape goes, so concurrent jobs can't overshoot
         daily_usage = DailyUsage.get_today_usage()
-        if not daily_usage.can_scrape_more_leads(max_results):
+        if not daily_usage.can_scrape_more_leads(1):
             raise Exception(f"Daily lead limit exceeded. Current: {daily_usage.leads_scraped}, Limit: {Config.MAX_DAILY_LEADS}")
         
-        if not daily_usage.can_make_more_requests(max_results // 25):  # Estimate requests needed
+        if not daily_usage.can_make_more_requests(1):
             raise Exception(f"Daily request limit exceeded. Current: {daily_usage.requests_made}, Limit: {Config.MAX_DAILY_REQUESTS}")
         
-        # Initialize scraper
+        # Initialize scraper (a resumed job keeps adding to its earlier profile)
         scraper = ApolloScraper(cookies=cookies, delay=delay)
+        scraper.usage = usage
+        scraper.profile = PhaseProfile(job.profile if resume else None)
+        scraper.extraction_mode = job.extraction_mode or 'dom'
+        scraper.browser_profile = job.browser_profile or 'full'
         
-        # Test authentication if cookies provided
+        # Test authentication if cookies provided (the verified session stays
+        # in this worker's browser pool and is reused by the scrape below)
         if cookies:
             auth_success, auth_message = scraper.test_authentication()
             if not auth_success:
                 logging.warning(f"Authentication test failed: {auth_message}")
         
-        # Start scraping
-        leads_data = scraper.scrape_apollo_search(
-            search_url=search_url,
-            max_results=max_results,
-            progress_callback=update_progress
-        )
+        # Stream pages straight into batched DB writes and the CSV export,
+        # checkpointing the job after every flush
+        writer = LeadWriter(job_id, csv_filename=csv_filename, on_flush=save_checkpoint, profile=scraper.profile)
+        remaining_results = max_results - resumed_leads
+        last_page_scraped = None
+        try:
+            if remaining_results > 0:
+                for page_num, page_leads in scraper.iter_apollo_search(
+                    search_url=start_url,
+                    max_results=remaining_results,
+                    progress_callback=update_progress,
+                    concurrency=concurrency
+                ):
+                    usage.reserve_leads(len(page_leads))
+                    leads_reserved += len(page_leads)
+                    writer.add(page_leads, page_num)
+                    last_page_scraped = page_num
+        finally:
+            writer.close()
+            # Hand back the budget reserved for leads that were not stored (duplicates, failed rows)
+            usage.record(leads_scraped=writer.saved - leads_reserved)
         
-        if not leads_data:
-            raise Exception("No leads were scraped")
+        # Stopped short of max_results. Only an empty results page or the
+        # search's total means there is nothing left; anything else (a page
+        # that timed out, a failed parallel page, an expired session) fails
+        # the job so it can be resumed from its checkpoint
+        if leads_reserved < remaining_results and not scraper.results_exhausted:
+            stopped_at = f"page {last_page_scraped}" if last_page_scraped else "the first page"
+            raise Exception(f"Stopped at {stopped_at} with {resumed_leads + writer.saved} of {max_results} leads before the results ran out")
         
-        # Save leads to database
-        saved_leads = 0
-        for lead_data in leads_data:
-            try:
-                lead = Lead(
-                    job_id=job_id,
-                    first_name=lead_data.get('first_name', ''),
-                    last_name=lead_data.get('last_name', ''),
-                    full_name=lead_data.get('full_name', ''),
-                    email=lead_data.get('email', ''),
-                    phone=lead_data.get('phone', ''),
-                    linkedin_url=lead_data.get('linkedin_url', ''),
-                    job_title=lead_data.get('job_title', ''),
-                    seniority=lead_data.get('seniority', ''),
-                    department=lead_data.get('department', ''),
-                    company_name=lead_data.get('company_name', ''),
-                    company_domain=lead_data.get('company_domain', ''),
-                    company_website=lead_data.get('company_website', ''),
-                    company_industry=lead_data.get('company_industry', ''),
-                    company_size=lead_data.get('company_size', ''),
-                    company_location=lead_data.get('company_location', ''),
-                    company_linkedin=lead_data.get('company_linkedin', ''),
-                    years_experience=lead_data.get('years_experience', 0),
-                    location=lead_data.get('location', ''),
-                    raw_data=lead_data.get('raw_data', '')
-                )
-                db.session.add(lead)
-                saved_leads += 1
-            except Exception as e:
-                logging.error(f"Error saving lead: {str(e)}")
-                continue
-        
-        db.session.commit()
+        saved_leads = resumed_leads + writer.saved
+        if not saved_leads and not writer.duplicates:
+            raise Exception("No leads were scraped")
         
-        # Create CSV export
-        csv_filename = create_csv_export(job_id, leads_data)
+        csv_filename = writer.csv_filename or csv_filename
         
         # Update job with results
         job.status = 'completed'
         job.scraped_leads = saved_leads
-        job.total_leads = len(leads_data)
+        job.total_leads = saved_leads
         job.progress = 100.0
         job.completed_at = datetime.utcnow()
         job.csv_file_path = csv_filename
+        job.duplicate_leads = (job.duplicate_leads or 0) + writer.duplicates
+        job.requests_made = resumed_requests + scraper.requests_made
+        job.profile = scraper.profile.to_dict()
         db.session.commit()
         
-        # Update daily usage
-        daily_usage.leads_scraped += saved_leads
-        daily_usage.requests_made += (saved_leads // 25) + 1  # Estimate requests made
-        daily_usage.jobs_completed += 1
-        db.session.commit()
+        # Leads and requests were counted as they were reserved
+        usage.record(jobs_completed=1)
+        db.session.refresh(daily_usage)
+        
+        publish_job_status(job)
+        publish_usage_event(daily_usage.to_dict())
         
         log_scraping_metrics(job_id, 'job_completed', {
             'total_leads': saved_leads,
+            'duplicate_leads': writer.duplicates,
+            'requests_made': scraper.requests_made,
             'csv_file': csv_filename
         })
         
         return {
             'status': 'completed',
             'scraped_leads': saved_leads,
-            'total_leads': len(leads_data),
+            'total_leads': saved_leads,
             'csv_file': csv_filename,
             'message': f'Successfully scraped {saved_leads} leads'
         }
@@ -150,17 +220,31 @@ def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay):
         error_message = str(e)
         logging.error(f"Job {job_id} failed: {error_message}")
         
-        # Update job with error
+        # Update job with error, keeping whatever was persisted before the failure
         try:
+            db.session.rollback()
             job = ScrapingJob.query.get(job_id)
             if job:
                 job.status = 'failed'
                 job.error_message = error_message
+                if writer:
+                    job.duplicate_leads = (job.duplicate_leads or 0) + writer.duplicates
+                if scraper:
+                    job.requests_made = resumed_requests + scraper.requests_made
+                    job.profile = scraper.profile.to_dict()
+                if writer and writer.saved:
+                    job.scraped_leads = resumed_leads + writer.saved
+                    job.csv_file_path = writer.csv_filename
                 db.session.commit()
+                publish_job_status(job)
         except:
             pass
         
-        log_scraping_metrics(job_id, 'job_failed', {'error': error_message})
+        log_scraping_metrics(job_id, 'job_failed', {
+            'error': error_message,
+            'leads_saved': writer.saved if writer else 0,
+            'requests_made': scraper.requests_made if scraper else 0
+        })
         
         # Update task state
         current_task.update_state(
@@ -173,62 +257,161 @@ def scrape_apollo_leads(self, job_id, search_url, cookies, max_results, delay):
         
         raise Exception(error_message)
 
-def create_csv_export(job_id, leads_data):
-    """Create CSV file with lead data"""
+@celery.task
+def run_work_unit(unit_id):
+    """Scrape one work unit's page range of a scheduled job on the account it was leased"""
+    unit = db.session.get(WorkUnit, unit_id)
+    if unit is None or unit.status != 'running':
+        logging.warning(f"Work unit {unit_id} is no longer running, skipping")
+        return
+    
+    job = unit.job
+    job_id = job.id
+    start_page = unit.next_page
+    pages_loaded = 0
+    flushed = 0
+    leads_reserved = 0
+    scraper = None
+    writer = None
+    
+    def save_unit_progress(page_num, saved):
+        """Move the unit's checkpoint and add newly saved leads to the job's progress"""
+        nonlocal flushed
+        new_leads, flushed = saved - flushed, saved
+        db.session.execute(
+            update(WorkUnit).where(WorkUnit.id == unit_id)
+            .values(next_page=page_num + 1, leads_saved=WorkUnit.leads_saved + new_leads)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(ScrapingJob).where(ScrapingJob.id == job_id)
+            .values(scraped_leads=ScrapingJob.scraped_leads + new_leads)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        
+        db.session.refresh(job)
+        job.progress = min(job.scraped_leads / job.max_results * 100, 100.0)
+        db.session.commit()
+        publish_job_event(job_id, 'progress', {
+            'status': job.status,
+            'progress': job.progress,
+            'scraped_leads': job.scraped_leads,
+            'total_leads': job.max_results,
+            'pacing': scraper.pacing.snapshot() if scraper else None
+        })
+    
     try:
-        # Ensure export directory exists
-        os.makedirs(Config.EXPORT_FOLDER, exist_ok=True)
-        
-        # Generate filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"apollo_leads_job_{job_id}_{timestamp}.csv"
-        filename = sanitize_filename(filename)
-        csv_path = os.path.join(Config.EXPORT_FOLDER, filename)
-        
-        # CSV headers
-        headers = [
-            'First Name', 'Last Name', 'Full Name', 'Email', 'Phone',
-            'LinkedIn URL', 'Job Title', 'Seniority', 'Department',
-            'Company Name', 'Company Domain', 'Company Website',
-            'Company Industry', 'Company Size', 'Company Location',
-            'Company LinkedIn', 'Years Experience', 'Location', 'Scraped At'
-        ]
-        
-        # Write CSV file
-        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(headers)
-            
-            for lead in leads_data:
-                row = [
-                    lead.get('first_name', ''),
-                    lead.get('last_name', ''),
-                    lead.get('full_name', ''),
-                    lead.get('email', ''),
-                    lead.get('phone', ''),
-                    lead.get('linkedin_url', ''),
-                    lead.get('job_title', ''),
-                    lead.get('seniority', ''),
-                    lead.get('department', ''),
-                    lead.get('company_name', ''),
-                    lead.get('company_domain', ''),
-                    lead.get('company_website', ''),
-                    lead.get('company_industry', ''),
-                    lead.get('company_size', ''),
-                    lead.get('company_location', ''),
-                    lead.get('company_linkedin', ''),
-                    lead.get('years_experience', 0),
-                    lead.get('location', ''),
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                ]
-                writer.writerow(row)
-        
-        logging.info(f"CSV export created: {csv_path}")
-        return filename
+        # The first unit to start moves the job from pending to running
+        started = db.session.execute(
+            update(ScrapingJob).where(ScrapingJob.id == job_id, ScrapingJob.status == 'pending')
+            .values(status='running')
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if started.rowcount:
+            db.session.refresh(job)
+            publish_job_status(job)
+        
+        account = db.session.get(ApolloAccount, unit.account_id)
+        if account is None:
+            raise Exception("Account for work unit no longer exists")
+        
+        usage = UsageCounters()
+        scraper = ApolloScraper(cookies=account.cookies, delay=job.delay_between_requests)
+        scraper.usage = usage
+        scraper.extraction_mode = job.extraction_mode or 'dom'
+        scraper.browser_profile = job.browser_profile or 'full'
+        
+        max_pages = unit.last_page - start_page + 1
+        max_results = unit.max_results - (start_page - unit.first_page) * Config.RESULTS_PER_PAGE
+        last_page_scraped = start_page - 1
+        
+        writer = LeadWriter(job_id, on_flush=save_unit_progress, write_csv=False, profile=scraper.profile)
+        try:
+            for page_num, page_leads in scraper.iter_apollo_search(
+                search_url=build_page_url(job.search_url, start_page),
+                max_results=max_results,
+                max_pages=max_pages
+            ):
+                usage.reserve_leads(len(page_leads))
+                leads_reserved += len(page_leads)
+                writer.add(page_leads, page_num)
+                last_page_scraped = page_num
+        finally:
+            pages_loaded = last_page_scraped - start_page + 1
+            writer.close()
+            usage.record(leads_scraped=writer.saved - leads_reserved)
+        
+        # Stopped before the end of the unit. Only an empty results page or the
+        # search's total proves later units have nothing to load; anything else
+        # (a failed click, a page that never rendered) fails the unit for a retry
+        # from its checkpoint
+        if last_page_scraped < unit.last_page and writer.saved + writer.duplicates < max_results:
+            if not scraper.results_exhausted:
+                raise Exception(f"Stopped at page {last_page_scraped} before the end of the unit (page {unit.last_page})")
+            scheduler.skip_units_after(job_id, last_page_scraped)
+        
+        db.session.execute(
+            update(ScrapingJob).where(ScrapingJob.id == job_id)
+            .values(
+                duplicate_leads=ScrapingJob.duplicate_leads + writer.duplicates,
+                requests_made=ScrapingJob.requests_made + scraper.requests_made
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(WorkUnit).where(WorkUnit.id == unit_id)
+            .values(profile=scraper.profile.to_dict())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        
+        log_scraping_metrics(job_id, 'work_unit_completed', {
+            'unit_id': unit_id,
+            'account': account.name,
+            'pages': f"{start_page}-{last_page_scraped}",
+            'leads_saved': writer.saved,
+            'requests_made': scraper.requests_made
+        })
+        scheduler.finish_unit(unit_id, 'completed', pages_loaded)
         
     except Exception as e:
-        logging.error(f"Error creating CSV export: {str(e)}")
-        return None
+        error_message = str(e)
+        logging.error(f"Work unit {unit_id} of job {job_id} failed: {error_message}")
+        try:
+            db.session.rollback()
+            db.session.execute(
+                update(ScrapingJob).where(ScrapingJob.id == job_id)
+                .values(
+                    duplicate_leads=ScrapingJob.duplicate_leads + (writer.duplicates if writer else 0),
+                    requests_made=ScrapingJob.requests_made + (scraper.requests_made if scraper else 0)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if scraper:
+                db.session.execute(
+                    update(WorkUnit).where(WorkUnit.id == unit_id)
+                    .values(profile=scraper.profile.to_dict())
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+            scheduler.finish_unit(unit_id, 'failed', pages_loaded, error_message)
+        except Exception as finish_error:
+            logging.error(f"Could not record work unit failure: {str(finish_error)}")
+        
+        log_scraping_metrics(job_id, 'work_unit_failed', {'unit_id': unit_id, 'error': error_message})
+        raise Exception(error_message)
+
+@celery.task
+def dispatch_work_units():
+    """Start queued work units on free accounts (run periodically so budget resets are picked up)"""
+    try:
+        started = scheduler.dispatch()
+        if started:
+            logging.info(f"Dispatched {started} work units")
+    except Exception as e:
+        logging.error(f"Error dispatching work units: {str(e)}")
 
 @celery.task
 def cleanup_old_jobs():
@@ -251,13 +434,11 @@ def cleanup_old_jobs():
                     os.remove(csv_path)
                     logging.info(f"Deleted old CSV file: {csv_path}")
             
-            # Delete leads associated with job
-            Lead.query.filter_by(job_id=job.id).delete()
-            
-            # Delete job
+            # Delete job (leads, raw data and fingerprints cascade)
             db.session.delete(job)
         
         db.session.commit()
+        invalidate_job_stats()
         logging.info(f"Cleaned up {len(old_jobs)} old jobs")
         
     except Exception as e:
@@ -0,0 +1,75 @@
+"""
+Mapping Apollo's people search API response to lead fields
+"""
+import json
+from datetime import date
+from lead_parser import api_total_results, parse_api_people
+
+PERSON = {
+    'first_name': 'Ada',
+    'last_name': 'Lovelace',
+    'name': 'Ada Lovelace',
+    'email': 'ada@analytical.io',
+    'phone_numbers': [{'raw_number': '+44 20 7946 0000', 'sanitized_number': '+442079460000'}],
+    'linkedin_url': 'http://www.linkedin.com/in/ada',
+    'title': 'Chief Engineer',
+    'seniority': 'c_suite',
+    'departments': ['engineering', 'master_research'],
+    'city': 'London',
+    'country': 'United Kingdom',
+    'employment_history': [{'start_date': '2015-01-01'}, {'start_date': None}, {'start_date': '2019-06-01'}],
+    'organization': {
+        'name': 'Analytical Engines',
+        'primary_domain': 'analytical.io',
+        'website_url': 'http://www.analytical.io',
+        'industry': 'computer hardware',
+        'estimated_num_employees': 120,
+        'city': 'London',
+        'country': 'United Kingdom',
+        'linkedin_url': 'http://www.linkedin.com/company/analytical'
+    }
+}
+
+def test_person_maps_to_lead_fields():
+    lead, = parse_api_people({'people': [PERSON]})
+
+    assert lead['full_name'] == 'Ada Lovelace'
+    assert lead['email'] == 'ada@analytical.io'
+    assert lead['phone'] == '+442079460000'
+    assert lead['department'] == 'engineering, master_research'
+    assert lead['location'] == 'London, United Kingdom'
+    assert lead['company_name'] == 'Analytical Engines'
+    assert lead['company_domain'] == 'analytical.io'
+    assert lead['company_size'] == '120'
+    assert lead['company_location'] == 'London, United Kingdom'
+    assert lead['years_experience'] == date.today().year - 2015
+    assert json.loads(lead['raw_data']) == PERSON
+
+def test_saved_contacts_come_first_and_use_their_account():
+    contact = {'first_name': 'Grace', 'last_name': 'Hopper', 'account': {'name': 'Navy'}}
+
+    leads = parse_api_people({'people': [PERSON], 'contacts': [contact]})
+
+    assert [lead['full_name'] for lead in leads] == ['Grace Hopper', 'Ada Lovelace']
+    assert leads[0]['company_name'] == 'Navy'
+
+def test_locked_emails_and_nameless_people_are_dropped():
+    locked = dict(PERSON, email='email_not_unlocked@domain.com')
+    nameless = {'title': 'Engineer', 'organization': {'name': 'Acme'}}
+
+    leads = parse_api_people({'people': [locked, nameless]})
+
+    assert len(leads) == 1
+    assert leads[0]['email'] == ''
+
+def test_missing_sections_parse_to_defaults():
+    lead, = parse_api_people({'people': [{'name': 'Alan Turing', 'organization': None, 'phone_numbers': None}]})
+
+    assert lead['company_name'] == ''
+    assert lead['phone'] == ''
+    assert lead['years_experience'] == 0
+    assert parse_api_people({}) == []
+
+def test_total_results_come_from_pagination():
+    assert api_total_results({'pagination': {'page': 1, 'total_entries': 4321}}) == 4321
+    assert api_total_results({'people': []}) is None
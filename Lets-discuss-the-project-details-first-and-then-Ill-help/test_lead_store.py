@@ -0,0 +1,101 @@
+"""
+Batched lead inserts, cross-job dedup and the LeadWriter that streams scraped pages into them
+"""
+import pytest
+from app import db
+from models import ScrapingJob, Lead, LeadRawData
+from lead_store import LeadWriter, bulk_insert_leads, lead_fingerprints, lead_values
+
+def create_job(task_id):
+    job = ScrapingJob(task_id=task_id, search_url='https://app.apollo.io/#/people?page=1')
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+@pytest.fixture
+def job_id(database):
+    return create_job('lead-store')
+
+def person(n, **fields):
+    return dict({'full_name': f'Person {n}', 'email': f'person{n}@example.com', 'company_name': f'Company {n}'}, **fields)
+
+def test_bulk_insert_returns_ids_in_row_order(job_id):
+    rows = [lead_values(job_id, person(n, raw_data=f'<div>{n}</div>')) for n in range(5)]
+
+    ids = bulk_insert_leads(rows, batch_size=2)
+
+    assert len(ids) == 5
+    assert [db.session.get(Lead, lead_id).full_name for lead_id in ids] == [f'Person {n}' for n in range(5)]
+    assert [db.session.get(LeadRawData, lead_id).text for lead_id in ids] == [f'<div>{n}</div>' for n in range(5)]
+
+def test_bad_row_only_loses_itself(job_id):
+    rows = [lead_values(job_id, person(0)), lead_values(99999, person(1)), lead_values(job_id, person(2))]
+
+    ids = bulk_insert_leads(rows)
+
+    assert ids[1] is False
+    assert all(ids[0::2])
+    assert sorted(lead.full_name for lead in Lead.query.all()) == ['Person 0', 'Person 2']
+
+def test_writer_checkpoints_after_each_flush(job_id):
+    flushes = []
+    writer = LeadWriter(job_id, batch_size=3, write_csv=False, dedup_mode='off', on_flush=lambda page, saved: flushes.append((page, saved)))
+
+    writer.add([person(0), person(1)], page_num=1)
+    assert flushes == []
+    writer.add([person(2), person(3)], page_num=2)
+    assert flushes == [(2, 4)]
+    writer.add([person(4)], page_num=3)
+    writer.close()
+
+    assert flushes == [(2, 4), (3, 5)]
+    assert writer.saved == 5
+    assert Lead.query.filter_by(job_id=job_id).count() == 5
+
+def store(job_id, leads, dedup_mode):
+    writer = LeadWriter(job_id, write_csv=False, dedup_mode=dedup_mode)
+    writer.add(leads)
+    writer.close()
+    return writer
+
+def test_fingerprints_match_across_formatting():
+    first = person(0, linkedin_url='https://www.linkedin.com/in/person-0/')
+    again = {'full_name': 'PERSON 0', 'company_name': 'Company 0 LLC', 'email': 'Person0@Example.com',
+             'linkedin_url': 'linkedin.com/in/person-0'}
+
+    assert lead_fingerprints(first) == lead_fingerprints(again)
+    assert len(lead_fingerprints(first)) == 3
+    assert lead_fingerprints({'full_name': 'Nobody'}) == []
+
+def test_skip_drops_leads_known_from_earlier_jobs(job_id):
+    store(job_id, [person(0), person(1)], 'skip')
+    later_job = create_job('later')
+
+    writer = store(later_job, [person(1, email=''), person(2)], 'skip')
+
+    assert (writer.saved, writer.duplicates) == (1, 1)
+    assert [lead.full_name for lead in Lead.query.filter_by(job_id=later_job)] == ['Person 2']
+
+def test_skip_drops_duplicates_within_a_batch(job_id):
+    writer = store(job_id, [person(0), person(0, email='other@example.com')], 'skip')
+
+    assert (writer.saved, writer.duplicates) == (1, 1)
+
+def test_merge_fills_blanks_in_the_stored_lead(job_id):
+    store(job_id, [person(0, email='', phone='')], 'skip')
+    later_job = create_job('later')
+
+    writer = store(later_job, [person(0, phone='+1 555 0100', job_title='CTO')], 'merge')
+
+    lead = Lead.query.filter_by(job_id=job_id).one()
+    assert (writer.saved, writer.duplicates) == (0, 1)
+    assert (lead.email, lead.phone, lead.job_title) == ('person0@example.com', '+1 555 0100', 'CTO')
+    # The email the first scrape missed is now indexed too
+    assert store(create_job('latest'), [{'email': 'person0@example.com', 'full_name': 'P. Zero'}], 'skip').duplicates == 1
+
+def test_off_stores_everything(job_id):
+    store(job_id, [person(0)], 'skip')
+
+    writer = store(create_job('later'), [person(0), person(0)], 'off')
+
+    assert (writer.saved, writer.duplicates) == (2, 0)
@@ -0,0 +1,59 @@
+"""
+AIMD page pacing: speed-up after healthy loads, back-off after failed or slow ones
+"""
+import pytest
+from rate_limiter import AdaptiveDelay
+
+@pytest.fixture(autouse=True)
+def pacing(monkeypatch):
+    for name, value in [('MIN_DELAY', 2), ('MAX_DELAY', 50), ('PACING_WINDOW', 20), ('PACING_INCREASE', 0.5),
+                        ('PACING_BACKOFF', 0.5), ('PACING_SLOW_FACTOR', 2.0), ('PACING_MAX_ERROR_RATE', 0.2)]:
+        monkeypatch.setattr(f'rate_limiter.Config.{name}', value)
+
+def test_healthy_loads_add_to_the_rate():
+    pacing = AdaptiveDelay(base_delay=10)
+    for _ in range(4):
+        pacing.record(1.0, True)
+
+    assert pacing.rate == pytest.approx(6 + 4 * 0.5)
+
+def test_failed_load_halves_the_rate():
+    pacing = AdaptiveDelay(base_delay=10)
+    pacing.record(1.0, False)
+
+    assert pacing.rate == pytest.approx(3)
+
+def test_slow_load_halves_the_rate():
+    pacing = AdaptiveDelay(base_delay=10)
+    for _ in range(3):
+        pacing.record(1.0, True)
+    pacing.record(2.5, True)
+
+    assert pacing.rate == pytest.approx((6 + 3 * 0.5) * 0.5)
+
+def test_no_speed_up_while_errors_stay_high():
+    pacing = AdaptiveDelay(base_delay=10, window=4)
+    pacing.record(1.0, False)
+    rate = pacing.rate
+    pacing.record(1.0, True)
+    pacing.record(1.0, True)
+
+    assert pacing.rate == rate
+
+def test_rate_stays_within_the_delay_bounds():
+    pacing = AdaptiveDelay(base_delay=10)
+    for _ in range(20):
+        pacing.record(1.0, False)
+    assert pacing.rate == pytest.approx(60 / 50)
+
+    for _ in range(200):
+        pacing.record(1.0, True)
+    assert pacing.rate == pytest.approx(60 / 2)
+
+def test_shared_sessions_each_wait_longer():
+    pacing = AdaptiveDelay(base_delay=10)
+    single = pacing.next_delay()
+    pacing.set_sessions(3)
+
+    assert 8 <= single <= 12
+    assert 24 <= pacing.next_delay() <= 36
@@ -0,0 +1,21 @@
+"""
+Job routes answer 404 for unknown jobs instead of reporting a server error
+"""
+import pytest
+from app import app
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/job_status/99999'),
+    ('get', '/job_events/99999'),
+    ('get', '/leads/99999'),
+    ('get', '/download_csv/99999'),
+    ('get', '/download_parquet/99999'),
+    ('post', '/cancel_job/99999'),
+    ('post', '/resume_job/99999'),
+    ('post', '/delete_job/99999'),
+    ('post', '/accounts/99999/delete'),
+])
+def test_unknown_job_is_not_found(database, method, path):
+    response = getattr(app.test_client(), method)(path)
+
+    assert response.status_code == 404
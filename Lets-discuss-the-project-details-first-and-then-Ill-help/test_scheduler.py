@@ -0,0 +1,78 @@
+"""
+Dispatch order of the account pool's weighted fair queuing, and dispatch retries
+"""
+from datetime import datetime, timedelta
+from fair_queue import Backlog, catch_up_start, pick_next, virtual_time
+from app import db
+from models import ScrapingJob, ApolloAccount
+from config import Config
+import scheduler
+
+UNIT_PAGES = 4
+
+def simulate(backlogs, units):
+    """Serve units one at a time and return the job IDs in dispatch order"""
+    backlogs = {backlog.job_id: backlog for backlog in backlogs}
+    order = []
+    for _ in range(units):
+        job_id = pick_next(list(backlogs.values()), UNIT_PAGES)
+        backlog = backlogs[job_id]
+        backlogs[job_id] = backlog._replace(served_pages=backlog.served_pages + UNIT_PAGES)
+        order.append(job_id)
+    return order
+
+def join(backlog, waiting):
+    return backlog._replace(start=catch_up_start(backlog, virtual_time(waiting)))
+
+def test_new_job_interleaves_with_a_long_running_one():
+    created = datetime(2024, 1, 1)
+    a = Backlog('A', 0.0, 40 * UNIT_PAGES, 3, created)
+    b = join(Backlog('B', 0.0, 0, 3, created + timedelta(hours=1)), [a])
+
+    order = simulate([a, b], 8)
+
+    assert order == ['A', 'B'] * 4
+
+def test_equal_jobs_stay_within_one_unit_whenever_the_second_joins():
+    created = datetime(2024, 1, 1)
+    for served_units in range(0, 41, 5):
+        a = Backlog('A', 0.0, served_units * UNIT_PAGES, 3, created)
+        b = join(Backlog('B', 0.0, 0, 3, created + timedelta(hours=1)), [a])
+
+        order = simulate([a, b], 10)
+
+        for end in range(1, len(order) + 1):
+            assert abs(order[:end].count('A') - order[:end].count('B')) <= 1, (served_units, order)
+
+def test_priority_sets_share():
+    created = datetime(2024, 1, 1)
+    high = Backlog('high', 0.0, 0, 4, created)
+    low = Backlog('low', 0.0, 0, 2, created)
+
+    order = simulate([high, low], 12)
+
+    assert order.count('high') == 8
+    assert order.count('low') == 4
+
+def test_resumed_job_does_not_reclaim_its_idle_time():
+    created = datetime(2024, 1, 1)
+    running = Backlog('running', 0.0, 100 * UNIT_PAGES, 3, created)
+    resumed = join(Backlog('resumed', 0.0, 10 * UNIT_PAGES, 3, created), [running])
+
+    assert simulate([running, resumed], 4).count('resumed') == 2
+
+def test_first_job_starts_at_zero():
+    assert virtual_time([]) == 0.0
+    assert join(Backlog('A', 0.0, 0, 3, None), []).start == 0.0
+
+def test_units_waiting_for_an_account_are_dispatched_again_later(database, monkeypatch):
+    sent = []
+    monkeypatch.setattr(scheduler.celery, 'send_task', lambda name, **kwargs: sent.append((name, kwargs)))
+    db.session.add(ApolloAccount(name='spent', cookies='a=b', daily_page_budget=UNIT_PAGES - 1))
+    job = ScrapingJob(task_id='waiting', search_url='https://app.apollo.io/#/people?page=1', max_results=100, scheduled=True)
+    db.session.add(job)
+    db.session.commit()
+    scheduler.plan_work_units(job)
+
+    assert scheduler.dispatch() == 0
+    assert sent == [('tasks.dispatch_work_units', {'countdown': Config.DISPATCH_RETRY_SECONDS})]
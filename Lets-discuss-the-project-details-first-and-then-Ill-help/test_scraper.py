@@ -0,0 +1,105 @@
+"""
+Page hand-out, retries and ordered results of parallel page fetching, and pacing of the auth check
+"""
+import threading
+import pytest
+from browser_pool import PooledDriver
+from scraper import ApolloScraper, PageFanOut
+
+LEADS = [{'full_name': 'Ada Lovelace'}]
+
+def test_pages_are_returned_in_order():
+    fan_out = PageFanOut(range(2, 5), workers=2)
+    pages = [fan_out.next_page() for _ in range(3)]
+    for page_num in reversed(pages):
+        fan_out.complete(page_num, LEADS)
+    
+    assert [fan_out.wait_for(page_num) for page_num in range(2, 5)] == [LEADS] * 3
+    assert fan_out.next_page() is None
+
+def test_failed_page_is_retried_first_then_fails_the_scrape():
+    fan_out = PageFanOut(range(2, 6), workers=2)
+    assert fan_out.next_page() == 2
+    assert fan_out.next_page() == 3
+    
+    fan_out.fail(2, Exception('timed out'))
+    assert fan_out.next_page() == 2
+    fan_out.fail(2, Exception('timed out'))
+    
+    assert fan_out.next_page() is None
+    with pytest.raises(Exception, match='Page 2 failed after 2 attempts'):
+        fan_out.wait_for(2)
+
+def test_empty_page_stops_later_pages():
+    fan_out = PageFanOut(range(2, 6), workers=1)
+    assert fan_out.next_page() == 2
+    fan_out.complete(2, [])
+    
+    assert fan_out.next_page() is None
+    assert fan_out.wait_for(2) == []
+
+def test_workers_stay_within_lookahead_of_the_consumer():
+    fan_out = PageFanOut(range(2, 12), workers=1, lookahead=2)
+    assert fan_out.next_page() == 2
+    assert fan_out.next_page() == 3
+    
+    taken = []
+    worker = threading.Thread(target=lambda: taken.append(fan_out.next_page()))
+    worker.start()
+    worker.join(0.1)
+    assert worker.is_alive()
+    
+    fan_out.complete(2, LEADS)
+    fan_out.complete(3, LEADS)
+    fan_out.wait_for(2)
+    fan_out.wait_for(3)
+    worker.join(1)
+    
+    assert taken == [4]
+
+class FakeDriver:
+    def __init__(self, events):
+        self.events = events
+        self.current_url = 'about:blank'
+    
+    def get(self, url):
+        self.events.append(('get', url))
+        self.current_url = url
+    
+    def execute_script(self, script, *args):
+        return None
+    
+    def find_element(self, by, selector):
+        return object()
+
+class FakePool:
+    def __init__(self, driver):
+        self.driver = driver
+    
+    def acquire(self, cookies, **options):
+        lease = PooledDriver(self.driver, 'key')
+        lease.unrecorded_requests = 1
+        return lease
+    
+    def release(self, lease, discard=False):
+        pass
+
+class RecordingBucket:
+    def __init__(self, events):
+        self.events = events
+    
+    def acquire(self, tokens=1, stop_event=None):
+        self.events.append(('token', tokens))
+        return 0.0
+
+def test_auth_check_takes_page_tokens_like_other_loads(monkeypatch):
+    events = []
+    monkeypatch.setattr('scraper.get_browser_pool', lambda: FakePool(FakeDriver(events)))
+    monkeypatch.setattr(ApolloScraper, 'rate_limiter', lambda self: RecordingBucket(events))
+    monkeypatch.setattr(ApolloScraper, 'wait_for_page_load', lambda self: True)
+    
+    success, _ = ApolloScraper({'session': 'abc'}).test_authentication()
+    
+    assert success
+    assert events[0] == ('token', 1)  # the session's cookie-priming load
+    assert events[1:] == [('token', 1), ('get', 'https://app.apollo.io/#/home')]
@@ -0,0 +1,98 @@
+"""
+A scrape that stops before the results run out fails with a checkpoint and resumes from it
+"""
+import pytest
+from app import db
+import tasks
+from models import ScrapingJob, Lead
+from profiling import PhaseProfile
+from rate_limiter import AdaptiveDelay
+from utils import build_page_url, get_search_page
+
+SEARCH_URL = 'https://app.apollo.io/#/people?page=1&personTitles[]=founder'
+PAGE_SIZE = 25
+
+class FakeScraper:
+    """Stands in for ApolloScraper, serving `pages` results pages and stopping after `stop_after`"""
+    pages = 3
+    stop_after = None
+    searches = []
+    
+    def __init__(self, cookies=None, delay=None):
+        self.usage = None
+        self.profile = PhaseProfile()
+        self.pacing = AdaptiveDelay(delay)
+        self.requests_made = 0
+        self.results_exhausted = False
+    
+    def iter_apollo_search(self, search_url, max_results=1000, progress_callback=None, concurrency=1, max_pages=None):
+        self.searches.append((search_url, max_results))
+        page_num = get_search_page(search_url)
+        leads = 0
+        while leads < max_results:
+            if page_num > self.pages:
+                self.results_exhausted = True
+                return
+            if self.stop_after is not None and page_num > self.stop_after:
+                return  # e.g. a page that timed out
+            self.requests_made += 1
+            page_leads = [
+                {'full_name': f'Lead {page_num}-{i}', 'email': f'lead{page_num}.{i}@example.com'}
+                for i in range(PAGE_SIZE)
+            ][:max_results - leads]
+            leads += len(page_leads)
+            yield page_num, page_leads
+            page_num += 1
+
+class FakeTask:
+    def update_state(self, **kwargs):
+        pass
+
+@pytest.fixture
+def scraper(database, monkeypatch):
+    monkeypatch.setattr(tasks, 'ApolloScraper', FakeScraper)
+    monkeypatch.setattr(tasks, 'current_task', FakeTask())
+    monkeypatch.setattr(FakeScraper, 'pages', 3)
+    monkeypatch.setattr(FakeScraper, 'stop_after', None)
+    monkeypatch.setattr(FakeScraper, 'searches', [])
+    return FakeScraper
+
+def create_job(max_results):
+    job = ScrapingJob(task_id=f'test-{max_results}', search_url=SEARCH_URL, delay_between_requests=3, max_results=max_results)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+def get_job(job_id):
+    db.session.expire_all()
+    return db.session.get(ScrapingJob, job_id)
+
+def test_truncated_run_fails_and_resumes_from_checkpoint(scraper):
+    job_id = create_job(75)
+    scraper.stop_after = 1
+    
+    with pytest.raises(Exception, match='Stopped at page 1'):
+        tasks.scrape_apollo_leads.run(job_id, SEARCH_URL, None, 75, 3)
+    
+    job = get_job(job_id)
+    assert job.status == 'failed'
+    assert job.can_resume()
+    assert job.scraped_leads == PAGE_SIZE
+    assert job.checkpoint_url == build_page_url(SEARCH_URL, 2)
+    
+    scraper.stop_after = None
+    result = tasks.scrape_apollo_leads.run(job_id, SEARCH_URL, None, 75, 3, resume=True)
+    
+    assert result['status'] == 'completed'
+    assert scraper.searches[-1] == (build_page_url(SEARCH_URL, 2), 75 - PAGE_SIZE)
+    assert get_job(job_id).scraped_leads == 75
+    assert Lead.query.filter_by(job_id=job_id).count() == 75
+
+def test_run_that_runs_out_of_results_completes(scraper):
+    job_id = create_job(200)
+    
+    result = tasks.scrape_apollo_leads.run(job_id, SEARCH_URL, None, 200, 3)
+    
+    assert result['status'] == 'completed'
+    assert get_job(job_id).status == 'completed'
+    assert Lead.query.filter_by(job_id=job_id).count() == 3 * PAGE_SIZE
@@ -0,0 +1,62 @@
+"""
+Daily usage reservations against the configured limits
+"""
+import threading
+import pytest
+from datetime import date
+from models import DailyUsage
+from usage import UsageCounters, UsageLimitExceeded
+
+@pytest.fixture
+def usage(database, monkeypatch):
+    monkeypatch.setattr('usage.Config.MAX_DAILY_REQUESTS', 3)
+    monkeypatch.setattr('usage.Config.MAX_DAILY_LEADS', 10)
+    return UsageCounters()
+
+def today(database):
+    database.session.expire_all()
+    return DailyUsage.query.filter_by(date=date.today()).one()
+
+def test_requests_can_be_reserved_up_to_the_limit(usage, database):
+    for _ in range(3):
+        usage.reserve_requests()
+
+    with pytest.raises(UsageLimitExceeded):
+        usage.reserve_requests()
+    assert today(database).requests_made == 3
+
+def test_leads_that_would_overshoot_are_refused_whole(usage, database):
+    usage.reserve_leads(8)
+
+    with pytest.raises(UsageLimitExceeded):
+        usage.reserve_leads(3)
+    usage.reserve_leads(2)
+
+    assert today(database).leads_scraped == 10
+
+def test_released_reservations_make_room_again(usage, database):
+    usage.reserve_leads(10)
+    usage.record(leads_scraped=-4)
+
+    usage.reserve_leads(4)
+
+    assert today(database).leads_scraped == 10
+
+def test_concurrent_reservations_never_overshoot(usage, database):
+    granted = []
+
+    def reserve():
+        try:
+            usage.reserve_requests()
+            granted.append(1)
+        except UsageLimitExceeded:
+            pass
+
+    threads = [threading.Thread(target=reserve) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(granted) == 3
+    assert today(database).requests_made == 3
@@ -0,0 +1,40 @@
+"""
+Apollo search URL helpers and the lead normalization behind cross-job dedup
+"""
+from utils import (build_page_url, get_search_page, normalize_email, normalize_linkedin_url,
+                   normalize_person_company)
+
+def test_hash_route_page():
+    url = 'https://app.apollo.io/#/people?page=2&personTitles[]=founder'
+    
+    assert get_search_page(url) == 2
+    assert build_page_url(url, 7) == 'https://app.apollo.io/#/people?page=7&personTitles[]=founder'
+
+def test_path_query_page():
+    url = 'https://app.apollo.io/people?page=2&personTitles[]=founder'
+    
+    assert get_search_page(url) == 2
+    assert build_page_url(url, 7) == 'https://app.apollo.io/people?page=7&personTitles[]=founder'
+
+def test_page_added_when_missing():
+    assert build_page_url('https://app.apollo.io/#/people', 3) == 'https://app.apollo.io/#/people?page=3'
+    assert build_page_url('https://app.apollo.io/people?q=ceo#top', 3) == 'https://app.apollo.io/people?page=3&q=ceo#top'
+    assert get_search_page('https://app.apollo.io/people?q=ceo#top') == 1
+
+def test_linkedin_urls_normalize_to_one_form():
+    expected = 'linkedin.com/in/ada-lovelace'
+    assert normalize_linkedin_url('https://www.LinkedIn.com/in/ada-lovelace/') == expected
+    assert normalize_linkedin_url('linkedin.com//in/ada-lovelace?trk=search') == expected
+    assert normalize_linkedin_url('https://uk.linkedin.com/in/ada-lovelace') == expected
+    assert normalize_linkedin_url('https://notlinkedin.com/in/ada-lovelace') == ''
+    assert normalize_linkedin_url('https://www.linkedin.com/') == ''
+
+def test_emails_normalize_case_and_reject_junk():
+    assert normalize_email('  Ada@Example.COM ') == 'ada@example.com'
+    assert normalize_email('Email not unlocked') == ''
+    assert normalize_email(None) == ''
+
+def test_person_company_ignores_accents_punctuation_and_suffixes():
+    assert normalize_person_company('José  Núñez', 'Acme, Inc.') == 'jose nunez|acme'
+    assert normalize_person_company('Jose Nunez', 'ACME') == 'jose nunez|acme'
+    assert normalize_person_company('Jose Nunez', '') == ''
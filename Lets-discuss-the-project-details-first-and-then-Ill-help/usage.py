@@ -0,0 +1,81 @@
+"""
+Daily usage accounting with atomic, concurrency-safe counter updates
+"""
+import logging
+from datetime import date
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import DailyUsage
+from config import Config
+
+class UsageLimitExceeded(Exception):
+    """A daily budget has no room left for a reservation"""
+
+class UsageCounters:
+    """Reserves and records today's DailyUsage.
+
+    Every change is a single UPDATE ... SET x = x + n, and reservations
+    add a WHERE that the limit still holds. Concurrent workers and page
+    threads therefore never lose updates or overshoot a limit. It holds
+    the engine, not a session, so page worker threads without an app
+    context can use it.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or db.engine
+        self.table = DailyUsage.__table__
+        self._ensured_date = None
+
+    def ensure_today(self):
+        """Create today's row if no worker has yet; returns today's date"""
+        today = date.today()
+        if self._ensured_date == today:
+            return today
+
+        with self.engine.begin() as conn:
+            exists = conn.execute(select(self.table.c.id).where(self.table.c.date == today)).first()
+        if not exists:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(self.table).values(date=today, leads_scraped=0, requests_made=0, jobs_completed=0))
+            except IntegrityError:
+                pass  # Another worker created it first
+
+        self._ensured_date = today
+        return today
+
+    def _increment(self, increments, limit_column=None, limit=None):
+        """Apply increments in one statement; with a limit, only if the column stays within it"""
+        today = self.ensure_today()
+        statement = update(self.table).where(self.table.c.date == today).values({
+            column: self.table.c[column] + amount for column, amount in increments.items()
+        })
+        if limit_column is not None:
+            statement = statement.where(self.table.c[limit_column] + increments[limit_column] <= limit)
+
+        with self.engine.begin() as conn:
+            return conn.execute(statement).rowcount == 1
+
+    def reserve_requests(self, count=1):
+        """Count requests about to be made, or raise UsageLimitExceeded if the budget is spent"""
+        if not self._increment({'requests_made': count}, 'requests_made', Config.MAX_DAILY_REQUESTS):
+            raise UsageLimitExceeded(f"Daily request limit reached ({Config.MAX_DAILY_REQUESTS})")
+
+    def reserve_leads(self, count):
+        """Count leads about to be stored, or raise UsageLimitExceeded if they would exceed the limit"""
+        if count and not self._increment({'leads_scraped': count}, 'leads_scraped', Config.MAX_DAILY_LEADS):
+            raise UsageLimitExceeded(f"Daily lead limit reached ({Config.MAX_DAILY_LEADS})")
+
+    def record(self, leads_scraped=0, requests_made=0, jobs_completed=0):
+        """Unconditionally adjust counters (negative amounts release unused reservations)"""
+        increments = {column: amount for column, amount in [
+            ('leads_scraped', leads_scraped),
+            ('requests_made', requests_made),
+            ('jobs_completed', jobs_completed)
+        ] if amount}
+        if increments:
+            try:
+                self._increment(increments)
+            except Exception as e:
+                logging.error(f"Error recording daily usage: {str(e)}")
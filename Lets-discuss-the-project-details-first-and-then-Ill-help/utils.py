@@ -1,10 +1,10 @@
 import re
 import json
-import random
+import zlib
+import unicodedata
 import time
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, unquote
 import logging
-from config import Config
 
 def validate_apollo_url(url):
     """Validate if the URL is a valid Apollo.io search URL"""
@@ -20,26 +20,55 @@ def validate_apollo_url(url):
     except Exception as e:
         return False, f"Invalid URL format: {str(e)}"
 
+def split_search_query(url):
+    """Split an Apollo search URL around the query string holding its search parameters.
+    
+    Hash-routed URLs (#/people?page=2) carry them in the fragment, plain paths
+    (/people?page=2) in the URL's own query. Returns (head, query, tail) with
+    url == head + query + tail, where head ends with '?'.
+    """
+    base, hash_mark, fragment = url.partition('#')
+    if hash_mark and (fragment.startswith('/') or '?' in fragment):
+        route, _, query = fragment.partition('?')
+        return f"{base}#{route}?", query, ''
+    path, _, query = base.partition('?')
+    return f"{path}?", query, f"#{fragment}" if hash_mark else ''
+
 def extract_search_params(url):
     """Extract search parameters from Apollo URL"""
     try:
-        # Apollo uses hash-based routing, so we need to parse the hash part
-        if '#' in url:
-            hash_part = url.split('#')[1]
-            if '?' in hash_part:
-                query_part = hash_part.split('?')[1]
-                # Parse the query parameters
-                params = {}
-                for param in query_part.split('&'):
-                    if '=' in param:
-                        key, value = param.split('=', 1)
-                        params[key] = value
-                return params
-        return {}
+        _, query_part, _ = split_search_query(url)
+        params = {}
+        for param in query_part.split('&'):
+            if '=' in param:
+                key, value = param.split('=', 1)
+                params[key] = value
+        return params
     except Exception as e:
         logging.error(f"Error extracting search params: {str(e)}")
         return {}
 
+def get_search_page(url):
+    """Return the results page number carried in an Apollo search URL (default 1)"""
+    try:
+        return max(int(extract_search_params(url).get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+def build_page_url(url, page):
+    """Return the Apollo search URL with its ``page=`` parameter (hash route or query) set to ``page``"""
+    head, query, tail = split_search_query(url)
+    
+    params = [param for param in query.split('&') if param]
+    for i, param in enumerate(params):
+        if param.split('=', 1)[0] == 'page':
+            params[i] = f'page={page}'
+            break
+    else:
+        params.insert(0, f'page={page}')
+    
+    return f"{head}{'&'.join(params)}{tail}"
+
 def clean_text(text):
     """Clean extracted text data"""
     if not text:
@@ -90,23 +119,41 @@ def extract_linkedin_url(text):
     match = re.search(linkedin_pattern, text)
     return match.group(0) if match else ""
 
-def calculate_smart_delay(base_delay=None, error_count=0, success_count=0):
-    """Calculate smart delay based on success/error rates"""
-    if base_delay is None:
-        base_delay = Config.DEFAULT_DELAY
-    
-    # Increase delay if we're getting errors
-    if error_count > success_count:
-        delay = min(base_delay * (1 + error_count * 0.1), Config.MAX_DELAY)
-    else:
-        # Decrease delay if we're successful
-        delay = max(base_delay * (1 - success_count * 0.05), Config.MIN_DELAY)
+# Legal-form suffixes ignored when comparing company names
+COMPANY_SUFFIXES = {'inc', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company', 'gmbh', 'plc', 'sa', 'ag'}
+
+def normalize_words(text):
+    """Lowercase, strip accents and punctuation, and split text into words"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r'[\W_]+', ' ', text.lower()).split()
+
+def normalize_linkedin_url(url):
+    """Canonical linkedin.com/<path> form of a LinkedIn URL, or '' if it is not one"""
+    if not url:
+        return ""
     
-    # Add some randomness to avoid pattern detection
-    jitter = random.uniform(0.8, 1.2)
-    delay = delay * jitter
+    url = url.strip().lower()
+    parsed = urlparse(url if '://' in url else f'https://{url}')
+    host = parsed.netloc.split(':')[0]
+    if host != 'linkedin.com' and not host.endswith('.linkedin.com'):
+        return ""
     
-    return max(Config.MIN_DELAY, min(delay, Config.MAX_DELAY))
+    path = re.sub(r'/+', '/', unquote(parsed.path)).rstrip('/')
+    return f"linkedin.com{path}" if path else ""
+
+def normalize_email(email):
+    """Lowercased email address, or '' if it does not look like one"""
+    email = (email or '').strip().lower()
+    return email if re.fullmatch(r'[^@\s]+@[^@\s]+\.[^@\s]+', email) else ""
+
+def normalize_person_company(full_name, company_name):
+    """'name|company' key for a person at a company, or '' if either is missing"""
+    name = ' '.join(normalize_words(full_name))
+    company = ' '.join(word for word in normalize_words(company_name) if word not in COMPANY_SUFFIXES)
+    if not name or not company:
+        return ""
+    return f"{name}|{company}"
 
 def format_company_size(size_text):
     """Format company size text to standardized format"""
@@ -145,6 +192,15 @@ def sanitize_filename(filename):
     
     return filename
 
+def gzip_chunks(chunks, level=6):
+    """Compress an iterable of text chunks into a gzip stream on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
 def parse_apollo_cookies(cookies_string):
     """Parse Apollo cookies from string format"""
     try: